@@ -38,54 +38,42 @@ void EMSSystem::addChannelToSystem(EMSChannel *emsChannel) {
 	}
 }
 
-// get the next number out of a String object and return it
-int EMSSystem::getNextNumberOfSting(String *command, int startIndex) {
-	int number = -1;
-
-	int endIndex = -1;
-
-	// Select the number in the string
-	for (int i = startIndex + 1; i < (int) command->length(); i++) {
-		char tmp = command->charAt(i);
-		if (tmp >= '0' && tmp <= '9') {
-			if (startIndex == -1) {
-				startIndex = i;
-			}
-			endIndex = i + 1;
-		} else {
-			break;
-		}
-
-		if (endIndex > startIndex && endIndex >= 0 && startIndex >= 0) {
-			String temS = command->substring((unsigned int) startIndex + 1,
-					(unsigned int) endIndex);
-			number = (int) temS.toInt();
-
-		} else {
-			Serial.println(
-					"not in if ERROR: endIndex>startIndex && endIndex>=0 &&  startIndex>=0");
-		}
+// get the number right after the separator at startIndex (-1 if there is
+// none), reading the digits in place
+int EMSSystem::getNextNumberOfSting(const char *command, int startIndex) {
+	long number = -1;
+	for (const char *digit = command + startIndex + 1; *digit >= '0' && *digit <= '9'; digit++) {
+		number = (number == -1 ? 0 : number * 10) + (*digit - '0');
 	}
-	return number;
+	return (int) number;
 }
 
-void EMSSystem::doActionCommand(String *command) {
+// "C<channel>T<ms>I<intensity>G": one pass over the command; the first of
+// each separator counts
+void EMSSystem::doActionCommand(const char *command) {
 
-	if (command->length() != 0) {
-		// Channel
-		int seperatorChannel = command->indexOf(CHANNEL);
+	if (command[0] != '\0') {
 		int currentChannel = -1;
-
-		if (seperatorChannel != -1) {
-
-			currentChannel = getNextNumberOfSting(command, seperatorChannel);
+		int signalLength = -1;
+		int signalIntensity = -1;
+		bool hasChannel = false, hasLength = false, hasIntensity = false;
+
+		for (int i = 0; command[i] != '\0'; i++) {
+			if (command[i] == CHANNEL && !hasChannel) {
+				hasChannel = true;
+				currentChannel = getNextNumberOfSting(command, i);
+			} else if (command[i] == TIME && !hasLength) {
+				hasLength = true;
+				signalLength = getNextNumberOfSting(command, i);
+			} else if (command[i] == INTENSITY && !hasIntensity) {
+				hasIntensity = true;
+				signalIntensity = getNextNumberOfSting(command, i);
+			}
 		}
 
-		// Signal length onTime
-		int seperatorSignalLength = command->indexOf(TIME);
-		int signalLength = -1;
-		if (seperatorSignalLength != -1) {
-			signalLength = getNextNumberOfSting(command, seperatorSignalLength);
+		// Signal length onTime (a wrong channel number used to index past
+		// the channels here; it is skipped, shutDown() follows)
+		if (hasLength && isInRange(currentChannel)) {
 			if (signalLength > 5000) {
 				//signaleLength max 5000ms
 				signalLength = 5000;
@@ -94,21 +82,10 @@ void EMSSystem::doActionCommand(String *command) {
 		}
 
 		// Signal Intensity
-		int seperatorSignalIntensity = command->indexOf(INTENSITY);
-		int signalIntensity = -1;
-		if (seperatorSignalIntensity != -1) {
-			signalIntensity = getNextNumberOfSting(command,
-					seperatorSignalIntensity);
+		if (hasIntensity && isInRange(currentChannel)) {
 			emsChannels[currentChannel]->setIntensity(signalIntensity - 1);
 		}
 
-		// Apply the command
-		int seperatAction = command->indexOf(ACTION);
-		bool action = false;
-		if (seperatAction != -1) {
-			action = true;
-		}
-
 		if (currentChannel >= 0 && currentChannel < size) {
 			emsChannels[currentChannel]->activate();
 			emsChannels[currentChannel]->applySignal();
@@ -132,11 +109,11 @@ void EMSSystem::shutDown() {
 
 /* TODO change to set commands */
 
-void EMSSystem::setOption(String *option) {
-	char secChar = option->charAt(2);
+void EMSSystem::setOption(const char *option) {
+	char secChar = option[1] != '\0' ? option[2] : '\0';
 	int channel = -1;
 	int value = -1;
-	switch (option->charAt(1)) {
+	switch (option[1]) {
 	case 'C':
 		if (secChar == 'T' && getChannelAndValue(option, &channel, &value)) {
 			//set changeTime
@@ -160,17 +137,16 @@ void EMSSystem::setOption(String *option) {
 
 }
 
-bool EMSSystem::getChannelAndValue(String *option, int *channel, int *value) {
-	int left = option->indexOf('[');
-	int right = option->lastIndexOf(']');
-	int seperator = option->indexOf(',', left + 1);
+// "[<channel>,<value>]", read in place (atoi() stops at ',' and ']' as
+// toInt() of the substrings did)
+bool EMSSystem::getChannelAndValue(const char *option, int *channel, int *value) {
+	const char *left = strchr(option, '[');
+	const char *right = strrchr(option, ']');
+	const char *seperator = left != NULL ? strchr(left + 1, ',') : NULL;
 
-	if (left < seperator && seperator < right && left != -1 && right != -1
-			&& seperator != -1) {
-		String help = option->substring(left + 1, seperator);
-		(*channel) = help.toInt();
-		help = option->substring(seperator + 1, right);
-		(*value) = help.toInt();
+	if (left != NULL && right != NULL && seperator != NULL && seperator < right) {
+		(*channel) = atoi(left + 1);
+		(*value) = atoi(seperator + 1);
 
 		//Parsing successful
 		//Check whether channel exists
@@ -192,15 +168,15 @@ int EMSSystem::check() {
 	return stopCount;
 }
 
-void EMSSystem::doCommand(String *command) {
-	if (command->length() > 0) {
-		if (command->indexOf(ACTION) != -1) {
+void EMSSystem::doCommand(const char *command) {
+	if (command[0] != '\0') {
+		if (strchr(command, ACTION) != NULL) {
 			doActionCommand(command);
-		} else if (command->charAt(0) == OPTION) {
+		} else if (command[0] == OPTION) {
 			setOption(command);
 		} else {
 			Serial.print("Unknown command: ");
-			Serial.println((*command));
+			Serial.println(command);
 			Serial.flush();
 		}
 	}
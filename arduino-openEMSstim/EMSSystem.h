@@ -35,16 +35,16 @@ public:
 	virtual ~EMSSystem();
 
 	virtual void addChannelToSystem(EMSChannel *emsChannel);
-	virtual void doCommand(String *command);
+	virtual void doCommand(const char *command);
 	void shutDown();
 	virtual int check();
 	static void start();
 
 protected:
-	virtual void doActionCommand(String *command);
-	virtual void setOption(String *option);
-	virtual bool getChannelAndValue(String *option, int *channel, int *value);
-	virtual int getNextNumberOfSting(String *command, int startIndex);
+	virtual void doActionCommand(const char *command);
+	virtual void setOption(const char *option);
+	virtual bool getChannelAndValue(const char *option, int *channel, int *value);
+	virtual int getNextNumberOfSting(const char *command, int startIndex);
 
 private:
 	EMSChannel **emsChannels;
@@ -12,13 +12,50 @@
 #define USB_FULL_COMMANDS_ACTIVE 1 
 #define USB_TEST_COMMANDS_ACTIVE 0
 
-// Helper print function
-void printer(String msg, boolean force = false) {
-  if (DEBUG_ON || force) {
+// Binary frames (opt-in, see nmes_protocol.py): 0xA5 seq cmd len payload crc8
+#define FRAME_SYNC 0xA5
+#define FRAME_MAX_PAYLOAD 12
+#define STATUS_OK 0
+#define STATUS_UNKNOWN_COMMAND 1
+#define STATUS_BAD_PAYLOAD 2
+#define STATUS_BAD_FRAME 3
+#define TELEMETRY_COMMAND 'S'
+
+// Longest text command line, its '\r' included; longer lines are dropped
+// whole rather than read as two commands
+#define MESSAGE_MAX 64
+
+// Set while a binary frame is handled: its reply replaces the debug text
+boolean binaryMode = false;
+
+// Helper print functions. Replies are printed piece by piece rather than
+// built as Strings, so handling a command never allocates on the heap.
+boolean printing(boolean force = false) {
+  return (DEBUG_ON && !binaryMode) || force;
+}
+
+void printer(const char *msg, boolean force = false) {
+  if (printing(force)) {
     Serial.println(msg);
   }
 }
 
+// "<label><text>"
+void printerText(const char *label, const char *text) {
+  if (printing()) {
+    Serial.print(label);
+    Serial.println(text);
+  }
+}
+
+// "<label><value>"
+void printerValue(const char *label, long value) {
+  if (printing()) {
+    Serial.print(label);
+    Serial.println(value);
+  }
+}
+
 // Track EMS intensity manually
 int digipotChannel1Position = 255;  // Start at max resistance (no EMS)
 int digipotChannel2Position = 255;  // Start at max resistance (no EMS)
@@ -28,6 +65,55 @@ int pwmPulseWidthChannel1 = 128;  // Start at 50% duty cycle
 int pwmPulseWidthChannel2 = 128;  // Start at 50% duty cycle
 const int pwmStepSize = 10;        // PWM step size per button press
 
+// "\tPWM <change>: CH1=<pwm>, CH2=<pwm>"
+void printerPwm(const char *change) {
+  if (printing()) {
+    Serial.print("\tPWM ");
+    Serial.print(change);
+    Serial.print(": CH1=");
+    Serial.print(pwmPulseWidthChannel1);
+    Serial.print(", CH2=");
+    Serial.println(pwmPulseWidthChannel2);
+  }
+}
+
+// Telemetry: a binary status frame every telemetryPeriod ms (0 = off)
+unsigned int telemetryPeriod = 0;
+unsigned long lastTelemetry = 0;
+byte telemetrySeq = 0;
+
+// Ramp profiles: the firmware steps a channel's PWM up to a ceiling, holds
+// and steps back down by itself, timed by millis(), so an assist cycle is a
+// couple of short commands instead of one round-trip per step
+#define RAMP_PROFILES 4
+#define RAMP_IDLE 0
+#define RAMP_UP 1
+#define RAMP_HOLD 2
+#define RAMP_DOWN 3
+
+struct RampProfile {
+  byte step;              // PWM change per step
+  unsigned int interval;  // ms between steps up
+  byte ceiling;           // highest PWM the ramp goes to
+  unsigned int hold;      // ms held at the ceiling (or after H) before ramping down, 0 = until X
+  unsigned int down;      // ms between steps down, 0 = straight back
+};
+
+struct Ramp {
+  byte phase;
+  byte profile;
+  int start;                 // PWM to go back to
+  unsigned long lastStep;    // millis() of the last step or phase change
+  boolean report;            // started by a text command: print the channel going off
+};
+
+RampProfile rampProfiles[RAMP_PROFILES] = {
+  {10, 100, 248, 0, 100}, {10, 100, 248, 0, 100},
+  {10, 100, 248, 0, 100}, {10, 100, 248, 0, 100}
+};
+Ramp ramps[2] = {{RAMP_IDLE, 0, 128, 0, false}, {RAMP_IDLE, 0, 128, 0, false}};
+const char* const rampPhaseNames[] = {"idle", "up", "hold", "down"};
+
 // Initialize control objects
 AD5252 digitalPot(0);  // I2C address 0
 EMSChannel emsChannel1(5, 4, A2, &digitalPot, 1); // PWM, enable, feedback, digipot, channel #
@@ -59,29 +145,59 @@ void setup() {
   printer("SETUP DONE (LED 13 WILL BE ON)");
 }
 
-String command = "";
-String hexCommandString;
+// Text command being handled: read into this fixed buffer and parsed in
+// place, instead of Strings on the heap that fragment the Nano's 2 KB SRAM
+char message[MESSAGE_MAX + 2];
 
 void loop() {
   if (Serial.available() > 0) {
-    if (USB_FULL_COMMANDS_ACTIVE) {
-      String message = Serial.readStringUntil('\n');
-      message.trim();
-      printer("\tUSB: received command: " + message);
-      processMessage(message);
+    if (Serial.peek() == FRAME_SYNC) {
+      readFrame();
+    } else if (USB_FULL_COMMANDS_ACTIVE) {
+      // one character more than fits tells a line that is too long
+      byte length = Serial.readBytesUntil('\n', message, MESSAGE_MAX + 1);
+      message[length] = '\0';
+      char *text = trimMessage(message);
+      if (length > MESSAGE_MAX) {
+        Serial.find('\n');  // the rest of the line
+        printerText("\tERROR: Command Too Long: ", text);
+      } else {
+        printerText("\tUSB: received command: ", text);
+        processMessage(text);
+      }
     } else if (USB_TEST_COMMANDS_ACTIVE) {
-      char c = Serial.read();
-      printer("\tUSB-TEST-MODE: received command: " + String(c));
-      doCommand(c);
+      char c[2] = {(char)Serial.read(), '\0'};
+      printerText("\tUSB-TEST-MODE: received command: ", c);
+      doCommand(c[0]);
     }
     Serial.flush();
   }
 
+  if (telemetryPeriod > 0 && millis() - lastTelemetry >= telemetryPeriod) {
+    lastTelemetry = millis();
+    sendTelemetry();
+  }
+
+  checkRamps();
+
   if (emsSystem.check() > 0) {
     // placeholder for timed shutdowns if needed
   }
 }
 
+// Strip leading and trailing whitespace in place (String::trim())
+char *trimMessage(char *text) {
+  while (isspace((unsigned char)*text)) {
+    text++;
+  }
+  char *end = text + strlen(text);
+  while (end > text && isspace((unsigned char)end[-1])) {
+    end--;
+  }
+  *end = '\0';
+  return text;
+}
+
 // Convert HEX string ("4D") to one byte
 char convertToHexCharsToOneByte(char one, char two) {
   char byteOne = convertHexCharToByte(one);
@@ -118,23 +234,41 @@ const char* const string_table_outputs[] PROGMEM = {
 
 char buffer[32];
 
-// Handle full incoming Serial messages
-void processMessage(String message) {
-  if (message.startsWith("WV")) {  // HEX command
-    int lastIndexOfComma = message.lastIndexOf(',');
-    hexCommandString = message.substring(lastIndexOfComma + 1, message.length() - 1);
-    command = "";
-    printer("\tEMS_CMD: HEX command length: " + String(hexCommandString.length()));
-    printer(hexCommandString);
+// Handle full incoming Serial messages (modified in place)
+void processMessage(char *message) {
+  if (strncmp(message, "WV", 2) == 0) {  // HEX command
+    // the hex digits run from after the last comma to before the last
+    // character; reversed bounds are swapped, as String::substring() does
+    char *comma = strrchr(message, ',');
+    unsigned int start = comma != NULL ? comma - message + 1 : 0;
+    unsigned int end = strlen(message) - 1;
+    if (start > end) {
+      unsigned int swap = start;
+      start = end;
+      end = swap;
+    }
+    char *hex = message + start;
+    unsigned int hexLength = end - start;
+    hex[hexLength] = '\0';
+    printerValue("\tEMS_CMD: HEX command length: ", hexLength);
+    printer(hex);
 
-    for (unsigned int i = 0; i < hexCommandString.length(); i += 2) {
-      char nextChar = convertToHexCharsToOneByte(hexCommandString.charAt(i), hexCommandString.charAt(i + 1));
-      command += nextChar;
+    // one pass, two hex digits to a byte, written over the digits
+    unsigned int commandLength = 0;
+    for (unsigned int i = 0; i < hexLength; i += 2) {
+      hex[commandLength++] = convertToHexCharsToOneByte(hex[i], hex[i + 1]);
     }
+    hex[commandLength] = '\0';
 
     printer("\tEMS_CMD: Converted HEX command: ");
-    printer(command);
-    emsSystem.doCommand(&command);
+    printer(hex);
+    emsSystem.doCommand(hex);
+  } else if (setCommand(message)) {
+    // absolute PWM / digipot / channel command, handled
+  } else if (telemetryCommand(message)) {
+    // telemetry period, handled
+  } else if (rampCommand(message)) {
+    // ramp profile command, handled
   } else {
     printer("\tCommand NON HEX:");
     printer(message);
@@ -142,62 +276,441 @@ void processMessage(String message) {
   }
 }
 
-// Handle Single-Char Test Commands
-void doCommand(char c) {
-  if (c == '1') {
-    if (emsChannel1.isActivated()) {
-      emsChannel1.deactivate();
-      strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[1])));
-      printer(buffer);
+// CRC-8, polynomial 0x07 (same as nmes_protocol.crc8)
+byte crc8(const byte *data, byte length) {
+  byte crc = 0;
+  while (length--) {
+    crc ^= *data++;
+    for (byte i = 0; i < 8; i++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Write one binary frame
+void writeFrame(byte seq, byte command, const byte *payload, byte length) {
+  byte frame[4 + FRAME_MAX_PAYLOAD + 1] = {FRAME_SYNC, seq, command, length};
+  memcpy(frame + 4, payload, length);
+  frame[4 + length] = crc8(frame + 1, length + 3);
+  Serial.write(frame, length + 5);
+}
+
+// Bit 0: channel 1 active, bit 1: channel 2 active
+byte channelFlags() {
+  return (emsChannel1.isActivated() ? 1 : 0) | (emsChannel2.isActivated() ? 2 : 0);
+}
+
+// Reply to a binary frame: status plus PWM, digipot and channel state, and
+// for ramp commands the phase and profile of the channel's ramp
+void sendReply(byte seq, byte command, byte status, char rampChannel = 0) {
+  byte state[8] = {
+    status,
+    (byte)pwmPulseWidthChannel1, (byte)pwmPulseWidthChannel2,
+    (byte)digipotChannel1Position, (byte)digipotChannel2Position,
+    channelFlags(), 0, 0
+  };
+  byte length = 6;
+  if (rampChannel == '1' || rampChannel == '2') {
+    state[6] = ramps[rampChannel - '1'].phase;
+    state[7] = ramps[rampChannel - '1'].profile;
+    length = 8;
+  }
+  writeFrame(seq, command, state, length);
+}
+
+// Unsolicited status frame (command 'S', seq counts frames): PWM, digipot,
+// channel flags with the top two bits of each 10-bit A2 / A3 feedback
+// reading in bits 2-3 / 4-5, the low bytes of the readings, then the ramp
+// phases (channel 1 in bits 0-1, channel 2 in bits 2-3)
+void sendTelemetry() {
+  int feedback1 = analogRead(A2);
+  int feedback2 = analogRead(A3);
+  byte status[8] = {
+    (byte)pwmPulseWidthChannel1, (byte)pwmPulseWidthChannel2,
+    (byte)digipotChannel1Position, (byte)digipotChannel2Position,
+    (byte)(channelFlags() | (feedback1 >> 8) << 2 | (feedback2 >> 8) << 4),
+    (byte)feedback1, (byte)feedback2,
+    (byte)(ramps[0].phase | ramps[1].phase << 2)
+  };
+  writeFrame(telemetrySeq++, TELEMETRY_COMMAND, status, sizeof(status));
+}
+
+// Handle one binary frame (the sync byte is next in the Serial buffer)
+void readFrame() {
+  byte frame[4 + FRAME_MAX_PAYLOAD + 1];
+  if (Serial.readBytes(frame, 4) < 4) {
+    return;  // truncated header, nothing to reply to
+  }
+  byte length = frame[3];
+  if (length > FRAME_MAX_PAYLOAD ||
+      Serial.readBytes(frame + 4, length + 1) < (size_t)(length + 1) ||
+      crc8(frame + 1, length + 3) != frame[4 + length]) {
+    sendReply(frame[1], frame[2], STATUS_BAD_FRAME);
+    return;
+  }
+
+  char command = frame[2];
+  byte status = STATUS_OK;
+  char rampChannel = 0;
+  binaryMode = true;
+  if (command == 'P' || command == 'D' || command == 'A') {
+    if (length == 2 && (frame[4] == '1' || frame[4] == '2' || frame[4] == '*') &&
+        (command != 'A' || frame[5] <= 1)) {
+      applySet(command, frame[4], frame[5]);
     } else {
-      emsChannel1.activate();
-      strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[0])));
-      printer(buffer);
+      status = STATUS_BAD_PAYLOAD;
     }
-  } else if (c == '2') {
-    if (emsChannel2.isActivated()) {
-      emsChannel2.deactivate();
-      strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[3])));
-      printer(buffer);
+  } else if (command == 'T') {
+    if (length == 2) {
+      applyTelemetry((unsigned int)frame[4] << 8 | frame[5]);
+    } else {
+      status = STATUS_BAD_PAYLOAD;
+    }
+  } else if (command == 'R') {
+    // profile, step, interval (2), ceiling, hold (2), down (2); 16-bit big-endian
+    if (length == 9 && frame[4] < RAMP_PROFILES) {
+      long values[5] = {
+        frame[5], (long)frame[6] << 8 | frame[7], frame[8],
+        (long)frame[9] << 8 | frame[10], (long)frame[11] << 8 | frame[12]
+      };
+      storeRamp(frame[4], values);
+    } else {
+      status = STATUS_BAD_PAYLOAD;
+    }
+  } else if (command == 'G' || command == 'H' || command == 'X' || command == '?') {
+    // channel, and for G the profile
+    if (length == (command == 'G' ? 2 : 1) && (frame[4] == '1' || frame[4] == '2') &&
+        (command != 'G' || frame[5] < RAMP_PROFILES)) {
+      rampChannel = frame[4];
+      rampAction(command, frame[4] - '1', command == 'G' ? frame[5] : 0);
     } else {
-      emsChannel2.activate();
-      strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[2])));
-      printer(buffer);
+      status = STATUS_BAD_PAYLOAD;
     }
+  } else if (length == 0 && command != 0 && strchr("12aqswujp", command) != NULL) {
+    doCommand(command);
+  } else {
+    status = STATUS_UNKNOWN_COMMAND;
+  }
+  binaryMode = false;
+  sendReply(frame[1], command, status, rampChannel);
+}
+
+// Read the digits of a command value; false if there are none, more than
+// maxDigits, or anything else. Single pass, no substring().
+boolean parseValue(const char *text, byte maxDigits, long *value) {
+  byte digits = 0;
+  *value = 0;
+  for (; *text != '\0'; text++) {
+    if (!isDigit(*text) || ++digits > maxDigits) {
+      return false;
+    }
+    *value = *value * 10 + (*text - '0');
+  }
+  return digits > 0;
+}
+
+// Handle Absolute Set Commands: "P<ch>=<0-255>" sets the PWM pulse width,
+// "D<ch>=<0-255>" the digipot position of channel 1, 2 or * (both), so the
+// host can jump to any intensity in one round-trip instead of many u/j steps.
+// "A<ch>=<0|1>" switches channels on / off (unlike the '1' / '2' toggles, a
+// repeat is harmless). Returns false if the message isn't a set command.
+boolean setCommand(const char *message) {
+  if (strlen(message) < 4 || (message[0] != 'P' && message[0] != 'D' && message[0] != 'A') ||
+      message[2] != '=') {
+    return false;
+  }
+  char channel = message[1];
+  long value;
+  if ((channel != '1' && channel != '2' && channel != '*') ||
+      !parseValue(message + 3, 3, &value) || value > (message[0] == 'A' ? 1 : 255)) {
+    printerText("\tERROR: Set Command Invalid: ", message);
+    return true;
+  }
+  applySet(message[0], channel, value);
+  return true;
+}
+
+// Carry out a set command (text or binary)
+void applySet(char kind, char channel, int value) {
+  boolean one = channel != '2';
+  boolean two = channel != '1';
+  if (kind == 'P') {
+    if (one) {
+      ramps[0].phase = RAMP_IDLE;  // a manual setting ends the ramp
+      pwmPulseWidthChannel1 = value;
+      analogWrite(5, pwmPulseWidthChannel1);
+    }
+    if (two) {
+      ramps[1].phase = RAMP_IDLE;
+      pwmPulseWidthChannel2 = value;
+      analogWrite(6, pwmPulseWidthChannel2);
+    }
+    printerPwm("Set");
+  } else if (kind == 'A') {
+    if (one) {
+      setActive(0, value == 1, true);
+    }
+    if (two) {
+      setActive(1, value == 1, true);
+    }
+  } else {
+    if (one) {
+      digipotChannel1Position = value;
+      digitalPot.setPosition(1, digipotChannel1Position);
+      strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[4])));
+      printerValue(buffer, digipotChannel1Position);
+    }
+    if (two) {
+      digipotChannel2Position = value;
+      digitalPot.setPosition(3, digipotChannel2Position);
+      strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[5])));
+      printerValue(buffer, digipotChannel2Position);
+    }
+  }
+}
+
+// Handle the Telemetry Command: "T=<0-65535>" pushes a binary status frame
+// (sendTelemetry) every that many ms, 0 stops them. Returns false if the
+// message isn't one.
+boolean telemetryCommand(const char *message) {
+  if (strlen(message) < 3 || message[0] != 'T' || message[1] != '=') {
+    return false;
+  }
+  long value;
+  if (!parseValue(message + 2, 5, &value) || value > 65535) {
+    printerText("\tERROR: Telemetry Command Invalid: ", message);
+    return true;
+  }
+  applyTelemetry(value);
+  return true;
+}
+
+void applyTelemetry(unsigned int period) {
+  telemetryPeriod = period;
+  lastTelemetry = millis();
+  if (telemetryPeriod > 0) {
+    if (printing()) {
+      Serial.print("\tTelemetry: every ");
+      Serial.print(telemetryPeriod);
+      Serial.println(" ms");
+    }
+  } else {
+    printer("\tTelemetry: off");
+  }
+}
+
+// Handle the Ramp Commands:
+//   "R<profile>=<step>,<interval>,<ceiling>,<hold>,<down>" stores a profile
+//   "G<ch>=<profile>" starts it on channel 1 or 2 (switching the channel on)
+//   "H<ch>" stops climbing: hold, then ramp down after the profile's hold
+//   "X<ch>" aborts: ramp down now, then switch the channel off
+//   "?<ch>" reports the ramp
+// Returns false if the message isn't one.
+boolean rampCommand(const char *message) {
+  char c = message[0];
+  size_t length = strlen(message);
+  if (c == 'R' && length > 3 && message[2] == '=') {
+    long values[5];
+    int profile = message[1] - '0';
+    if (profile < 0 || profile >= RAMP_PROFILES || !parseNumbers(message + 3, values, 5) ||
+        values[0] > 255 || values[2] > 255) {
+      printerText("\tERROR: Ramp Command Invalid: ", message);
+      return true;
+    }
+    storeRamp(profile, values);
+    if (printing()) {
+      Serial.print("\tRamp ");
+      Serial.print(profile);
+      Serial.print(" stored: ");
+      Serial.println(message + 3);
+    }
+    return true;
+  }
+
+  boolean start = c == 'G' && length == 4 && message[2] == '=';
+  if (!start && !((c == 'H' || c == 'X' || c == '?') && length == 2)) {
+    return false;
+  }
+  int channel = message[1] - '1';
+  int profile = start ? message[3] - '0' : 0;
+  if (channel < 0 || channel > 1 || profile < 0 || profile >= RAMP_PROFILES) {
+    printerText("\tERROR: Ramp Command Invalid: ", message);
+    return true;
+  }
+  rampAction(c, channel, profile);
+  return true;
+}
+
+// Store ramp profile values: step, interval, ceiling, hold, down
+void storeRamp(byte profile, const long *values) {
+  RampProfile &ramp = rampProfiles[profile];
+  ramp.step = values[0];
+  ramp.interval = values[1];
+  ramp.ceiling = values[2];
+  ramp.hold = values[3];
+  ramp.down = values[4];
+}
+
+// Start ('G'), hold ('H'), abort ('X') or report ('?') channel 0 or 1's ramp
+void rampAction(char c, byte channel, byte profile) {
+  Ramp &ramp = ramps[channel];
+  int *pwm = channelPwm(channel);
+  if (c == 'G') {
+    if (ramp.phase == RAMP_IDLE) {
+      ramp.start = *pwm;
+    }
+    ramp.profile = profile;
+    ramp.phase = *pwm >= rampProfiles[profile].ceiling ? RAMP_HOLD : RAMP_UP;
+    ramp.lastStep = millis();
+    ramp.report = !binaryMode;  // binary hosts see it in the telemetry
+    setActive(channel, true, false);
+  } else if (c == 'H' && ramp.phase == RAMP_UP) {
+    ramp.phase = RAMP_HOLD;
+    ramp.lastStep = millis();
+  } else if (c == 'X' && ramp.phase != RAMP_IDLE) {
+    ramp.phase = RAMP_DOWN;
+    ramp.lastStep = millis() - rampProfiles[ramp.profile].down;  // first step now
+  }
+  if (printing()) {
+    Serial.print("\tRamp CH");
+    Serial.print(channel + 1);
+    Serial.print(": ");
+    Serial.print(rampPhaseNames[ramp.phase]);
+    Serial.print(", profile ");
+    Serial.print(ramp.profile);
+    Serial.print(", PWM=");
+    Serial.println(*pwm);
+  }
+}
+
+// Parse "<n>,<n>,..." (count numbers of 0-65535)
+boolean parseNumbers(const char *text, long *values, byte count) {
+  byte found = 0;
+  unsigned int digits = 0;
+  long value = 0;
+  for (;; text++) {
+    if (*text == '\0' || *text == ',') {
+      if (digits == 0 || found == count) {
+        return false;
+      }
+      values[found++] = value;
+      digits = 0;
+      value = 0;
+      if (*text == '\0') {
+        break;
+      }
+    } else if (isDigit(*text) && digits < 5) {
+      value = value * 10 + (*text - '0');
+      digits++;
+      if (value > 65535) {
+        return false;
+      }
+    } else {
+      return false;
+    }
+  }
+  return found == count;
+}
+
+// Step the running ramps (called every loop, like emsSystem.check())
+void checkRamps() {
+  unsigned long now = millis();
+  for (byte i = 0; i < 2; i++) {
+    Ramp &ramp = ramps[i];
+    RampProfile &profile = rampProfiles[ramp.profile];
+    int *pwm = channelPwm(i);
+    if (ramp.phase == RAMP_UP && now - ramp.lastStep >= profile.interval) {
+      ramp.lastStep = now;
+      *pwm = min(*pwm + profile.step, (int)profile.ceiling);
+      analogWrite(i == 0 ? 5 : 6, *pwm);
+      if (*pwm >= profile.ceiling) {
+        ramp.phase = RAMP_HOLD;
+      }
+    } else if (ramp.phase == RAMP_HOLD && profile.hold > 0 && now - ramp.lastStep >= profile.hold) {
+      ramp.phase = RAMP_DOWN;
+      ramp.lastStep = now;
+    } else if (ramp.phase == RAMP_DOWN && now - ramp.lastStep >= profile.down) {
+      ramp.lastStep = now;
+      *pwm = profile.down > 0 ? max(*pwm - profile.step, ramp.start) : ramp.start;
+      analogWrite(i == 0 ? 5 : 6, *pwm);
+      if (*pwm <= ramp.start) {
+        ramp.phase = RAMP_IDLE;
+        setActive(i, false, ramp.report);
+      }
+    }
+  }
+}
+
+int *channelPwm(byte channel) {
+  return channel == 0 ? &pwmPulseWidthChannel1 : &pwmPulseWidthChannel2;
+}
+
+// Switch channel 0 or 1 on or off and (if report) print its state; switching
+// off ends its ramp
+void setActive(byte channel, boolean on, boolean report) {
+  EMSChannel &ems = channel == 0 ? emsChannel1 : emsChannel2;
+  if (on && !ems.isActivated()) {
+    ems.activate();
+  } else if (!on && ems.isActivated()) {
+    ems.deactivate();
+  }
+  if (!on) {
+    ramps[channel].phase = RAMP_IDLE;
+  }
+  if (!report) {
+    return;
+  }
+  byte message = channel * 2 + (on ? 0 : 1);  // "Channel <n> active" / "inactive"
+  strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[message])));
+  printer(buffer);
+}
+
+// Handle Single-Char Test Commands
+void doCommand(char c) {
+  if (c == '1') {
+    setActive(0, !emsChannel1.isActivated(), true);
+  } else if (c == '2') {
+    setActive(1, !emsChannel2.isActivated(), true);
   } else if (c == 'a') {
     digipotChannel1Position = min(digipotChannel1Position + 15, 255);
     digitalPot.setPosition(1, digipotChannel1Position);
     strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[4])));
-    printer(buffer + String(digipotChannel1Position));
+    printerValue(buffer, digipotChannel1Position);
   } else if (c == 'q') {
     digipotChannel1Position = max(digipotChannel1Position - 15, 0);
     digitalPot.setPosition(1, digipotChannel1Position);
     strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[4])));
-    printer(buffer + String(digipotChannel1Position));
+    printerValue(buffer, digipotChannel1Position);
   } else if (c == 's') {
     digipotChannel2Position = min(digipotChannel2Position + 15, 255);
     digitalPot.setPosition(3, digipotChannel2Position);
     strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[5])));
-    printer(buffer + String(digipotChannel2Position));
+    printerValue(buffer, digipotChannel2Position);
   } else if (c == 'w') {
     digipotChannel2Position = max(digipotChannel2Position - 15, 0);
     digitalPot.setPosition(3, digipotChannel2Position);
     strcpy_P(buffer, (char*)pgm_read_word(&(string_table_outputs[5])));
-    printer(buffer + String(digipotChannel2Position));
+    printerValue(buffer, digipotChannel2Position);
 
   } else if (c == 'u') {  // Increase PWM pulse width (stronger)
+    ramps[0].phase = ramps[1].phase = RAMP_IDLE;
     pwmPulseWidthChannel1 = min(pwmPulseWidthChannel1 + pwmStepSize, 255);
     pwmPulseWidthChannel2 = min(pwmPulseWidthChannel2 + pwmStepSize, 255);
     analogWrite(5, pwmPulseWidthChannel1);
     analogWrite(6, pwmPulseWidthChannel2);
-    printer("\tPWM Increased: CH1=" + String(pwmPulseWidthChannel1) + ", CH2=" + String(pwmPulseWidthChannel2));
+    printerPwm("Increased");
 
   } else if (c == 'j') {  // Decrease PWM pulse width (weaker)
+    ramps[0].phase = ramps[1].phase = RAMP_IDLE;
     pwmPulseWidthChannel1 = max(pwmPulseWidthChannel1 - pwmStepSize, 0);
     pwmPulseWidthChannel2 = max(pwmPulseWidthChannel2 - pwmStepSize, 0);
     analogWrite(5, pwmPulseWidthChannel1);
     analogWrite(6, pwmPulseWidthChannel2);
-    printer("\tPWM Decreased: CH1=" + String(pwmPulseWidthChannel1) + ", CH2=" + String(pwmPulseWidthChannel2));
+    printerPwm("Decreased");
+
+  } else if (c == 'p') {  // Ping: lets the host see the sketch is running
+    printer("\tPONG: openEMSstim");
 
   } else {
     printer("\tERROR: SINGLE-CHAR Command Unknown");
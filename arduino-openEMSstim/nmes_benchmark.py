@@ -0,0 +1,108 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import serial
+
+from nmes_port import connect, wait_ready
+from nmes_serial import command_queue
+
+# Commands measured by default: steps both ways, an absolute set, the ping
+# and an EMSSystem action (the hex path)
+DEFAULT_COMMANDS = ('u', 'j', 'P*=150', 'p', 'WV')
+
+
+def wv_command(channel=0, intensity=100, length_ms=200):
+    """
+    EMSSystem action command "C<ch>I<intensity>T<ms>G" as the hex WV
+    message the sketch reads (it drops the last character, hence ';').
+
+    Returns:
+        (message, text of its last ack line)
+    """
+    action = f"C{channel}I{intensity}T{length_ms}G"
+    return f"WV0,{action.encode().hex().upper()};", action
+
+
+def benchmark(queue, commands=DEFAULT_COMMANDS, count=100, binary=False):
+    """
+    Command-to-ack latency through the serial link: each command is sent
+    count times, cycling through commands, and every ack awaited before
+    the next is sent, so the figures are round trips (write, firmware
+    handling, reply).
+
+    Parameters:
+        queue: nmes_serial command queue of the board
+        commands: Command texts; 'WV' stands for wv_command() (text mode
+                  only, binary frames have no hex path)
+        count: Round trips per command
+        binary: queue speaks the binary protocol
+    Returns:
+        Dict of command -> dict of count, timeouts, p50, p95, p99 and max
+        in ms, plus 'total' with the round trips per second
+    """
+    commands = [cmd for cmd in commands if not (binary and cmd == 'WV')]
+    samples = {cmd: [] for cmd in commands}
+    timeouts = dict.fromkeys(commands, 0)
+    start = time.monotonic()
+    for _ in range(count):
+        for cmd in commands:
+            text, expect = wv_command() if cmd == 'WV' else (cmd, None)
+            reply = queue.send(text, expect=expect).result()
+            if reply.line is None:
+                timeouts[cmd] += 1
+            else:
+                samples[cmd].append((reply.acked_at - reply.sent_at) * 1000)
+    elapsed = time.monotonic() - start
+
+    report = {}
+    for cmd in commands:
+        ms = np.array(samples[cmd]) if samples[cmd] else np.array([np.nan])
+        p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+        report[cmd] = {'count': len(samples[cmd]), 'timeouts': timeouts[cmd],
+                       'p50': round(float(p50), 2), 'p95': round(float(p95), 2),
+                       'p99': round(float(p99), 2), 'max': round(float(np.max(ms)), 2)}
+    round_trips = sum(len(s) for s in samples.values())
+    report['total'] = {'count': round_trips, 'seconds': round(elapsed, 2),
+                       'per_second': round(round_trips / elapsed, 1)}
+    return report
+
+
+# Example usage: python nmes_benchmark.py [port] [--nmes-binary] [--nmes-sim]
+#                    [--count N] [--commands u,j,WV] [--json PATH]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NMES command-to-ack latency")
+    parser.add_argument('port', nargs='?', default=None, help="serial port (default: probe)")
+    parser.add_argument('--nmes-binary', action='store_true')
+    parser.add_argument('--nmes-sim', action='store_true')
+    parser.add_argument('--baudrate', type=int, default=19200)
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--commands', default=','.join(DEFAULT_COMMANDS))
+    parser.add_argument('--json', help="also write the report here")
+    args = parser.parse_args()
+
+    simulator = None
+    if args.nmes_sim:
+        from nmes_simulator import NMESSimulator
+        simulator = NMESSimulator(args.baudrate)
+        ser = serial.Serial(simulator.port, args.baudrate, timeout=0.05)
+        wait_ready(ser)
+    else:
+        ser = connect(args.port, args.baudrate)
+    queue = command_queue(ser, args.nmes_binary, timeout=1.0, log=False)
+    report = benchmark(queue, args.commands.split(','), args.count, args.nmes_binary)
+    queue.close()
+    ser.close()
+    if simulator is not None:
+        simulator.close()
+
+    for cmd, s in report.items():
+        if cmd == 'total':
+            print(f"{s['count']} round trips in {s['seconds']} s ({s['per_second']}/s)")
+        else:
+            print(f"{cmd:8s} p50 {s['p50']:7.2f}  p95 {s['p95']:7.2f}  p99 {s['p99']:7.2f}  "
+                  f"max {s['max']:7.2f} ms  ({s['count']} acked, {s['timeouts']} timed out)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,435 @@
+import argparse
+import re
+import time
+from collections import deque
+
+import numpy as np
+import serial
+
+from nmes_port import connect, wait_ready
+from nmes_serial import (PWM_REST, PWM_STEP, BinaryCommandQueue, Reply, command_queue,
+                         ramp_command, ramp_profile_command, set_active_command, set_digipot_command,
+                         set_pwm_command, telemetry_command)
+
+# Firmware ack lines (text mode, or rebuilt from binary replies)
+_PWM_ACK = re.compile(r'PWM (?:Increased|Decreased|Set): CH1=(\d+), CH2=(\d+)')
+_CHANNEL_ACK = re.compile(r'Channel ([12]) (active|inactive)')
+_POT_ACK = re.compile(r'Intensity Channel ([12]): (\d+)')
+_RAMP_ACK = re.compile(r'Ramp CH([12]): (\w+), profile (\d+), PWM=(\d+)')
+
+
+class NMESDevice:
+    def __init__(self, port=None, baudrate=19200, max_level=12, binary=None,
+                 timeout=1.0, log=True, ser=None, simulate=None, telemetry=100, reset=False,
+                 exclude=()):
+        """
+        Driver for the openEMSstim board: owns the serial port and a
+        background command queue, and tracks each channel's state (active,
+        PWM pulse width, digipot position) from the firmware's acks rather
+        than from what was sent. With the binary protocol the firmware also
+        pushes its state every `telemetry` ms (with the A2 / A3 feedback
+        readings), which overrides what the acks said, so a lost ack or a
+        board reset can't leave the host believing the wrong thing.
+
+        Every operation returns at once (a Future, or None when nothing had
+        to be sent); acks are applied, and callbacks run, from poll(), which
+        the game calls once per frame.
+
+        Opening waits for the firmware to answer rather than a fixed time,
+        without resetting a board that is already running (see nmes_port).
+
+        Parameters:
+            port: Serial port of the board (None: probe for it)
+            baudrate: Serial speed (the firmware uses 19200)
+            max_level: Most PWM_STEP steps above PWM_REST step_up() goes
+            binary: Use the binary protocol (default: --nmes-binary)
+            timeout: Seconds to wait for each ack
+            log: Print commands and firmware lines
+            ser: Already opened serial.Serial to use instead of port
+            simulate: Talk to nmes_simulator's stand-in for the board
+                      instead of port (default: --nmes-sim)
+            telemetry: Status frame period in ms with the binary protocol
+                       (0: acks only)
+            reset: Let opening the port reset the board
+            exclude: Ports not to probe when port is None (boards other
+                     devices own)
+        """
+        if simulate is None:
+            parser = argparse.ArgumentParser(add_help=False)
+            parser.add_argument('--nmes-sim', action='store_true')
+            simulate = parser.parse_known_args()[0].nmes_sim
+        self.simulator = None
+        if ser is None and simulate:
+            from nmes_simulator import NMESSimulator
+            self.simulator = NMESSimulator(baudrate)
+            ser = serial.Serial(self.simulator.port, baudrate, timeout=0.05)
+            wait_ready(ser)
+        elif ser is None:
+            ser = connect(port, baudrate, reset=reset, log=log, exclude=exclude)
+        self.ser = ser
+        self.max_level = max_level
+        self.queue = command_queue(ser, binary, timeout=timeout, log=log,
+                                   on_status=self._on_status, on_line=self._on_line)
+
+        # Firmware start-up state, then whatever the acks and telemetry report
+        self.active = {1: False, 2: False}
+        self.pwm = {1: PWM_REST, 2: PWM_REST}
+        self.pot = {1: 255, 2: 255}
+        self.feedback = {1: None, 2: None}   # A2 / A3 readings (0 - 1023), telemetry only
+        self.ramp = {1: 'idle', 2: 'idle'}   # firmware ramp phase (set on start_ramp())
+        self._wanted_active = dict(self.active)
+        self._active_in_flight = {1: 0, 2: 0}
+        self._pwm_in_flight = None   # PWM the intensity command on the wire sets
+        self._next_pwm = None        # (target, callback) waiting for it
+        self._superseded_pwm = []    # callbacks of the targets it replaced
+
+        self._latency = {}           # command kind -> deque of ack seconds
+        self._timeouts = {}          # command kind -> unacknowledged count
+        self.status_frames = 0
+        self.status_lost = 0         # gaps in the status frames' seq
+        self._status_seq = None
+
+        # Status frames are binary, so text mode keeps to the acks
+        self.telemetry = telemetry if isinstance(self.queue, BinaryCommandQueue) else 0
+        if self.telemetry:
+            self.send(telemetry_command(self.telemetry))
+
+    @property
+    def level(self):
+        """Acknowledged PWM steps above rest on channel 1 (0 - max_level)."""
+        return int(min(max(round((self.pwm[1] - PWM_REST) / PWM_STEP), 0), self.max_level))
+
+    @property
+    def percent(self):
+        """level as a percentage of max_level."""
+        return int(self.level * 100 / self.max_level)
+
+    @property
+    def pending(self):
+        """Commands sent but not yet acknowledged or timed out."""
+        return self.queue.pending
+
+    def send(self, cmd, callback=None):
+        """
+        Queue any firmware command; its ack updates the tracked state.
+
+        Parameters:
+            cmd: Command text, e.g. 'u' or 'P*=128'
+            callback: Called as callback(reply) from poll()
+        Returns:
+            Future resolving to an nmes_serial.Reply
+        """
+        def done(reply):
+            self._record(reply)
+            if callback is not None:
+                callback(reply)
+        return self.queue.send(cmd, callback=done)
+
+    def batch(self, cmds, callback=None):
+        """
+        Queue several commands back to back (pipelined with the binary
+        protocol).
+
+        Returns:
+            List of Futures, one per command
+        """
+        return [self.send(cmd, callback) for cmd in cmds]
+
+    def poll(self):
+        """Apply the acks that arrived and run their callbacks."""
+        return self.queue.poll()
+
+    def activate(self, channel=1, callback=None):
+        """Switch a channel on (no-op if it is, or is being, switched on)."""
+        return self._set_active(channel, True, callback)
+
+    def deactivate(self, channel=1, callback=None):
+        """Switch a channel off (no-op if it is, or is being, switched off)."""
+        return self._set_active(channel, False, callback)
+
+    def _set_active(self, channel, on, callback):
+        if self._wanted_active[channel] == on:
+            return None
+        self._wanted_active[channel] = on
+        self._active_in_flight[channel] += 1
+
+        def done(reply):
+            self._active_in_flight[channel] -= 1
+            if callback is not None:
+                callback(reply)
+        return self.send(set_active_command(on, channel), done)
+
+    @property
+    def target_pwm(self):
+        """PWM the intensity commands sent and held back are heading for."""
+        if self._next_pwm is not None:
+            return self._next_pwm[0]
+        return self.pwm[1] if self._pwm_in_flight is None else self._pwm_in_flight
+
+    def step_up(self, callback=None):
+        """
+        Raise both channels' PWM by one step, up to max_level. Steps asked
+        for while an intensity command is in flight add up to one target,
+        sent when it is acked (see set_pwm()).
+
+        Returns:
+            Future, or None if the step was held back or max_level reached
+        """
+        target = self.target_pwm
+        if target >= PWM_REST + self.max_level * PWM_STEP:
+            return None
+        return self.set_pwm(min(target + PWM_STEP, PWM_REST + self.max_level * PWM_STEP),
+                            callback)
+
+    def step_down(self, callback=None):
+        """Lower both channels' PWM by one step, down to rest (as step_up)."""
+        target = self.target_pwm
+        if target <= PWM_REST:
+            return None
+        return self.set_pwm(max(target - PWM_STEP, PWM_REST), callback)
+
+    def set_pwm(self, value, callback=None):
+        """
+        Move both channels to a PWM pulse width. One intensity command is
+        on the wire at a time: meanwhile only the newest target is kept,
+        and then reached in one command, so steps and sets asked for every
+        frame, or that cancel out, don't pile up on the link. A one-step
+        change is sent as 'u' / 'j', anything else as an absolute set.
+
+        Every held-back callback still runs once: the newest with that
+        command's reply, the ones it replaced with the same reply marked
+        superseded, and all of them with a superseded reply without a line
+        if the targets cancelled out and nothing was sent.
+
+        Returns:
+            Future, or None if the value was held back or already set
+        """
+        value = int(min(max(value, 0), 255))
+        if self._pwm_in_flight is not None:
+            if self._next_pwm is not None and self._next_pwm[1] is not None:
+                self._superseded_pwm.append(self._next_pwm[1])
+            self._next_pwm = (value, callback)
+            return None
+        return self._send_pwm(value, callback, [])
+
+    def _send_pwm(self, value, callback, superseded):
+        self._next_pwm = None
+        if value == self.pwm[1] == self.pwm[2] and self.ramp[1] == self.ramp[2] == 'idle':
+            return None
+        self._pwm_in_flight = value
+        if self.pwm[1] == self.pwm[2] and abs(value - self.pwm[1]) == PWM_STEP:
+            cmd = 'u' if value > self.pwm[1] else 'j'
+        else:
+            cmd = set_pwm_command(value)
+
+        def done(reply):
+            self._pwm_in_flight = None
+            if callback is not None:
+                callback(reply)
+            for replaced in superseded:
+                replaced(reply._replace(superseded=True))
+            if self._next_pwm is not None:
+                value, held = self._next_pwm
+                replaced, self._superseded_pwm = self._superseded_pwm, []
+                if self._send_pwm(value, held, replaced) is None:
+                    # the held targets cancelled out: nothing goes out
+                    skipped = Reply(set_pwm_command(value), None, None, None, superseded=True)
+                    for waiting in replaced + ([held] if held is not None else []):
+                        waiting(skipped)
+        return self.send(cmd, done)
+
+    def set_digipot(self, position, channel='*', callback=None):
+        """Set a channel's (or both channels') digipot position in one command."""
+        return self.send(set_digipot_command(position, channel), callback)
+
+    def upload_ramp(self, profile, step, interval, ceiling, hold=0, down=0, callback=None):
+        """
+        Store a ramp profile in the firmware (see
+        nmes_serial.ramp_profile_command()); upload once, e.g. at start-up.
+        """
+        return self.send(ramp_profile_command(profile, step, interval, ceiling, hold, down),
+                         callback)
+
+    def start_ramp(self, profile=0, channel=1, callback=None):
+        """
+        Have the firmware switch the channel on and ramp its PWM with a
+        stored profile: the whole ramp costs this one command.
+        """
+        self._wanted_active[channel] = True
+        self._active_in_flight[channel] += 1   # it switches the channel on
+        self.ramp[channel] = 'up'
+
+        def done(reply):
+            self._active_in_flight[channel] -= 1
+            if callback is not None:
+                callback(reply)
+        return self.send(ramp_command('start', channel, profile), done)
+
+    def hold_ramp(self, channel=1, callback=None):
+        """Stop the ramp climbing; it ramps down after the profile's hold."""
+        return self.send(ramp_command('hold', channel), callback)
+
+    def abort_ramp(self, channel=1, callback=None):
+        """Ramp down now; the firmware switches the channel off at the end."""
+        return self.send(ramp_command('abort', channel), callback)
+
+    def query_ramp(self, channel=1, callback=None):
+        """Ask for the ramp's phase and PWM (telemetry reports it anyway)."""
+        return self.send(ramp_command('query', channel), callback)
+
+    def reset(self, channel=1, callback=None):
+        """
+        Back to the resting pulse width (one set_pwm(), after any step or
+        set still in flight, ending any ramp) and switch the channel off.
+        Cheap to call every frame: nothing is sent once both are done.
+
+        Returns:
+            Future of the switch-off, or None if the channel was already off
+        """
+        self.set_pwm(PWM_REST, callback)
+        return self.deactivate(channel)
+
+    def _record(self, reply):
+        kind = reply.command[:1]
+        if reply.line is None:
+            if reply.error is None:
+                self._timeouts[kind] = self._timeouts.get(kind, 0) + 1
+            # a switch that wasn't confirmed may not have happened
+            if kind == 'A':
+                channel = int(reply.command[1])
+                self._wanted_active[channel] = self.active[channel]
+            return
+        samples = self._latency.get(kind)
+        if samples is None:
+            samples = self._latency[kind] = deque(maxlen=500)
+        samples.append(reply.acked_at - reply.sent_at)
+
+        match = _PWM_ACK.search(reply.line)
+        if match:
+            self.pwm[1], self.pwm[2] = int(match.group(1)), int(match.group(2))
+            # manual settings end the firmware's ramps
+            channel = reply.command[1:2] if kind == 'P' else '*'
+            for ramped in (1, 2):
+                if channel in ('*', str(ramped)):
+                    self.ramp[ramped] = 'idle'
+        match = _CHANNEL_ACK.search(reply.line)
+        if match:
+            channel = int(match.group(1))
+            self.active[channel] = match.group(2) == 'active'
+            if not self.active[channel]:
+                self.ramp[channel] = 'idle'
+        match = _RAMP_ACK.search(reply.line)
+        if match:
+            channel = int(match.group(1))
+            if match.group(2) != 'idle':
+                self.active[channel] = True
+            elif self.ramp[channel] != 'idle':
+                # the ramp ran out, and the firmware switched the channel off
+                self.active[channel] = False
+                if not self._active_in_flight[channel]:
+                    self._wanted_active[channel] = False
+            self.ramp[channel] = match.group(2)
+            self.pwm[channel] = int(match.group(4))
+        match = _POT_ACK.search(reply.line)
+        if match:
+            self.pot[int(match.group(1))] = int(match.group(2))
+
+    def _on_line(self, line):
+        # A line no command waited for: a ramp started in text mode prints
+        # its channel switching off when it runs out
+        match = _CHANNEL_ACK.search(line)
+        if match:
+            channel = int(match.group(1))
+            self.active[channel] = match.group(2) == 'active'
+            if not self.active[channel]:
+                self.ramp[channel] = 'idle'
+            if not self._active_in_flight[channel]:
+                self._wanted_active[channel] = self.active[channel]
+
+    def _on_status(self, status):
+        # Telemetry is the firmware's word on the state, newer than any ack
+        # applied before it
+        if self._status_seq is not None:
+            self.status_lost += (status.seq - self._status_seq - 1) & 0xFF
+        self._status_seq = status.seq
+        self.status_frames += 1
+        self.pwm[1], self.pwm[2] = status.pwm1, status.pwm2
+        self.pot[1], self.pot[2] = status.pot1, status.pot2
+        self.active[1], self.active[2] = status.channel1, status.channel2
+        self.feedback[1], self.feedback[2] = status.feedback1, status.feedback2
+        ramps = {1: status.ramp1, 2: status.ramp2}
+        for channel in (1, 2):
+            if not self._active_in_flight[channel]:
+                self._wanted_active[channel] = self.active[channel]
+                if ramps[channel] is not None:
+                    self.ramp[channel] = ramps[channel]
+
+    def stats(self):
+        """
+        Get the ack latency of each command kind.
+
+        Returns:
+            Dict of command kind ('u', 'P', ...) -> dict of count, timeouts,
+            p50, p95 and p99 in milliseconds
+        """
+        report = {}
+        for kind in sorted(set(self._latency) | set(self._timeouts)):
+            ms = np.array(self._latency.get(kind, ())) * 1000
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99)) if len(ms) else (np.nan,) * 3
+            report[kind] = {'count': len(ms), 'timeouts': self._timeouts.get(kind, 0),
+                            'p50': round(float(p50), 2), 'p95': round(float(p95), 2),
+                            'p99': round(float(p99), 2)}
+        return report
+
+    def close(self):
+        """Send what is queued, print the ack latency report and close the port."""
+        if self.telemetry:
+            self.send(telemetry_command(0))
+        self.queue.close()
+        self.poll()
+        for kind, s in self.stats().items():
+            print(f"[NMES] '{kind}': {s['count']} acked, {s['timeouts']} timed out, "
+                  f"p50 {s['p50']} ms, p95 {s['p95']} ms, p99 {s['p99']} ms")
+        if self.status_frames:
+            print(f"[NMES] {self.status_frames} status frames, {self.status_lost} lost")
+        self.ser.close()
+        if self.simulator is not None:
+            self.simulator.close()
+
+
+def open_device(port=None, **kwargs):
+    """
+    Open the stimulator, or return None (with a message) if no board
+    answers, so games still run without the hardware.
+    """
+    try:
+        device = NMESDevice(port, **kwargs)
+    except serial.SerialException as e:
+        print(f"Serial connection failed: {e}")
+        return None
+    print("Connected to NMES device.")
+    return device
+
+
+# Example usage: python nmes_device.py [port] [--nmes-binary] [--nmes-sim]
+if __name__ == "__main__":
+    import sys
+
+    port = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1][0] != '-' else None
+    device = NMESDevice(port, max_level=10)
+
+    def settle():
+        while device.pending:
+            time.sleep(0.01)  # the game would keep rendering here
+        device.poll()
+
+    device.activate(1)
+    for _ in range(3):
+        device.step_up()
+        settle()
+    print(f"Level {device.level} ({device.percent}%), PWM {device.pwm}, active {device.active}")
+    device.reset()
+    settle()
+    print(f"Level {device.level}, PWM {device.pwm}, active {device.active}, "
+          f"feedback {device.feedback}")
+    device.close()
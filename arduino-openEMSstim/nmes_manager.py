@@ -0,0 +1,180 @@
+import asyncio
+from concurrent.futures import Future
+
+from nmes_device import NMESDevice
+
+
+class StimulatorManager:
+    def __init__(self, poll_interval=0.01, log=False):
+        """
+        Several stimulators (one per therapy station) driven from one
+        asyncio event loop.
+
+        Each station is an NMESDevice with its own port, command pipeline
+        and ack timeout, so a slow or unplugged unit only delays the
+        commands sent to it: awaits on other stations carry on. A task per
+        station calls the device's poll() on the event loop, so acks,
+        telemetry and callbacks are applied there, as a game applies them
+        once per frame.
+
+        Parameters:
+            poll_interval: Seconds between polls of each station
+            log: Print each station's commands and firmware lines
+        """
+        self.poll_interval = poll_interval
+        self.log = log
+        self.devices = {}            # station name -> NMESDevice
+        self._pollers = {}           # station name -> asyncio.Task
+        self._claimed = set()        # ports of open stations and of ones being opened
+        self._discovering = asyncio.Lock()
+
+    async def add(self, name, port=None, **kwargs):
+        """
+        Open a station's stimulator (in a thread: connecting waits for the
+        firmware) and start polling it. Stations that probe for their board
+        do so one at a time, skipping the ports other stations have claimed,
+        so two stations can't end up on the same board.
+
+        Parameters:
+            name: Station name
+            port: Serial port (None: probe for a board)
+            kwargs: Passed to NMESDevice (timeout, binary, simulate, ...)
+        Returns:
+            The NMESDevice
+        """
+        if name in self.devices:
+            raise ValueError(f"Station {name!r} is already open")
+        kwargs.setdefault('log', self.log)
+        if port is not None:
+            if port in self._claimed:
+                raise ValueError(f"Port {port} is already used by another station")
+            self._claimed.add(port)
+            try:
+                device = await asyncio.to_thread(NMESDevice, port, **kwargs)
+            except BaseException:
+                self._claimed.discard(port)
+                raise
+        elif kwargs.get('simulate'):
+            device = await asyncio.to_thread(NMESDevice, None, **kwargs)
+        else:
+            async with self._discovering:
+                device = await asyncio.to_thread(NMESDevice, None, exclude=set(self._claimed),
+                                                 **kwargs)
+        self._claimed.add(device.ser.port)
+        self.devices[name] = device
+        self._pollers[name] = asyncio.create_task(self._poll(device))
+        return device
+
+    async def add_all(self, stations, **kwargs):
+        """
+        Open several stations at once. One that fails to open is reported
+        and left out; the others are opened regardless.
+
+        Parameters:
+            stations: Dict of station name -> port
+            kwargs: Passed to NMESDevice for every station
+        Returns:
+            Dict of station name -> exception for the stations that failed
+        """
+        # stations with a port first, so their ports are claimed before
+        # the others probe
+        names = sorted(stations, key=lambda name: stations[name] is None)
+        results = await asyncio.gather(*(self.add(name, stations[name], **kwargs)
+                                         for name in names),
+                                       return_exceptions=True)
+        failed = {name: result for name, result in zip(names, results)
+                  if isinstance(result, BaseException)}
+        for name, error in failed.items():
+            print(f"[Stations] {name} not opened: {error}")
+        return failed
+
+    async def _poll(self, device):
+        while True:
+            device.poll()
+            await asyncio.sleep(self.poll_interval)
+
+    async def call(self, name, method, *args, timeout=None, **kwargs):
+        """
+        Run an NMESDevice operation on a station and await its ack.
+
+        Parameters:
+            name: Station name
+            method: NMESDevice method, e.g. 'send', 'step_up', 'start_ramp'
+            args, kwargs: Its arguments
+            timeout: Seconds to wait (default: the device's ack timeout for
+                     each command queued ahead, and this one)
+        Returns:
+            The nmes_serial.Reply (its line is None if the firmware didn't
+            acknowledge), or None if the operation had nothing to send
+        Raises:
+            asyncio.TimeoutError if the station didn't complete it in time
+            (the command itself is not cancelled); the serial error if its
+            port failed
+        """
+        device = self.devices[name]
+        if timeout is None:
+            timeout = device.queue.timeout * (device.pending + 1)
+        future = getattr(device, method)(*args, **kwargs)
+        if not isinstance(future, Future):
+            return None
+        # shielded: timing out leaves the command queued, so the device's
+        # callbacks and the next command still see it complete
+        reply = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        device.poll()   # apply the ack before the caller looks at the state
+        return reply
+
+    async def send(self, name, cmd, timeout=None):
+        """Send a firmware command to a station and await its ack (see call())."""
+        return await self.call(name, 'send', cmd, timeout=timeout)
+
+    async def broadcast(self, method, *args, timeout=None, **kwargs):
+        """
+        Run the same operation on every station concurrently.
+
+        Returns:
+            Dict of station name -> Reply, None, or the exception it raised
+        """
+        names = list(self.devices)
+        results = await asyncio.gather(*(self.call(name, method, *args, timeout=timeout, **kwargs)
+                                         for name in names), return_exceptions=True)
+        return dict(zip(names, results))
+
+    async def remove(self, name):
+        """Stop polling a station and close its device (in a thread)."""
+        self._pollers.pop(name).cancel()
+        device = self.devices.pop(name)
+        await asyncio.to_thread(device.close)
+        self._claimed.discard(device.ser.port)
+
+    async def close(self):
+        """Close every station."""
+        await asyncio.gather(*(self.remove(name) for name in list(self.devices)),
+                             return_exceptions=True)
+
+
+# Example usage: python nmes_manager.py [stations]
+# Simulated stations step up and back down at once; one is unplugged
+# halfway and the others carry on.
+if __name__ == "__main__":
+    import sys
+    import time
+
+    async def main(count):
+        manager = StimulatorManager()
+        await manager.add_all({f"station{i}": None for i in range(count)},
+                              simulate=True, timeout=0.5)
+        start = time.monotonic()
+        unplugged = manager.devices['station0'].simulator
+        for step in range(6):
+            if step == 3:
+                unplugged.close()
+            results = await manager.broadcast('send', 'u' if step < 3 else 'j')
+            print(f"step {step}: " + ', '.join(
+                f"{name}: {result.line if not isinstance(result, BaseException) else repr(result)}"
+                for name, result in results.items()))
+        elapsed = time.monotonic() - start
+        print(f"{6 * count} commands in {elapsed:.2f} s "
+              f"({6 * count / elapsed:.0f} acks/s over {count} stations)")
+        await manager.close()
+
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 3))
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+from serial.tools import list_ports
+
+# Lines that show the sketch is running: the end of setup(), the answer to
+# the 'p' ping, or (firmware without 'p') the echo of any command
+READY_LINES = (b'SETUP DONE', b'PONG', b'USB: received command')
+
+# USB serial adapters the board shows up as (macOS: the cu. side only)
+PORT_PREFIXES = ('/dev/ttyACM', '/dev/ttyUSB', '/dev/cu.usbmodem', '/dev/cu.usbserial', 'COM')
+ARDUINO_VID = 0x2341
+
+
+def candidate_ports():
+    """Serial ports that may be the board, Arduino USB IDs first."""
+    ports = [info for info in list_ports.comports() if info.device.startswith(PORT_PREFIXES)]
+    ports.sort(key=lambda info: (info.vid != ARDUINO_VID, info.device))
+    return [info.device for info in ports]
+
+
+def open_serial(port, baudrate=19200, reset=False, timeout=0.05):
+    """
+    Open a port, where possible without resetting a board that is already
+    running. The Nano resets on a rising DTR edge, and the OS raises DTR
+    when the port opens whatever was asked beforehand, so DTR is left
+    asserted and, on POSIX, HUPCL is cleared after the open: closing the
+    port then keeps DTR high and the next open finds it high already, so
+    there is no edge and no reset.
+
+    Which opens avoid the reset:
+        Linux, macOS: every open after the first; the first open after
+            plugging the board in, or after a program that closed the port
+            with HUPCL set (e.g. the Arduino IDE's serial monitor), still
+            resets it
+        Windows: none (closing a port always drops DTR)
+    After a reset wait_ready() waits out the bootloader, so callers don't
+    need to know which case they hit.
+
+    The port is opened exclusively (POSIX: a lock other exclusive opens
+    respect), so a probe can't take over a board another game or station
+    already has open.
+
+    Parameters:
+        port: Device, e.g. '/dev/ttyACM0' or 'COM12'
+        baudrate: Serial speed
+        reset: Reset the board on purpose (pulses DTR after the open)
+        timeout: Read timeout of the returned Serial
+    Returns:
+        Open serial.Serial
+    """
+    ser = serial.Serial(port, baudrate, timeout=timeout, exclusive=True)
+    if os.name == 'posix' and hasattr(ser, 'fd'):
+        import termios
+        attrs = termios.tcgetattr(ser.fd)
+        attrs[2] &= ~termios.HUPCL
+        termios.tcsetattr(ser.fd, termios.TCSANOW, attrs)
+    if reset:
+        ser.dtr = False
+        time.sleep(0.05)
+        ser.dtr = True
+    return ser
+
+
+def wait_ready(ser, timeout=3.0, ping_interval=0.25, stop=None):
+    """
+    Wait until the firmware answers: its SETUP DONE line after a reset, or
+    the PONG to the 'p' pings sent meanwhile. Replaces the fixed sleep
+    after opening the port: a running board answers in tens of ms.
+
+    Parameters:
+        ser: Open serial.Serial (text mode)
+        timeout: Seconds to wait
+        ping_interval: Seconds between pings
+        stop: threading.Event that gives up early when set
+    Returns:
+        True if the firmware answered; its start-up text and any late
+        answers have been read, so the next line is a command's
+    """
+    start = time.monotonic()
+    next_ping = start
+    line = b''
+    while time.monotonic() - start < timeout and not (stop is not None and stop.is_set()):
+        if time.monotonic() >= next_ping:
+            ser.write(b'p\r\n')
+            next_ping += ping_interval
+        line += ser.readline()
+        if any(ready in line for ready in READY_LINES):
+            # let the answer (and one from an earlier ping) finish
+            while ser.readline():
+                pass
+            return True
+        if line.endswith(b'\n'):
+            line = b''
+    return False
+
+
+def probe(port, baudrate=19200, timeout=3.0, reset=False, stop=None):
+    """
+    Open a port and wait for the firmware on it.
+
+    Returns:
+        The ready serial.Serial, or None (port closed again)
+    """
+    try:
+        ser = open_serial(port, baudrate, reset)
+    except (serial.SerialException, OSError, ValueError):
+        return None
+    try:
+        if wait_ready(ser, timeout, stop=stop):
+            return ser
+    except (serial.SerialException, OSError):
+        pass
+    ser.close()
+    return None
+
+
+def discover(baudrate=19200, timeout=3.0, reset=False, ports=None, exclude=()):
+    """
+    Find the board by probing the candidate ports in parallel (each gets a
+    'p' ping); the first to answer wins and the other probes stop.
+
+    Parameters:
+        baudrate: Serial speed
+        timeout: Seconds to wait for an answer
+        reset: Let opening the ports reset the boards
+        ports: Ports to probe (default: candidate_ports())
+        exclude: Ports not to probe (boards already claimed)
+    Returns:
+        The ready serial.Serial, or None if no port answered
+    """
+    ports = [port for port in (candidate_ports() if ports is None else ports)
+             if port not in exclude]
+    if not ports:
+        return None
+    stop = threading.Event()
+    found = None
+    with ThreadPoolExecutor(len(ports)) as pool:
+        for future in as_completed([pool.submit(probe, port, baudrate, timeout, reset, stop)
+                                    for port in ports]):
+            ser = future.result()
+            if ser is not None and found is None:
+                found = ser
+                stop.set()
+            elif ser is not None:
+                ser.close()
+    return found
+
+
+def connect(port=None, baudrate=19200, reset=False, timeout=3.0, log=True, exclude=()):
+    """
+    Open the board ready for commands.
+
+    Parameters:
+        port: Serial port, or None to discover() it
+        baudrate: Serial speed
+        reset: Let opening the port reset the board
+        timeout: Seconds to wait for the firmware
+        log: Print where the board was found and how long it took
+        exclude: Ports discover() must not probe
+    Returns:
+        The ready serial.Serial
+    Raises:
+        serial.SerialException if the port can't be opened or the firmware
+        doesn't answer
+    """
+    start = time.monotonic()
+    if port is None:
+        ser = discover(baudrate, timeout, reset, exclude=exclude)
+        if ser is None:
+            raise serial.SerialException(f"No openEMSstim board answered on {candidate_ports()}")
+    else:
+        ser = open_serial(port, baudrate, reset)
+        if not wait_ready(ser, timeout):
+            ser.close()
+            raise serial.SerialException(f"No answer from the firmware on {port}")
+    if log:
+        print(f"[NMES] Board ready on {ser.port} after {time.monotonic() - start:.2f} s")
+    return ser
+
+
+# Example usage: python nmes_port.py [port] [--reset]
+if __name__ == "__main__":
+    import sys
+
+    args = [arg for arg in sys.argv[1:] if arg != '--reset']
+    print(f"Candidates: {candidate_ports()}")
+    with connect(args[0] if args else None, reset='--reset' in sys.argv) as ser:
+        ser.write(b'p\r\n')
+        print(ser.readlines())
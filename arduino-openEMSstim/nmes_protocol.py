@@ -0,0 +1,247 @@
+from collections import namedtuple
+
+# Binary frames, both directions (opt-in; the text commands keep working):
+#
+#   0xA5 | seq | command | length | payload (length bytes) | crc8
+#
+# seq is chosen by the host and echoed in the reply, command is the
+# single-char command byte ('u', 'j', '1', ...), 'P' / 'D' / 'A' for the
+# absolute set commands (payload: channel char, value), 'T' for the
+# telemetry period (payload: ms) or a ramp command: 'R' (payload: profile,
+# step, interval, ceiling, hold, down; ms values 16-bit), 'G' (channel
+# char, profile), 'H' / 'X' / '?' (channel char). Multi-byte values are
+# big-endian. Every reply carries the command's status and the stimulator
+# state (see DeviceState). The CRC is CRC-8 (polynomial 0x07) over seq,
+# command, length and payload.
+#
+# With telemetry on, the firmware also pushes a status frame (command 'S',
+# seq counting the frames) every period between replies, see Telemetry.
+FRAME_SYNC = 0xA5
+HEADER_SIZE = 4
+MAX_PAYLOAD = 12
+
+STATUS_OK = 0
+STATUS_UNKNOWN_COMMAND = 1
+STATUS_BAD_PAYLOAD = 2
+STATUS_BAD_FRAME = 3     # CRC or length error; seq may be garbage
+
+TELEMETRY_COMMAND = ord('S')
+
+# Phases of a firmware ramp, by number
+RAMP_PHASES = ('idle', 'up', 'hold', 'down')
+
+Frame = namedtuple('Frame', ['seq', 'command', 'payload'])
+
+# Reply payload: status, PWM pulse width and digipot position of both
+# channels, and which channels are active; replies to ramp commands add the
+# channel's ramp phase (a RAMP_PHASES name) and profile
+DeviceState = namedtuple('DeviceState', ['status', 'pwm1', 'pwm2', 'pot1', 'pot2',
+                                         'channel1', 'channel2', 'ramp', 'profile'],
+                         defaults=(None, None))
+
+# Telemetry payload: PWM and digipot of both channels, the channel flags
+# (bits 0-1) with the top bits of the 10-bit A2 / A3 feedback readings
+# (bits 2-3 / 4-5), the low bytes of the readings, and the ramp phases
+# (bits 0-1 / 2-3)
+Telemetry = namedtuple('Telemetry', ['seq', 'pwm1', 'pwm2', 'pot1', 'pot2', 'channel1',
+                                     'channel2', 'feedback1', 'feedback2', 'ramp1', 'ramp2'],
+                       defaults=(None, None))
+
+_CRC_TABLE = []
+for _byte in range(256):
+    _crc = _byte
+    for _ in range(8):
+        _crc = ((_crc << 1) ^ 0x07) & 0xFF if _crc & 0x80 else (_crc << 1) & 0xFF
+    _CRC_TABLE.append(_crc)
+
+
+def crc8(data):
+    """CRC-8 (polynomial 0x07, initial value 0) of a bytes-like object."""
+    crc = 0
+    for byte in data:
+        crc = _CRC_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_frame(seq, command, payload=b''):
+    """
+    Build one frame.
+
+    Parameters:
+        seq: Sequence number 0-255
+        command: Command byte (int) or one-char string
+        payload: Up to MAX_PAYLOAD bytes
+    Returns:
+        bytes ready to write
+    """
+    if isinstance(command, str):
+        command = ord(command)
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    body = bytes((seq & 0xFF, command, len(payload))) + bytes(payload)
+    return bytes((FRAME_SYNC,)) + body + bytes((crc8(body),))
+
+
+def encode_command(seq, cmd):
+    """
+    Frame a text command: 'u', '1', ..., an absolute set such as 'P*=128' or
+    'A1=1', a telemetry period such as 'T=100', or a ramp command such as
+    'R0=10,100,248,0,100', 'G1=0' or 'X1'.
+
+    Parameters:
+        seq: Sequence number 0-255
+        cmd: Command as sent in text mode (see nmes_serial)
+    Returns:
+        bytes ready to write
+    """
+    if len(cmd) == 1:
+        return encode_frame(seq, cmd)
+    if cmd[0] in 'PDAG' and cmd[2:3] == '=' and cmd[3:].isdigit():
+        return encode_frame(seq, cmd[0], bytes((ord(cmd[1]), min(int(cmd[3:]), 255))))
+    if cmd[:2] == 'T=' and cmd[2:].isdigit():
+        return encode_frame(seq, 'T', min(int(cmd[2:]), 0xFFFF).to_bytes(2, 'big'))
+    if cmd[0] in 'HX?' and len(cmd) == 2:
+        return encode_frame(seq, cmd[0], cmd[1].encode())
+    if cmd[0] == 'R' and cmd[2:3] == '=' and cmd[1].isdigit():
+        fields = [int(field) for field in cmd[3:].split(',')]
+        if len(fields) == 5:
+            step, interval, ceiling, hold, down = (min(field, 0xFFFF) for field in fields)
+            return encode_frame(seq, 'R', bytes((int(cmd[1]), min(step, 255))) +
+                                interval.to_bytes(2, 'big') + bytes((min(ceiling, 255),)) +
+                                hold.to_bytes(2, 'big') + down.to_bytes(2, 'big'))
+    raise ValueError(f"No binary form for command {cmd!r}")
+
+
+class FrameDecoder:
+    def __init__(self):
+        """
+        Split a byte stream into frames. Bytes before a sync byte (e.g. text
+        the firmware printed at start-up) and frames with a bad CRC are
+        skipped, resynchronizing on the next sync byte.
+        """
+        self._buffer = bytearray()
+        self.bad_frames = 0
+
+    def feed(self, data):
+        """
+        Add received bytes.
+
+        Returns:
+            List of the complete, valid Frames they finished
+        """
+        self._buffer += data
+        frames = []
+        while True:
+            start = self._buffer.find(FRAME_SYNC)
+            if start < 0:
+                self._buffer.clear()
+                return frames
+            del self._buffer[:start]
+            if len(self._buffer) < HEADER_SIZE:
+                return frames
+            length = self._buffer[3]
+            if length > MAX_PAYLOAD:
+                self.bad_frames += 1
+                del self._buffer[0]
+                continue
+            end = HEADER_SIZE + length + 1
+            if len(self._buffer) < end:
+                return frames
+            body = bytes(self._buffer[1:end - 1])
+            if crc8(body) != self._buffer[end - 1]:
+                self.bad_frames += 1
+                del self._buffer[0]
+                continue
+            frames.append(Frame(body[0], body[1], body[3:]))
+            del self._buffer[:end]
+
+
+def parse_state(frame):
+    """Get the DeviceState carried by a reply frame (None if malformed)."""
+    payload = frame.payload
+    if len(payload) < 6:
+        return None
+    ramp, profile = (RAMP_PHASES[payload[6] & 3], payload[7]) if len(payload) >= 8 else (None, None)
+    return DeviceState(payload[0], payload[1], payload[2], payload[3], payload[4],
+                       bool(payload[5] & 1), bool(payload[5] & 2), ramp, profile)
+
+
+def parse_telemetry(frame):
+    """Get the Telemetry of a status frame (None if malformed)."""
+    payload = frame.payload
+    if frame.command != TELEMETRY_COMMAND or len(payload) < 7:
+        return None
+    flags = payload[4]
+    ramps = (RAMP_PHASES[payload[7] & 3], RAMP_PHASES[payload[7] >> 2 & 3]) \
+        if len(payload) >= 8 else (None, None)
+    return Telemetry(frame.seq, payload[0], payload[1], payload[2], payload[3],
+                     bool(flags & 1), bool(flags & 2),
+                     (flags >> 2 & 3) << 8 | payload[5], (flags >> 4 & 3) << 8 | payload[6],
+                     *ramps)
+
+
+def describe(command, state):
+    """
+    Text the firmware prints in text mode for a command, rebuilt from a
+    binary reply, so callers can treat both modes alike.
+
+    Parameters:
+        command: Command byte (int) or the command as sent in text mode
+                 (e.g. 'u' or 'D2=7')
+        state: DeviceState of the reply
+    Returns:
+        Ack text, or None if the command failed
+    """
+    if state is None or state.status != STATUS_OK:
+        return None
+    command = chr(command) if isinstance(command, int) else command
+    if command == 'D' or command[:2] in ('D1', 'D*'):
+        return f"EMS: Intensity Channel 1: {state.pot1}"
+    if command[:2] == 'D2':
+        return f"EMS: Intensity Channel 2: {state.pot2}"
+    if command[:1] == 'A':
+        # 'A*' prints channel 1 then 2; the last line is the ack
+        channel = 1 if command[1:2] == '1' else 2
+        active = state.channel1 if channel == 1 else state.channel2
+        return f"EMS: Channel {channel} {'active' if active else 'inactive'}"
+    if command[:2] == 'T=':
+        period = int(command[2:])
+        return f"Telemetry: every {period} ms" if period else "Telemetry: off"
+    if command[:1] == 'R' and command[2:3] == '=':
+        return f"Ramp {command[1]} stored: {command[3:]}"
+    if command[:1] in ('G', 'H', 'X', '?') and command[1:2] in ('1', '2') and state.ramp:
+        pwm = state.pwm1 if command[1] == '1' else state.pwm2
+        return f"Ramp CH{command[1]}: {state.ramp}, profile {state.profile}, PWM={pwm}"
+    command = command[:1]
+    if command in '12':
+        active = state.channel1 if command == '1' else state.channel2
+        return f"EMS: Channel {command} {'active' if active else 'inactive'}"
+    if command in 'uj':
+        change = 'Increased' if command == 'u' else 'Decreased'
+        return f"PWM {change}: CH1={state.pwm1}, CH2={state.pwm2}"
+    if command == 'P':
+        return f"PWM Set: CH1={state.pwm1}, CH2={state.pwm2}"
+    if command in 'aq':
+        return f"EMS: Intensity Channel 1: {state.pot1}"
+    if command in 'sw':
+        return f"EMS: Intensity Channel 2: {state.pot2}"
+    if command == 'p':
+        return "PONG: openEMSstim"
+    return None
+
+
+# Example usage: round-trip a few frames through the decoder, with noise
+if __name__ == "__main__":
+    stream = b'SETUP DONE\r\n' + encode_command(1, 'u') + encode_command(2, 'P*=128')
+    corrupt = bytearray(encode_command(3, 'j'))
+    corrupt[-1] ^= 0xFF
+    stream += bytes(corrupt) + encode_frame(4, 'u', bytes((STATUS_OK, 138, 138, 255, 255, 1)))
+    stream += encode_frame(0, TELEMETRY_COMMAND, bytes((138, 138, 255, 255, 0b011001, 188, 44)))
+    decoder = FrameDecoder()
+    for frame in decoder.feed(stream[:7]) + decoder.feed(stream[7:]):
+        if frame.command == TELEMETRY_COMMAND:
+            print(frame, parse_telemetry(frame))
+        else:
+            print(frame, describe(frame.command, parse_state(frame)))
+    print(f"{decoder.bad_frames} bad frame(s) skipped; "
+          f"text ack ~90 bytes vs binary reply {HEADER_SIZE + 6 + 1} bytes")
@@ -0,0 +1,471 @@
+import argparse
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import CancelledError, Future
+
+from nmes_protocol import (TELEMETRY_COMMAND, FrameDecoder, describe, encode_command,
+                           parse_state, parse_telemetry)
+
+# Text the firmware prints when it has carried out each single-char command
+# (see doCommand() in arduino-openEMSstim.ino)
+ACKS = {
+    '1': 'Channel 1',
+    '2': 'Channel 2',
+    'u': 'PWM Increased',
+    'j': 'PWM Decreased',
+    'a': 'Intensity Channel 1',
+    'q': 'Intensity Channel 1',
+    's': 'Intensity Channel 2',
+    'w': 'Intensity Channel 2',
+    'p': 'PONG',
+}
+
+# Pulse width the firmware starts with (no assist) and the change per u / j
+PWM_REST = 128
+PWM_STEP = 10
+
+
+def set_pwm_command(value, channel='*'):
+    """
+    Absolute PWM command (one round-trip instead of a run of u / j).
+
+    Parameters:
+        value: Pulse width 0-255
+        channel: 1, 2 or '*' for both
+    """
+    return f"P{channel}={int(min(max(value, 0), 255))}"
+
+
+def set_digipot_command(position, channel='*'):
+    """
+    Absolute digipot command (255 = most resistance, no EMS).
+
+    Parameters:
+        position: Wiper position 0-255
+        channel: 1, 2 or '*' for both
+    """
+    return f"D{channel}={int(min(max(position, 0), 255))}"
+
+
+def set_active_command(on, channel='*'):
+    """
+    Switch channels on or off explicitly (a repeat is harmless, unlike the
+    '1' / '2' toggles).
+
+    Parameters:
+        on: True to switch on
+        channel: 1, 2 or '*' for both
+    """
+    return f"A{channel}={1 if on else 0}"
+
+
+def telemetry_command(period_ms):
+    """
+    Have the firmware push a status frame every period_ms (0: stop). The
+    frames are binary; BinaryCommandQueue reads them.
+    """
+    return f"T={int(min(max(period_ms, 0), 0xFFFF))}"
+
+
+def ramp_profile_command(profile, step, interval, ceiling, hold=0, down=0):
+    """
+    Store a ramp profile in the firmware (upload once, then start it with
+    ramp_command('start', ...)).
+
+    Parameters:
+        profile: Slot 0-3
+        step: PWM change per step
+        interval: ms between steps up
+        ceiling: Highest PWM the ramp goes to
+        hold: ms at the ceiling (or after 'hold') before ramping down,
+              0 = until 'abort'
+        down: ms between steps down to the starting PWM (0: straight
+              back); the channel is switched off at the end
+    """
+    values = [int(min(max(value, 0), limit)) for value, limit in
+              ((step, 255), (interval, 0xFFFF), (ceiling, 255), (hold, 0xFFFF), (down, 0xFFFF))]
+    return f"R{profile}=" + ','.join(map(str, values))
+
+
+# Ramp actions and their command letters
+RAMP_ACTIONS = {'start': 'G', 'hold': 'H', 'abort': 'X', 'query': '?'}
+
+
+def ramp_command(action, channel=1, profile=0):
+    """
+    Control the ramp of a channel: 'start' (a stored profile, switching
+    the channel on), 'hold' (stop climbing), 'abort' (ramp down now and
+    switch off) or 'query'.
+
+    Parameters:
+        action: Key of RAMP_ACTIONS
+        channel: 1 or 2
+        profile: Slot to start
+    """
+    letter = RAMP_ACTIONS[action]
+    return f"G{channel}={profile}" if letter == 'G' else f"{letter}{channel}"
+
+
+def expected_ack(cmd):
+    """Text of the firmware line acknowledging cmd (None if unknown)."""
+    if cmd in ACKS:
+        return ACKS[cmd]
+    if cmd[:1] == 'P' and cmd[2:3] == '=':
+        return 'PWM Set'
+    if cmd[:1] in ('D', 'A') and cmd[2:3] == '=':
+        # '*' sets channel 1 then 2; the second line completes it
+        ack = 'Intensity Channel' if cmd[0] == 'D' else 'Channel'
+        return f"{ack} 1" if cmd[1] == '1' else f"{ack} 2"
+    if cmd[:2] == 'T=':
+        return 'Telemetry'
+    if cmd[:1] == 'R' and cmd[2:3] == '=':
+        return f"Ramp {cmd[1]} stored"
+    if cmd[:1] in RAMP_ACTIONS.values() and cmd[1:2] in ('1', '2'):
+        return f"Ramp CH{cmd[1]}:"
+    return None
+
+# Outcome of one command. line is the acknowledging line from the firmware,
+# or None if none came within the timeout; sent_at / acked_at are
+# time.monotonic() after the write and at the ack (None without one).
+# error is set (and line None) if the command was cancelled or the port
+# failed. superseded marks the reply given to a request that was merged into
+# a later command (see NMESDevice.set_pwm()): the reply is that command's.
+Reply = namedtuple('Reply', ['command', 'line', 'sent_at', 'acked_at', 'error', 'superseded'],
+                   defaults=(None, False))
+
+_STOP = object()
+
+# Seconds between checks for lines the firmware prints on its own while the
+# text queue has nothing to send
+IDLE_READ = 0.05
+
+
+class SerialCommandQueue:
+    def __init__(self, ser, timeout=1.0, log=True, on_line=None):
+        """
+        Send stimulator commands from a background thread so the game loop
+        never waits for the serial port.
+
+        Commands are written in the order they were sent, one at a time:
+        each waits for its ack (or the timeout) before the next goes out.
+        send() returns at once with a Future; callbacks passed to send()
+        run on the game's own thread, from poll().
+
+        Without on_line, lines no command waits for are dropped. With it,
+        the port is also read between commands, so what the firmware
+        prints on its own (a ramp switching its channel off) gets through.
+
+        Parameters:
+            ser: Open serial.Serial (a read timeout keeps close() prompt)
+            timeout: Default seconds to wait for an ack
+            log: Print commands and firmware lines
+            on_line: Called as on_line(line) from poll() for each line
+                     that acknowledged no command
+        """
+        self.ser = ser
+        self.timeout = timeout
+        self.log = log
+        self.on_line = on_line
+        self._commands = queue.Queue()
+        self._done = queue.Queue()       # (callback, reply) waiting for poll()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Commands sent but not yet acknowledged or timed out."""
+        return self._pending
+
+    def send(self, cmd, expect=None, timeout=None, callback=None):
+        """
+        Queue a command.
+
+        Parameters:
+            cmd: Command text without line ending, e.g. 'u'
+            expect: Text the ack line contains (default: expected_ack(cmd);
+                    commands without one complete on the first line received)
+            timeout: Seconds to wait for the ack (default: the queue's)
+            callback: Called as callback(reply) from poll() once the
+                      command completes, also if it was cancelled or
+                      failed (reply.error), so callers can always clean up
+        Returns:
+            concurrent.futures.Future resolving to a Reply; cancel() drops
+            the command if it hasn't been written yet
+        """
+        future = Future()
+        with self._pending_lock:
+            self._pending += 1
+        self._commands.put((cmd, expect or expected_ack(cmd), timeout or self.timeout,
+                            future, callback))
+        return future
+
+    def poll(self):
+        """
+        Run the callbacks of completed commands. Call once per frame from
+        the game loop.
+
+        Returns:
+            Number of callbacks run
+        """
+        count = 0
+        while True:
+            try:
+                callback, reply = self._done.get_nowait()
+            except queue.Empty:
+                return count
+            callback(reply)
+            count += 1
+
+    def _complete(self, future, callback, reply):
+        # Resolve a command; its callback runs from poll() whatever the outcome.
+        # Queued first, so a poll() by whoever waits on the future applies it
+        if callback is not None:
+            self._done.put((callback, reply))
+        with self._pending_lock:
+            self._pending -= 1
+        if reply.error is not None and not future.cancelled():
+            future.set_exception(reply.error)
+        elif reply.error is None:
+            future.set_result(reply)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._commands.get(timeout=IDLE_READ if self.on_line else None)
+            except queue.Empty:
+                self._read_waiting()
+                continue
+            if item is _STOP:
+                return
+            cmd, expected, timeout, future, callback = item
+            if not future.set_running_or_notify_cancel():
+                self._complete(future, callback, Reply(cmd, None, None, None, CancelledError()))
+                continue
+            try:
+                reply = self._transact(cmd, expected, timeout)
+            except Exception as e:
+                self._complete(future, callback, Reply(cmd, None, None, None, e))
+                continue
+            self._complete(future, callback, reply)
+
+    def _read_waiting(self):
+        # Pass on the lines printed since the last command
+        while self.ser.in_waiting:
+            line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+            if line:
+                if self.log:
+                    print(f"<<< Arduino: {line}")
+                self._done.put((self.on_line, line))
+
+    def _transact(self, cmd, expected, timeout):
+        if self.on_line:
+            self._read_waiting()
+        else:
+            self.ser.reset_input_buffer()
+        self.ser.write(f"{cmd}\r\n".encode())
+        self.ser.flush()
+        sent_at = time.monotonic()
+        if self.log:
+            print(f">>> Sent: {cmd}")
+        while time.monotonic() - sent_at < timeout:
+            line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+            if not line:
+                continue
+            if self.log:
+                print(f"<<< Arduino: {line}")
+            if expected is None or expected in line:
+                return Reply(cmd, line, sent_at, time.monotonic())
+            if self.on_line:
+                self._done.put((self.on_line, line))
+        print(f"!!! No ack for '{cmd}' within {timeout}s")
+        return Reply(cmd, None, sent_at, None)
+
+    def close(self, wait=True):
+        """
+        Stop the worker thread.
+
+        Parameters:
+            wait: Finish the queued commands first (e.g. the final
+                  intensity reset); otherwise cancel them
+        """
+        if not wait:
+            while True:
+                try:
+                    item = self._commands.get_nowait()
+                except queue.Empty:
+                    break
+                cmd, _, _, future, callback = item
+                future.cancel()
+                self._complete(future, callback, Reply(cmd, None, None, None, CancelledError()))
+        self._commands.put(_STOP)
+        self._thread.join()
+
+
+class BinaryCommandQueue(SerialCommandQueue):
+    def __init__(self, ser, timeout=1.0, log=True, window=4, on_status=None):
+        """
+        SerialCommandQueue speaking the binary frame protocol
+        (nmes_protocol) instead of text.
+
+        Up to `window` commands are on the wire at once; replies are
+        matched to them by sequence number, not by scanning text. Replies
+        carry the same ack text as text mode (nmes_protocol.describe), so
+        callers work unchanged. Firmware without binary support never
+        answers, and every command times out.
+
+        A second thread reads the port all the time, so the status frames
+        the firmware pushes (telemetry_command()) are taken as they come:
+        the newest is kept in .status and each is passed to on_status from
+        poll(). If reading fails (board unplugged), the commands in flight
+        and every later one fail with that error instead of waiting.
+
+        Parameters:
+            ser: Open serial.Serial (short read timeout, e.g. 0.05 s)
+            timeout: Default seconds to wait for a reply
+            log: Print commands and replies
+            window: Most commands awaiting a reply at once
+            on_status: Called as on_status(telemetry) from poll() for each
+                       nmes_protocol.Telemetry received
+        """
+        self.window = window
+        self.on_status = on_status
+        self.status = None               # newest Telemetry
+        self.decoder = FrameDecoder()
+        self._in_flight = {}             # seq -> (cmd, future, callback, sent_at, deadline)
+        self._in_flight_changed = threading.Condition()
+        self._reading = True
+        self.error = None                # read error that stopped the reader
+        super().__init__(ser, timeout, log)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _run(self):
+        # Write queued commands while the window has room
+        seq = 0
+        while True:
+            item = self._commands.get()
+            if item is _STOP:
+                break
+            cmd, _, timeout, future, callback = item
+            if not future.set_running_or_notify_cancel():
+                self._complete(future, callback, Reply(cmd, None, None, None, CancelledError()))
+                continue
+            with self._in_flight_changed:
+                while len(self._in_flight) >= self.window:
+                    self._in_flight_changed.wait()
+                seq = (seq + 1) & 0xFF
+                try:
+                    if self.error is not None:
+                        raise self.error
+                    self.ser.write(encode_command(seq, cmd))
+                except Exception as e:
+                    self._complete(future, callback, Reply(cmd, None, None, None, e))
+                    continue
+                sent_at = time.monotonic()
+                self._in_flight[seq] = (cmd, future, callback, sent_at, sent_at + timeout)
+            if self.log:
+                print(f">>> Sent #{seq}: {cmd}")
+        with self._in_flight_changed:
+            while self._in_flight:
+                self._in_flight_changed.wait()
+
+    def _read(self):
+        # Match replies by sequence number, take status frames, then expire
+        # the overdue commands
+        while self._reading:
+            try:
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                self._fail(e)
+                return
+            now = time.monotonic()
+            for frame in self.decoder.feed(data):
+                if frame.command == TELEMETRY_COMMAND:
+                    self._status(parse_telemetry(frame))
+                    continue
+                with self._in_flight_changed:
+                    entry = self._in_flight.pop(frame.seq, None)
+                    self._in_flight_changed.notify_all()
+                if entry is None:
+                    continue
+                cmd, future, callback, sent_at, _ = entry
+                line = describe(cmd, parse_state(frame))
+                if self.log:
+                    print(f"<<< Arduino #{frame.seq}: {line or 'failed'}")
+                self._complete(future, callback, Reply(cmd, line, sent_at, now if line else None))
+            with self._in_flight_changed:
+                overdue = [(key, entry) for key, entry in self._in_flight.items() if now > entry[4]]
+                for key, _ in overdue:
+                    del self._in_flight[key]
+                self._in_flight_changed.notify_all()
+            for _, (cmd, future, callback, sent_at, deadline) in overdue:
+                print(f"!!! No reply for '{cmd}' within {deadline - sent_at:.1f}s")
+                self._complete(future, callback, Reply(cmd, None, sent_at, None))
+
+    def _fail(self, error):
+        # The port is gone: nothing in flight will be answered
+        print(f"!!! Serial read failed: {error}")
+        with self._in_flight_changed:
+            self.error = error
+            failed = list(self._in_flight.values())
+            self._in_flight.clear()
+            self._in_flight_changed.notify_all()
+        for cmd, future, callback, sent_at, _ in failed:
+            self._complete(future, callback, Reply(cmd, None, sent_at, None, error))
+
+    def _status(self, status):
+        if status is None:
+            return
+        self.status = status
+        if self.on_status is not None:
+            self._done.put((self.on_status, status))
+
+    def close(self, wait=True):
+        super().close(wait)
+        self._reading = False
+        self._reader.join()
+
+
+def command_queue(ser, binary=None, **kwargs):
+    """
+    Get the command queue for a stimulator port.
+
+    Parameters:
+        ser: Open serial.Serial
+        binary: Use the binary protocol (default: --nmes-binary on the
+                command line)
+        kwargs: Passed to the queue (timeout, log, window, on_status, on_line)
+    Returns:
+        BinaryCommandQueue or SerialCommandQueue
+    """
+    if binary is None:
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument('--nmes-binary', action='store_true')
+        binary = parser.parse_known_args()[0].nmes_binary
+    if binary:
+        kwargs.pop('on_line', None)     # the status frames carry the state
+        return BinaryCommandQueue(ser, **kwargs)
+    kwargs.pop('window', None)
+    kwargs.pop('on_status', None)   # status frames need the binary protocol
+    return SerialCommandQueue(ser, **kwargs)
+
+
+# Example usage: python nmes_serial.py [port] [--nmes-binary]
+if __name__ == "__main__":
+    import sys
+    from nmes_port import connect
+
+    port = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1][0] != '-' else None
+    nmes = command_queue(connect(port))
+    futures = [nmes.send(cmd) for cmd in ('1', 'u', 'u', set_pwm_command(PWM_REST), '1')]
+    while nmes.pending:
+        time.sleep(0.01)  # the game would keep rendering here
+    for reply in (f.result() for f in futures):
+        ack_ms = (reply.acked_at - reply.sent_at) * 1000 if reply.line else float('nan')
+        print(f"{reply.command!r}: {reply.line!r} ({ack_ms:.1f} ms)")
+    nmes.close()
+    nmes.ser.close()
@@ -0,0 +1,661 @@
+import os
+import select
+import threading
+import time
+import tty
+from collections import deque
+
+from nmes_protocol import (FRAME_SYNC, MAX_PAYLOAD, RAMP_PHASES, STATUS_BAD_FRAME,
+                           STATUS_BAD_PAYLOAD, STATUS_OK, STATUS_UNKNOWN_COMMAND,
+                           TELEMETRY_COMMAND, crc8, encode_frame)
+
+# Constants of arduino-openEMSstim.ino / EMSSystem.h / EMSChannel.h
+PWM_STEP_SIZE = 10
+DIGIPOT_STEP = 15
+SERIAL_TIMEOUT = 0.05        # Serial.setTimeout(50)
+MESSAGE_MAX = 64             # longest text command line, '\r' included
+ACTION, CHANNEL, INTENSITY, TIME, OPTION = 'G', 'C', 'I', 'T', 'O'
+POTI_STEPS_UP, POTI_STEPS_DOWN = 255, 0
+RAMP_PROFILES = 4
+RAMP_IDLE, RAMP_UP, RAMP_HOLD, RAMP_DOWN = range(4)
+
+CHANNEL_ACTIVE = ("\tEMS: Channel 1 active", "\tEMS: Channel 2 active")
+CHANNEL_INACTIVE = ("\tEMS: Channel 1 inactive", "\tEMS: Channel 2 inactive")
+CHANNEL_INTENSITY = ("\tEMS: Intensity Channel 1: ", "\tEMS: Intensity Channel 2: ")
+
+
+def _is_digit(c):
+    # Arduino isDigit(): ASCII digits only
+    return '0' <= c <= '9'
+
+
+def _to_int(text):
+    # Arduino String.toInt(): leading digits (after blanks and a sign), else 0
+    text = text.lstrip(' \t\n\v\f\r')
+    sign = 1
+    if text[:1] in ('-', '+'):
+        sign = -1 if text[0] == '-' else 1
+        text = text[1:]
+    digits = ''
+    for c in text:
+        if not _is_digit(c):
+            break
+        digits += c
+    return sign * int(digits) if digits else 0
+
+
+def _hex_digit(c):
+    # convertHexCharToByte(): upper-case hex only, -1 otherwise
+    if 'A' <= c <= 'F':
+        return ord(c) - ord('A') + 10
+    if '0' <= c <= '9':
+        return ord(c) - ord('0')
+    return -1
+
+
+class SimChannel:
+    def __init__(self):
+        """
+        State of one EMSChannel. EMSChannel.cpp in this tree is a stale copy
+        of the sketch, so this follows EMSChannel.h: a channel is switched
+        on and off by the '1' / '2' toggles, and a WV action command
+        switches it on for its signal length (check() ends it).
+        """
+        self.activated = False
+        self.intensity = 0           # percent, from the WV 'I' field
+        self.signal_length = 0       # ms, from the WV 'T' field
+        self.end_time = None         # monotonic end of the applied signal
+        self.max_intensity = POTI_STEPS_UP
+        self.min_intensity = POTI_STEPS_DOWN
+
+    @property
+    def wiper(self):
+        """Digipot position the channel's intensity maps to."""
+        return self.min_intensity + (self.max_intensity - self.min_intensity) * self.intensity // 100
+
+    def apply_signal(self):
+        self.end_time = time.monotonic() + self.signal_length / 1000
+
+    def check(self):
+        if self.activated and self.end_time is not None and time.monotonic() >= self.end_time:
+            self.activated = False
+            self.end_time = None
+            return 1
+        return 0
+
+
+class SimRamp:
+    def __init__(self):
+        """A channel's ramp, as the sketch's Ramp struct (times in seconds)."""
+        self.phase = RAMP_IDLE
+        self.profile = 0
+        self.start = 128             # PWM to go back to
+        self.last_step = 0.0         # monotonic time of the last step or phase change
+        self.report = False          # started by a text command: print the channel going off
+
+
+class SimulatedFirmware:
+    def __init__(self, serial):
+        """
+        arduino-openEMSstim.ino in Python: the same loop(), processMessage(),
+        setCommand(), telemetryCommand(), rampCommand(), checkRamps(),
+        doCommand(), readFrame() and EMSSystem WV commands, printing the same text byte for byte.
+
+        Parameters:
+            serial: Object with the Arduino Serial calls the sketch uses:
+                    available(), peek(), read_bytes_until(terminator, length),
+                    find(terminator), read_bytes(n), print(text) and write(data)
+        """
+        self.serial = serial
+        self.binary_mode = False
+        self.pot = [255, 255]        # digipotChannel1/2Position (no EMS)
+        self.pwm = [128, 128]        # pwmPulseWidthChannel1/2 (50% duty)
+        self.channels = [SimChannel(), SimChannel()]
+        self.feedback = [0, 0]       # analogRead(A2) / analogRead(A3), set by tests
+        self.telemetry_period = 0    # ms
+        self.last_telemetry = 0.0
+        self.telemetry_seq = 0
+        # step, interval ms, ceiling, hold ms, down ms (rampProfiles)
+        self.ramp_profiles = [[10, 100, 248, 0, 100] for _ in range(RAMP_PROFILES)]
+        self.ramps = [SimRamp(), SimRamp()]
+        self.commands = 0
+
+    def printer(self, msg, force=False):
+        if not self.binary_mode or force:
+            self.serial.print(msg + '\r\n')
+
+    def setup(self):
+        self.printer("\nSETUP:")
+        self.printer("\tEMS: INITIALIZING CHANNELS")
+        self.printer("\tEMS: INITIALIZED")
+        self.printer("\tEMS: STARTED")
+        self.printer("SETUP DONE (LED 13 WILL BE ON)")
+
+    def loop(self):
+        """
+        One pass of loop().
+
+        Returns:
+            True if a command was read
+        """
+        handled = False
+        if self.serial.available() > 0:
+            if self.serial.peek() == FRAME_SYNC:
+                self.read_frame()
+            else:
+                # one character more than fits tells a line that is too long
+                line = self.serial.read_bytes_until('\n', MESSAGE_MAX + 1)
+                message = line.strip(' \t\n\v\f\r')
+                if len(line) > MESSAGE_MAX:
+                    self.serial.find('\n')   # the rest of the line
+                    self.printer("\tERROR: Command Too Long: " + message)
+                else:
+                    self.printer("\tUSB: received command: " + message)
+                    self.process_message(message)
+            self.commands += 1
+            handled = True
+        if (self.telemetry_period > 0 and
+                time.monotonic() - self.last_telemetry >= self.telemetry_period / 1000):
+            self.last_telemetry = time.monotonic()
+            self.send_telemetry()
+        self.check_ramps()
+        self.check()
+        return handled
+
+    def check(self):
+        """emsSystem.check(): end applied signals whose time is up."""
+        return sum(channel.check() for channel in self.channels)
+
+    def process_message(self, message):
+        if message.startswith("WV"):
+            # substring(lastIndexOf(',') + 1, length() - 1), which swaps
+            # reversed bounds; the last character is dropped
+            start, end = message.rfind(',') + 1, len(message) - 1
+            hex_command = message[min(start, end):max(start, end)]
+            self.printer("\tEMS_CMD: HEX command length: " + str(len(hex_command)))
+            self.printer(hex_command)
+            command = ''
+            for i in range(0, len(hex_command), 2):
+                one = _hex_digit(hex_command[i])
+                two = _hex_digit(hex_command[i + 1]) if i + 1 < len(hex_command) else -1
+                command += chr((one * 16 + two) & 0xFF if one != -1 and two != -1 else 0xFF)
+            self.printer("\tEMS_CMD: Converted HEX command: ")
+            self.printer(command)
+            self.ems_do_command(command)
+        elif self.set_command(message):
+            pass
+        elif self.telemetry_command(message):
+            pass
+        elif self.ramp_command(message):
+            pass
+        else:
+            self.printer("\tCommand NON HEX:")
+            self.printer(message)
+            self.do_command(message[:1] or '\0')
+
+    def set_command(self, message):
+        """setCommand(): P<ch>=<v> / D<ch>=<v> / A<ch>=<0|1>; False if not one."""
+        if len(message) < 4 or message[0] not in 'PDA' or message[2] != '=':
+            return False
+        channel = message[1]
+        value_text = message[3:]
+        valid = channel in '12*' and len(value_text) <= 3 and all(map(_is_digit, value_text))
+        value = _to_int(value_text)
+        if not valid or value > (1 if message[0] == 'A' else 255):
+            self.printer("\tERROR: Set Command Invalid: " + message)
+            return True
+
+        targets = [i for i, ch in enumerate('12') if channel in (ch, '*')]
+        if message[0] == 'P':
+            for i in targets:
+                self.ramps[i].phase = RAMP_IDLE   # a manual setting ends the ramp
+                self.pwm[i] = value
+            self.printer(f"\tPWM Set: CH1={self.pwm[0]}, CH2={self.pwm[1]}")
+        elif message[0] == 'A':
+            for i in targets:
+                self.set_active(i, value == 1)
+        else:
+            for i in targets:
+                self.pot[i] = value
+                self.printer(CHANNEL_INTENSITY[i] + str(self.pot[i]))
+        return True
+
+    def telemetry_command(self, message):
+        """telemetryCommand(): T=<ms>; False if not one."""
+        if len(message) < 3 or message[:2] != 'T=':
+            return False
+        value_text = message[2:]
+        value = _to_int(value_text)
+        if len(value_text) > 5 or not all(map(_is_digit, value_text)) or value > 65535:
+            self.printer("\tERROR: Telemetry Command Invalid: " + message)
+            return True
+        self.telemetry_period = value
+        self.last_telemetry = time.monotonic()
+        self.printer(f"\tTelemetry: every {value} ms" if value else "\tTelemetry: off")
+        return True
+
+    def ramp_command(self, message):
+        """rampCommand(): R<p>=<values> / G<ch>=<p> / H<ch> / X<ch> / ?<ch>; False if not one."""
+        c = message[:1]
+        if c == 'R' and len(message) > 3 and message[2] == '=':
+            profile = ord(message[1]) - ord('0')
+            values = self.parse_numbers(message[3:], 5)
+            if (not 0 <= profile < RAMP_PROFILES or values is None or
+                    values[0] > 255 or values[2] > 255):
+                self.printer("\tERROR: Ramp Command Invalid: " + message)
+                return True
+            self.ramp_profiles[profile] = values
+            self.printer(f"\tRamp {profile} stored: {message[3:]}")
+            return True
+
+        start = c == 'G' and len(message) == 4 and message[2] == '='
+        if not start and not (c in ('H', 'X', '?') and len(message) == 2):
+            return False
+        i = ord(message[1]) - ord('1')
+        profile = ord(message[3]) - ord('0') if start else 0
+        if not 0 <= i <= 1 or not 0 <= profile < RAMP_PROFILES:
+            self.printer("\tERROR: Ramp Command Invalid: " + message)
+            return True
+
+        ramp = self.ramps[i]
+        if start:
+            if ramp.phase == RAMP_IDLE:
+                ramp.start = self.pwm[i]
+            ramp.profile = profile
+            ramp.phase = RAMP_HOLD if self.pwm[i] >= self.ramp_profiles[profile][2] else RAMP_UP
+            ramp.last_step = time.monotonic()
+            ramp.report = not self.binary_mode
+            self.set_active(i, True, report=False)
+        elif c == 'H' and ramp.phase == RAMP_UP:
+            ramp.phase = RAMP_HOLD
+            ramp.last_step = time.monotonic()
+        elif c == 'X' and ramp.phase != RAMP_IDLE:
+            ramp.phase = RAMP_DOWN
+            # first step now
+            ramp.last_step = time.monotonic() - self.ramp_profiles[ramp.profile][4] / 1000
+        self.printer(f"\tRamp CH{i + 1}: {RAMP_PHASES[ramp.phase]}, "
+                     f"profile {ramp.profile}, PWM={self.pwm[i]}")
+        return True
+
+    @staticmethod
+    def parse_numbers(text, count):
+        """parseNumbers(): count comma-separated numbers of 0-65535, or None."""
+        fields = text.split(',')
+        if len(fields) != count or not all(
+                0 < len(field) <= 5 and all(map(_is_digit, field)) for field in fields):
+            return None
+        values = [int(field) for field in fields]
+        return values if max(values) <= 65535 else None
+
+    def check_ramps(self):
+        """checkRamps(): step the running ramps."""
+        now = time.monotonic()
+        for i, ramp in enumerate(self.ramps):
+            step, interval, ceiling, hold, down = self.ramp_profiles[ramp.profile]
+            if ramp.phase == RAMP_UP and now - ramp.last_step >= interval / 1000:
+                ramp.last_step = now
+                self.pwm[i] = min(self.pwm[i] + step, ceiling)
+                if self.pwm[i] >= ceiling:
+                    ramp.phase = RAMP_HOLD
+            elif ramp.phase == RAMP_HOLD and hold > 0 and now - ramp.last_step >= hold / 1000:
+                ramp.phase = RAMP_DOWN
+                ramp.last_step = now
+            elif ramp.phase == RAMP_DOWN and now - ramp.last_step >= down / 1000:
+                ramp.last_step = now
+                self.pwm[i] = max(self.pwm[i] - step, ramp.start) if down > 0 else ramp.start
+                if self.pwm[i] <= ramp.start:
+                    ramp.phase = RAMP_IDLE
+                    self.set_active(i, False, report=ramp.report)
+
+    def set_active(self, i, on, report=True):
+        """setActive(): switch channel i (0 or 1), print its state if report; off ends its ramp."""
+        self.channels[i].activated = on
+        if not on:
+            self.ramps[i].phase = RAMP_IDLE
+        if report:
+            self.printer(CHANNEL_ACTIVE[i] if on else CHANNEL_INACTIVE[i])
+
+    def do_command(self, c):
+        """doCommand(): the single-char commands."""
+        if c in ('1', '2'):
+            i = int(c) - 1
+            self.set_active(i, not self.channels[i].activated)
+        elif c in ('a', 'q', 's', 'w'):
+            i = 0 if c in 'aq' else 1
+            change = DIGIPOT_STEP if c in 'as' else -DIGIPOT_STEP
+            self.pot[i] = min(max(self.pot[i] + change, 0), 255)
+            self.printer(CHANNEL_INTENSITY[i] + str(self.pot[i]))
+        elif c == 'p':
+            self.printer("\tPONG: openEMSstim")
+        elif c in ('u', 'j'):
+            for ramp in self.ramps:
+                ramp.phase = RAMP_IDLE
+            change = PWM_STEP_SIZE if c == 'u' else -PWM_STEP_SIZE
+            self.pwm = [min(max(pwm + change, 0), 255) for pwm in self.pwm]
+            self.printer(f"\tPWM {'Increased' if c == 'u' else 'Decreased'}: "
+                         f"CH1={self.pwm[0]}, CH2={self.pwm[1]}")
+        else:
+            self.printer("\tERROR: SINGLE-CHAR Command Unknown")
+
+    def channel_flags(self):
+        return (1 if self.channels[0].activated else 0) | (2 if self.channels[1].activated else 0)
+
+    def send_reply(self, seq, command, status, ramp_channel=None):
+        state = bytes((status, self.pwm[0], self.pwm[1], self.pot[0], self.pot[1],
+                       self.channel_flags()))
+        if ramp_channel is not None:
+            ramp = self.ramps[ramp_channel]
+            state += bytes((ramp.phase, ramp.profile))
+        self.serial.write(encode_frame(seq, command, state))
+
+    def send_telemetry(self):
+        feedback1, feedback2 = (min(max(int(value), 0), 1023) for value in self.feedback)
+        flags = self.channel_flags() | (feedback1 >> 8) << 2 | (feedback2 >> 8) << 4
+        self.serial.write(encode_frame(self.telemetry_seq, TELEMETRY_COMMAND, bytes(
+            (self.pwm[0], self.pwm[1], self.pot[0], self.pot[1], flags,
+             feedback1 & 0xFF, feedback2 & 0xFF,
+             self.ramps[0].phase | self.ramps[1].phase << 2))))
+        self.telemetry_seq = (self.telemetry_seq + 1) & 0xFF
+
+    def read_frame(self):
+        """readFrame(): one binary frame, sync byte first."""
+        frame = self.serial.read_bytes(4)
+        if len(frame) < 4:
+            return
+        length = frame[3]
+        if length > MAX_PAYLOAD:
+            self.send_reply(frame[1], frame[2], STATUS_BAD_FRAME)
+            return
+        frame += self.serial.read_bytes(length + 1)
+        if len(frame) < 4 + length + 1 or crc8(frame[1:4 + length]) != frame[4 + length]:
+            self.send_reply(frame[1], frame[2], STATUS_BAD_FRAME)
+            return
+
+        command = chr(frame[2])
+        status = STATUS_OK
+        ramp_channel = None
+        self.binary_mode = True
+        if command in ('P', 'D', 'A'):
+            if length == 2 and chr(frame[4]) in '12*' and (command != 'A' or frame[5] <= 1):
+                self.set_command(f"{command}{chr(frame[4])}={frame[5]}")
+            else:
+                status = STATUS_BAD_PAYLOAD
+        elif command == 'T':
+            if length == 2:
+                self.telemetry_command(f"T={frame[4] << 8 | frame[5]}")
+            else:
+                status = STATUS_BAD_PAYLOAD
+        elif command == 'R':
+            # profile, step, interval (2), ceiling, hold (2), down (2)
+            if length == 9 and frame[4] < RAMP_PROFILES:
+                p = frame[4:13]
+                self.ramp_command(f"R{p[0]}={p[1]},{p[2] << 8 | p[3]},{p[4]},"
+                                  f"{p[5] << 8 | p[6]},{p[7] << 8 | p[8]}")
+            else:
+                status = STATUS_BAD_PAYLOAD
+        elif command in ('G', 'H', 'X', '?'):
+            # channel, and for G the profile
+            if (length == (2 if command == 'G' else 1) and chr(frame[4]) in '12' and
+                    (command != 'G' or frame[5] < RAMP_PROFILES)):
+                ramp_channel = frame[4] - ord('1')
+                self.ramp_command(f"G{chr(frame[4])}={frame[5]}" if command == 'G'
+                                  else command + chr(frame[4]))
+            else:
+                status = STATUS_BAD_PAYLOAD
+        elif length == 0 and command in ('1', '2', 'a', 'q', 's', 'w', 'u', 'j', 'p'):
+            self.do_command(command)
+        else:
+            status = STATUS_UNKNOWN_COMMAND
+        self.binary_mode = False
+        self.send_reply(frame[1], frame[2], status, ramp_channel)
+
+    # --- EMSSystem (the WV hex commands) ---
+
+    def ems_do_command(self, command):
+        if not command:
+            return
+        if ACTION in command:
+            self.ems_action_command(command)
+        elif command[0] == OPTION:
+            self.ems_set_option(command)
+        else:
+            self.serial.print("Unknown command: " + command + '\r\n')
+
+    @staticmethod
+    def _next_number(command, start):
+        # getNextNumberOfSting(): the digits right after the separator, or -1
+        end = start + 1
+        while end < len(command) and _is_digit(command[end]):
+            end += 1
+        return int(command[start + 1:end]) if end > start + 1 else -1
+
+    def ems_action_command(self, command):
+        channel = self._next_number(command, command.find(CHANNEL)) if CHANNEL in command else -1
+        valid = 0 <= channel < len(self.channels)
+        if TIME in command:
+            signal_length = min(self._next_number(command, command.find(TIME)), 5000)
+            if valid:
+                self.channels[channel].signal_length = signal_length
+        if INTENSITY in command:
+            intensity = self._next_number(command, command.find(INTENSITY))
+            if valid:
+                self.channels[channel].intensity = intensity - 1
+        if valid:
+            self.channels[channel].activated = True
+            self.channels[channel].apply_signal()
+        else:
+            # a wrong channel number switches every channel off
+            for sim_channel in self.channels:
+                sim_channel.activated = False
+
+    def ems_set_option(self, option):
+        # "OMA[<channel>,<value>]" / "OMI[...]": calibration max / min
+        kind = option[1:3]
+        left, right = option.find('['), option.rfind(']')
+        separator = option.find(',', left + 1)
+        if kind not in ('MA', 'MI') or not -1 < left < separator < right:
+            return
+        channel = _to_int(option[left + 1:separator])
+        value = _to_int(option[separator + 1:right])
+        if 0 <= channel < len(self.channels):
+            if kind == 'MA':
+                self.channels[channel].max_intensity = value
+            else:
+                self.channels[channel].min_intensity = value
+
+
+class NMESSimulator:
+    def __init__(self, baudrate=19200, processing_delay=0.0005, rx_buffer=64, log=False):
+        """
+        The stimulator firmware on a pseudo-terminal, so the games and the
+        serial drivers run without the Arduino (POSIX only). Open .port
+        with serial.Serial like the real board.
+
+        Bytes move at the UART's pace both ways (10 bits per byte at
+        baudrate): a command is only seen once its last byte has arrived,
+        and every reply line reaches the host when its last byte would.
+        Like the sketch, the firmware handles one command at a time and
+        waits for its output to drain (Serial.flush()) before reading the
+        next; bytes arriving while the Arduino's 64-byte receive buffer is
+        full are lost.
+
+        Parameters:
+            baudrate: Serial speed to pace at (None: no pacing)
+            processing_delay: Seconds the board spends on each command
+            rx_buffer: Receive buffer size in bytes
+            log: Print the commands the firmware reads
+        """
+        if not hasattr(os, 'openpty'):
+            raise RuntimeError("The NMES simulator needs a POSIX pseudo-terminal")
+        self.byte_time = 10 / baudrate if baudrate else 0.0
+        self.processing_delay = processing_delay
+        self.rx_buffer = rx_buffer
+        self.log = log
+        self.dropped = 0                 # bytes lost to receive buffer overflow
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._rx = deque()               # (byte, arrival time) not yet read
+        self._rx_clock = 0.0             # arrival of the last byte received
+        self._tx_clock = 0.0             # end of the last byte sent
+        self._running = True
+
+        self.firmware = SimulatedFirmware(self)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # --- Arduino Serial, as seen by the firmware ---
+
+    def available(self):
+        now = time.monotonic()
+        count = 0
+        for _, arrival in self._rx:
+            if arrival > now:
+                break
+            count += 1
+        return count
+
+    def peek(self):
+        return self._rx[0][0] if self.available() else -1
+
+    def read(self, timeout=SERIAL_TIMEOUT):
+        """Next byte, waiting up to timeout for it (Stream.timedRead()); -1 if none."""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if self._rx and self._rx[0][1] <= now:
+                return self._rx.popleft()[0]
+            if now >= deadline:
+                return -1
+            self._wait(min(self._rx[0][1], deadline) if self._rx else deadline)
+
+    def read_bytes_until(self, terminator, length):
+        # Into the sketch's fixed buffer: at most length characters
+        text = ''
+        while len(text) < length:
+            c = self.read()
+            if c < 0 or chr(c) == terminator:
+                break
+            text += chr(c)
+        return text
+
+    def find(self, terminator):
+        # Stream.find(): skip past the next terminator; False on a timeout
+        while True:
+            c = self.read()
+            if c < 0:
+                return False
+            if chr(c) == terminator:
+                return True
+
+    def read_bytes(self, n):
+        data = bytearray()
+        while len(data) < n:
+            c = self.read()
+            if c < 0:
+                break
+            data.append(c)
+        return bytes(data)
+
+    def print(self, text):
+        self.write(text.encode('latin-1'))
+
+    def write(self, data):
+        # Blocks until the last byte is out, as println() + flush() do
+        self._tx_clock = max(time.monotonic(), self._tx_clock) + len(data) * self.byte_time
+        self._wait(self._tx_clock)
+        try:
+            os.write(self._master, data)
+        except OSError:
+            pass
+
+    # --- host side ---
+
+    def _receive(self, timeout):
+        # Take what the host wrote and stamp when each byte finishes arriving
+        try:
+            ready, _, _ = select.select([self._master], [], [], max(timeout, 0))
+            if not ready:
+                return
+            data = os.read(self._master, 4096)
+        except OSError:
+            self._running = False
+            return
+        start = max(time.monotonic(), self._rx_clock)
+        for i, byte in enumerate(data):
+            self._rx.append((byte, start + (i + 1) * self.byte_time))
+        self._rx_clock = start + len(data) * self.byte_time
+
+    def _wait(self, until):
+        # Sleep, but keep stamping what the host writes meanwhile
+        while True:
+            now = time.monotonic()
+            if now >= until or not self._running:
+                return
+            self._receive(until - now)
+
+    def _overflow(self):
+        # The firmware was busy: keep what fit the receive buffer
+        arrived = self.available()
+        if arrived > self.rx_buffer:
+            kept = [self._rx.popleft() for _ in range(self.rx_buffer)]
+            for _ in range(arrived - self.rx_buffer):
+                self._rx.popleft()
+            self._rx.extendleft(reversed(kept))
+            self.dropped += arrived - self.rx_buffer
+
+    def _run(self):
+        self.firmware.setup()
+        while self._running:
+            busy = (self._rx or self.firmware.telemetry_period
+                    or any(c.activated for c in self.firmware.channels)
+                    or any(r.phase != RAMP_IDLE for r in self.firmware.ramps))
+            self._receive(0.001 if busy else 0.05)
+            self._overflow()
+            if not self.available():
+                self.firmware.loop()
+                continue
+            if self.log:
+                line = bytes(byte for byte, _ in self._rx).split(b'\n')[0]
+                print(f"[Sim] <<< {line!r}")
+            self._wait(time.monotonic() + self.processing_delay)
+            self.firmware.loop()
+
+    def close(self):
+        """Stop the firmware and close the pseudo-terminal."""
+        self._running = False
+        self._thread.join(timeout=1.0)
+        os.close(self._slave)
+        os.close(self._master)
+
+
+# Example usage: python nmes_simulator.py [baudrate]
+# Prints the port to open instead of the board; Ctrl-C stops it.
+if __name__ == "__main__":
+    import sys
+    import serial
+
+    simulator = NMESSimulator(int(sys.argv[1]) if len(sys.argv) > 1 else 19200, log=True)
+    print(f"Simulated openEMSstim on {simulator.port}")
+    with serial.Serial(simulator.port, 19200, timeout=0.05) as ser:
+        time.sleep(0.3)
+        ser.reset_input_buffer()
+        # WV: channel 0, intensity 100, 200 ms ('C0I100T200G' in hex, plus
+        # the character the sketch drops)
+        for cmd in ('1', 'u', 'P*=200', 'WV0,4330493130305432303047;', 'x'):
+            sent = last = time.monotonic()
+            ser.write(f"{cmd}\r\n".encode())
+            lines = []
+            while True:
+                line = ser.readline()
+                if not line:
+                    break
+                last = time.monotonic()
+                lines.append(line.decode('latin-1').strip())
+            print(f"{cmd!r} answered in {(last - sent) * 1000:.1f} ms: {lines}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.close()
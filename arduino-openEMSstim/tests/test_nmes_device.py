@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nmes_device import NMESDevice
+from nmes_serial import PWM_REST, PWM_STEP
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'openpty'),
+                                reason="the NMES simulator needs a POSIX pseudo-terminal")
+
+
+def settle(device, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while device.pending and time.monotonic() < deadline:
+        time.sleep(0.005)
+        device.poll()
+    device.poll()
+
+
+@pytest.fixture(params=[False, True], ids=['text', 'binary'])
+def device(request):
+    device = NMESDevice(simulate=True, binary=request.param, log=False, telemetry=0)
+    yield device
+    device.close()
+
+
+def test_step_after_cancelled_step_is_sent(device):
+    # hold the queue up so the step is still queued when it is cancelled
+    for _ in range(5):
+        device.queue.send('p', expect='never', timeout=0.3)
+    cancelled = device.step_up()
+    assert cancelled is not None and cancelled.cancel()
+    settle(device)
+    assert device.pwm[1] == PWM_REST
+
+    step = device.step_up()
+    assert step is not None
+    settle(device)
+    assert step.result().line is not None
+    assert device.pwm[1] == device.pwm[2] == PWM_REST + PWM_STEP
+
+
+def test_steps_while_in_flight_coalesce(device):
+    sent = []
+
+    def callback(reply):
+        if not reply.superseded:
+            sent.append(reply.command)
+    for _ in range(5):
+        device.step_up(callback)
+    device.step_down(callback)
+    device.step_down(callback)
+    settle(device)
+    assert sent == ['u', f'P*={PWM_REST + 3 * PWM_STEP}']
+    assert device.level == 3
+
+
+def test_every_held_step_callback_runs_once(device):
+    calls = []
+
+    def callback(i):
+        return lambda reply: calls.append((i, reply))
+
+    for i in range(4):
+        device.step_up(callback(i))
+    settle(device)
+    assert sorted(i for i, _ in calls) == [0, 1, 2, 3]
+    replies = dict(calls)
+    assert not replies[0].superseded and replies[0].command == 'u'
+    assert not replies[3].superseded and replies[3].command == f'P*={PWM_REST + 4 * PWM_STEP}'
+    for i in (1, 2):
+        assert replies[i].superseded and replies[i].line == replies[3].line
+
+
+def test_held_steps_that_cancel_out_still_call_back(device):
+    calls = []
+    device.step_up(lambda reply: calls.append(('up', reply)))
+    device.step_up(lambda reply: calls.append(('up again', reply)))
+    device.step_down(lambda reply: calls.append(('down', reply)))
+    settle(device)
+    assert [name for name, _ in calls] == ['up', 'up again', 'down']
+    assert calls[0][1].line is not None and not calls[0][1].superseded
+    for _, reply in calls[1:]:
+        assert reply.superseded and reply.line is None
+    assert device.pending == 0 and device.level == 1
+
+
+def test_overlong_text_command_is_dropped_whole():
+    device = NMESDevice(simulate=True, binary=False, log=False, telemetry=0)
+    try:
+        lines = []
+        device.queue.on_line = lines.append
+        long = device.queue.send(f"WV0,{'43' * 40};", expect='Command Too Long', timeout=0.5)
+        pong = device.queue.send('p')
+        settle(device)
+        assert long.result().line is not None
+        assert pong.result().line is not None
+        # nothing of the long line was taken for a command
+        received = [line for line in lines if 'received command' in line]
+        assert received == ['USB: received command: p']
+    finally:
+        device.close()
+
+
+def test_ramp_end_switches_channel_off_in_text_mode():
+    device = NMESDevice(simulate=True, binary=False, log=False, telemetry=0)
+    try:
+        device.upload_ramp(0, PWM_STEP, 10, PWM_REST + 2 * PWM_STEP, hold=20, down=10)
+        device.start_ramp(0)
+        settle(device)
+        assert device.active[1]
+        # nothing is sent while the ramp runs out: the firmware reports it
+        deadline = time.monotonic() + 2.0
+        while device.active[1] and time.monotonic() < deadline:
+            time.sleep(0.01)
+            device.poll()
+        assert not device.active[1] and device.ramp[1] == 'idle'
+        assert not device.simulator.firmware.channels[0].activated
+
+        switch = device.activate()
+        assert switch is not None
+        settle(device)
+        assert switch.result().line is not None
+        assert device.active[1] and device.simulator.firmware.channels[0].activated
+    finally:
+        device.close()
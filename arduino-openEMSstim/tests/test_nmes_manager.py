@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nmes_manager import StimulatorManager
+from nmes_serial import PWM_REST, PWM_STEP
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'openpty'),
+                                reason="the NMES simulator needs a POSIX pseudo-terminal")
+
+
+def test_call_after_timed_out_call():
+    async def main():
+        manager = StimulatorManager()
+        device = await manager.add('station', simulate=True, timeout=0.5)
+        try:
+            # hold the queue up so the step is still queued when the call gives up
+            device.queue.send('p', expect='never', timeout=0.3)
+            with pytest.raises(asyncio.TimeoutError):
+                await manager.call('station', 'step_up', timeout=0.05)
+            reply = await manager.send('station', 'u')
+            assert reply is not None and reply.line is not None
+            assert device.pending == 0
+            assert device.pwm[1] == device.pwm[2] == PWM_REST + 2 * PWM_STEP
+        finally:
+            await manager.close()
+
+    asyncio.run(main())
+
+
+def test_probing_stations_get_different_boards(monkeypatch):
+    import nmes_port
+    from nmes_simulator import NMESSimulator
+
+    boards = [NMESSimulator(), NMESSimulator()]
+    monkeypatch.setattr(nmes_port, 'candidate_ports', lambda: [board.port for board in boards])
+
+    async def main():
+        manager = StimulatorManager()
+        try:
+            failed = await manager.add_all({'left': None, 'right': None},
+                                           simulate=False, timeout=0.5)
+            assert failed == {}
+            ports = {device.ser.port for device in manager.devices.values()}
+            assert ports == {board.port for board in boards}
+            for name in manager.devices:
+                reply = await manager.send(name, 'u')
+                assert reply.line is not None
+        finally:
+            await manager.close()
+
+    try:
+        asyncio.run(main())
+    finally:
+        for board in boards:
+            board.close()
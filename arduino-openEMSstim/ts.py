@@ -1,11 +1,21 @@
 import pygame
 import cv2
-import mediapipe as mp
 import math
 import random
 import time
 import os
-import serial
+import sys
+
+# shared camera/tracking helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from replay_source import frame_rate, open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+from inference_worker import InferenceWorker
+from motion_predictor import ConstantVelocityPredictor
+from kinematics import grip_closure
+from camera_surface import CameraSurface
+from nmes_device import NMESDevice
+from nmes_serial import PWM_REST, PWM_STEP
 
 class ForearmBalloonGame:
     # State machine states
@@ -14,32 +24,52 @@ class ForearmBalloonGame:
     WAIT_FOR_OPEN    = 2
     ASSIST_RAMP_DOWN = 3
 
-    def __init__(self, serial_port="COM12", baudrate=19200):
+    def __init__(self, serial_port=None, baudrate=19200, inference_stride=3):
+        setup_headless()
         pygame.init()
         self.setup_game()
 
-        # Hand‐pose tracker
-        self.hands = mp.solutions.hands.Hands(
+        # Hand‐pose tracker (worker process, never blocks the game loop)
+        self.hands = InferenceWorker(
+            'hands', roi=True,
             max_num_hands=1,
             min_detection_confidence=0.7,
             min_tracking_confidence=0.7
         )
-        self.cap = cv2.VideoCapture(0)
+        self.camera         = open_camera(0)  # webcam, or --replay recording
+        # replays reuse landmarks cached by earlier runs of the same recording
+        self.hands.cache    = open_landmark_cache(
+            self.camera, self.hands.backend, self.hands.model_kwargs,
+            roi=True
+        )
+        self.last_frame_id  = 0
+        self.last_result_id = 0
+
+        # Inference decimation: landmarks on skipped frames are predicted
+        self.inference_stride = inference_stride
+        self.frame_count      = 0
+        self.hand_motion      = ConstantVelocityPredictor()
+
+        # Grip closure 0-100; closed/open thresholds with hysteresis
+        self.grip               = 0.0
+        self.grip_closed_pct    = 60
+        self.grip_open_pct      = 30
 
         # High‐score file
         self.load_best_score()
 
         # Open serial to Arduino
-        print(f"[Serial] Opening {serial_port} @ {baudrate}")
-        self.ser = serial.Serial(serial_port, baudrate, timeout=0.1)
-        time.sleep(2)
+        print(f"[Serial] Opening {serial_port or 'the board'} @ {baudrate}")
+        # commands and their acks are handled off the render thread; the
+        # intensity shown is the one the firmware acknowledged
+        self.nmes = NMESDevice(serial_port, baudrate, timeout=0.5)  # --nmes-binary: framed protocol
+        # the assist ramp runs in the firmware: a step every 50 ms up to
+        # max_level, held until the hand opens, then back down step by step
+        self.assist_profile = 0
+        self.nmes.upload_ramp(self.assist_profile, PWM_STEP, 50,
+                              PWM_REST + self.nmes.max_level * PWM_STEP, hold=0, down=50)
         print("[Serial] Ready")
 
-        # NMES parameters
-        self.current_intensity = 0
-        self.max_intensity     = 255
-        self.intensity_step    = 10
-
         # State‐machine
         # initialize last_peak to current fill %
         init_pct = int(((self.balloon_radius - self.min_radius) /
@@ -57,6 +87,8 @@ class ForearmBalloonGame:
             max(self.game_height, self.cam_height)
         ))
         pygame.display.set_caption("Forearm Balloon Game")
+        # mirrored webcam feed, refreshed once per new camera frame
+        self.camera_view = CameraSurface((self.cam_width, self.cam_height), mirror=True)
 
         # colors
         self.WHITE = (255,255,255)
@@ -99,15 +131,6 @@ class ForearmBalloonGame:
         with open('balloon_best_score.txt','w') as f:
             f.write(str(self.best_score))
 
-    def is_hand_closed(self, landmarks):
-        # count folded fingers (tips below pip joint)
-        tips = [8,12,16,20]
-        folded = sum(
-            1 for t in tips
-            if landmarks[t].y > landmarks[t-2].y
-        )
-        return folded >= 3
-
     def handle_events(self):
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
@@ -121,39 +144,49 @@ class ForearmBalloonGame:
                     return False
         return True
 
-    def send_nmes(self, cmd: bytes):
-        """Send one-byte, print send/recv."""
-        self.ser.write(cmd)
-        print(f">>> {cmd.decode()}")
-        time.sleep(0.05)
-        while self.ser.in_waiting:
-            resp = self.ser.readline().decode(errors='ignore').strip()
-            if resp:
-                print(f"<<< {resp}")
-
     def update(self):
+        # apply the stimulator's acks
+        self.nmes.poll()
+        # newest frame only, shown by draw()
+        frame = self.camera.read()
+        if frame is None or frame.frame_id == self.last_frame_id:
+            return
+        self.last_frame_id = frame.frame_id
+        frame_time = frame.timestamp
+        frame = frame.image
+        # grip doesn't care about mirroring, so only the display is flipped
+        self.camera_view.update(frame)
+
+        # inference every Nth frame, or every frame while the hand is lost
+        self.frame_count += 1
+        if (self.frame_count % self.inference_stride == 0
+                or not self.hand_motion.tracking):
+            self.hands.submit(self.last_frame_id, frame, frame_time)
+
         if self.paused or self.burst_anim:
             return
 
-        # capture + hand detection
-        ret, frame = self.cap.read()
-        if not ret: return
-        frame = cv2.flip(frame, 1)
-        img   = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        res   = self.hands.process(img)
-
-        hand_closed = False
-        if res.multi_hand_landmarks:
-            for hl in res.multi_hand_landmarks:
-                if self.is_hand_closed(hl.landmark):
-                    hand_closed = True
-                    break
-
-        # balloon inflate/deflate
-        if hand_closed:
-            self.balloon_radius += self.inflation_rate
-        else:
-            self.balloon_radius -= self.deflation_rate
+        # correct the hand estimate whenever the worker publishes
+        res = self.hands.latest()
+        if res is not None and res.frame_id != self.last_result_id:
+            self.last_result_id = res.frame_id
+            if len(res.points):
+                self.hand_motion.update(res.points[0, :, :3], res.frame_time)
+            else:
+                self.hand_motion.reset()
+
+        # grip from the landmarks predicted for this frame
+        landmarks   = self.hand_motion.predict(frame_time)
+        aspect      = frame.shape[1] / frame.shape[0]  # landmarks are normalized
+        self.grip   = (0.0 if landmarks is None
+                       else float(grip_closure(landmarks[None], aspect=aspect)[0]))
+        hand_closed = self.grip >= self.grip_closed_pct
+        hand_open   = self.grip <= self.grip_open_pct
+
+        # balloon inflates with the grip, deflates by what is left open
+        closed = self.grip / 100
+        self.balloon_radius += (self.inflation_rate * closed -
+                                self.deflation_rate * (1 - closed))
 
         self.balloon_radius = max(
             self.min_radius,
@@ -171,39 +204,26 @@ class ForearmBalloonGame:
                 self.last_peak_percent = percent
             # drop ≥8% from peak?
             elif self.last_peak_percent - percent >= 8:
+                # the firmware switches ON and ramps up by itself
+                self.nmes.start_ramp(self.assist_profile, 1)
                 self.state = self.ASSIST_RAMP_UP
 
         elif self.state == self.ASSIST_RAMP_UP:
-            if not hand_closed:
-                # first‐time toggle ON
-                if self.current_intensity == 0:
-                    self.send_nmes(b'1')
-                # ramp up
-                self.current_intensity = min(
-                    self.current_intensity + self.intensity_step,
-                    self.max_intensity
-                )
-                self.send_nmes(b'u')
-            else:
+            if hand_closed:
+                # stop climbing, hold until the hand opens
+                self.nmes.hold_ramp(1)
                 self.state = self.WAIT_FOR_OPEN
 
         elif self.state == self.WAIT_FOR_OPEN:
-            if not hand_closed:
+            if hand_open:
                 self.state = self.ASSIST_RAMP_DOWN
 
         elif self.state == self.ASSIST_RAMP_DOWN:
-            if self.current_intensity > 0:
-                self.send_nmes(b'j')
-                self.current_intensity = max(
-                    0,
-                    self.current_intensity - self.intensity_step
-                )
-            else:
-                # toggle OFF
-                self.send_nmes(b'1')
-                # reset for next cycle
-                self.state             = self.WAIT_FOR_DROP
-                self.last_peak_percent = percent
+            # ramp down; the firmware switches OFF at rest
+            self.nmes.abort_ramp(1)
+            # reset for next cycle
+            self.state             = self.WAIT_FOR_DROP
+            self.last_peak_percent = percent
 
         # check for burst
         if self.balloon_radius >= self.max_radius:
@@ -218,14 +238,9 @@ class ForearmBalloonGame:
         # clear
         self.screen.fill(self.BLACK)
 
-        # camera feed
-        ret, frame = self.cap.read()
-        if ret:
-            f = cv2.flip(frame, 1)
-            f = cv2.cvtColor(f, cv2.COLOR_BGR2RGB)
-            f = cv2.resize(f, (self.cam_width, self.cam_height))
-            surf = pygame.surfarray.make_surface(f.swapaxes(0,1))
-            self.screen.blit(surf, (self.game_width, 0))
+        # camera feed (same frame update() tracked)
+        if self.last_frame_id:
+            self.screen.blit(self.camera_view.surface, (self.game_width, 0))
 
         # border
         pygame.draw.rect(
@@ -255,7 +270,8 @@ class ForearmBalloonGame:
             f"Score:     {self.score}",
             f"Best:      {self.best_score}",
             f"Fill %:    {fill_pct}",
-            f"Intensity: {self.current_intensity} ({int(self.current_intensity/self.max_intensity*100)}%)"
+            f"Grip %:    {self.grip:.0f}",
+            f"Intensity: {self.nmes.pwm[1]} ({self.nmes.percent}%)"
         ]:
             txt = self.font.render(line, True, self.WHITE)
             self.screen.blit(txt, (20, y))
@@ -341,22 +357,23 @@ class ForearmBalloonGame:
         self.state             = self.WAIT_FOR_DROP
         self.last_peak_percent = int(((self.balloon_radius - self.min_radius) /
                                       (self.max_radius - self.min_radius))*100)
-        self.current_intensity = 0
+        self.nmes.reset(1)
 
     def cleanup(self):
-        self.cap.release()
-        self.ser.close()
+        self.camera.release()
+        self.hands.close()
+        self.nmes.close()
         pygame.quit()
         cv2.destroyAllWindows()
 
     def run(self):
         clock   = pygame.time.Clock()
         running = True
-        while running:
+        while running and self.camera.isOpened():
             running = self.handle_events()
             self.update()
             self.draw()
-            clock.tick(60)
+            clock.tick(frame_rate(60))
         self.cleanup()
 
 if __name__ == "__main__":
@@ -1,26 +1,24 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-import serial
+import os
 import time
-
-# SERIAL Setup
-arduino_port = 'COM12'  # Set your Arduino COM port
-baud_rate = 19200
-ser = serial.Serial(arduino_port, baudrate=baud_rate, timeout=1)
-# Wait and flush startup logs
-time.sleep(2)
-ser.reset_input_buffer()
-
-# Initialize MediaPipe pose
-mp_drawing = mp.solutions.drawing_utils
-mp_pose = mp.solutions.pose
-
-# Intensity control parameters
-current_intensity = 0
-max_intensity = 255
-intensity_step = max_intensity // 10  # 10% increments
-channel_active = False
+import sys
+
+# shared camera/tracking helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from landmark_roi import LandmarkROI
+from motion_predictor import ConstantVelocityPredictor
+from kinematics import JointAngles, POSE_JOINTS
+from tracking_backends import POSE_CONNECTIONS, create_backend, draw_landmarks, selected_backend
+from replay_source import open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+from latency_trace import LatencyTrace, latency_options
+from nmes_device import NMESDevice
+from nmes_serial import PWM_REST
+
+# NMES stimulator: commands go out from a background thread and their acks
+# are applied from nmes.poll() in the frame loop (--nmes-binary: framed protocol)
+nmes = NMESDevice(max_level=10)  # finds the board's port (or pass it); 10% steps
 
 # Motion tracking state
 last_angle = None
@@ -35,104 +33,88 @@ drop_thresh = 10       # percent drop triggers boost
 full_min = 95           # percent for full contraction
 rest_max = 5            # percent for rest position
 
-# Helper: send command, wait for specific ack, ignore other logs
-def send_cmd(cmd, timeout=1.0):
-    # flush old data
-    ser.reset_input_buffer()
-    ser.write(f"{cmd}\r\n".encode())
-    ser.flush()
-    print(f">>> Sent: {cmd}")
-    start = time.time()
-    expected = None
-    if cmd == 'u':
-        expected = 'PWM Increased'
-    elif cmd == 'j':
-        expected = 'PWM Decreased'
-    elif cmd == '1':
-        # activation toggles, expect either active or inactive
-        expected = 'Channel 1'
-    while time.time() - start < timeout:
-        line = ser.readline().decode('utf-8', errors='ignore').strip()
-        if not line:
-            continue
-        print(f"<<< Arduino: {line}")
-        if expected and expected in line:
-            return line
-    print(f"!!! No ack for '{cmd}' within {timeout}s")
-    return None
-
-# Channel control
-def activate_channel():
-    global channel_active
-    if not channel_active:
-        ack = send_cmd('1')
-        if ack and 'active' in ack:
-            channel_active = True
-        else:
-            print('!!! Activation failed')
-
-def deactivate_channel():
-    global channel_active
-    if channel_active:
-        ack = send_cmd('1')
-        if ack and 'inactive' in ack:
-            channel_active = False
-        else:
-            print('!!! Deactivation failed')
-
-# Intensity commands
+# Inference decimation
+inference_stride = 3    # run pose inference on every Nth frame (~10 Hz at 30 fps)
+
+# Capture -> inference -> decision -> serial write -> ack timing
+latency = LatencyTrace()
+latency_args = latency_options()  # --latency-hud, --latency-log PATH
+
+# Intensity commands (the device tracks the level from the firmware's acks)
+def report_intensity(reply):
+    if reply.superseded:
+        return   # merged into a later step, reported with that one
+    if reply.line:
+        print(f"*** Intensity: {nmes.percent}%")
+    else:
+        print(f"!!! '{reply.command}' not acknowledged")
+
+# A decision only counts in the latency trace when it sent a command
 def increase_intensity():
-    global current_intensity
-    activate_channel()
-    if current_intensity < max_intensity:
-        ack = send_cmd('u')
-        if ack:
-            current_intensity = min(current_intensity + intensity_step, max_intensity)
-            print(f"*** Intensity: {int((current_intensity/max_intensity)*100)}%")
-        else:
-            print('!!! Increase not acknowledged')
+    decided = time.monotonic()
+    sent = nmes.activate(1, latency.reply_callback())
+    # steps asked for while one is in flight add up to one net target
+    sent = nmes.step_up(latency.reply_callback(report_intensity)) or sent
+    if sent:
+        latency.mark('decision', now=decided)
 
 def reset_intensity():
-    global current_intensity
-    while current_intensity > 0:
-        ack = send_cmd('j')
-        if ack:
-            current_intensity = max(current_intensity - intensity_step, 0)
-            print(f"*** Intensity: {int((current_intensity/max_intensity)*100)}%")
-        else:
-            print('!!! Decrease not acknowledged')
-            break
-    deactivate_channel()
+    decided = time.monotonic()
+    # one absolute set back to rest instead of a 'j' round-trip per step
+    sent = nmes.set_pwm(PWM_REST, latency.reply_callback(report_intensity))
+    sent = nmes.deactivate(1, latency.reply_callback()) or sent
+    if sent:
+        latency.mark('decision', now=decided)
     print('*** Channel off')
 
-# Angle calculation
-def calc_angle(a, b, c):
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    cosv = np.dot(a-b, c-b) / (np.linalg.norm(a-b)*np.linalg.norm(c-b))
-    cosv = np.clip(cosv, -1.0, 1.0)
-    return np.degrees(np.arccos(cosv))
+# Angle calculation (image-plane arm angles, one vectorized call)
+arm_angles = JointAngles(POSE_JOINTS, max_instances=1, dims=2)
+RIGHT_ELBOW = arm_angles.index['right_elbow']
 
 # Main loop
-cap = cv2.VideoCapture(0)
-with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret: break
-
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img.flags.writeable = False
-        res = pose.process(img)
-        img.flags.writeable = True
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+headless = setup_headless()
+camera = open_camera(0)  # webcam, or --replay recording
+roi = LandmarkROI()  # crop pose inference around the last detected pose
+arm = ConstantVelocityPredictor()  # arm percent between inference frames
+frame_count = 0
+points = np.zeros((0, 33, 4), np.float32)  # last detected landmarks, for drawing
+# Pose backend chosen with --pose-backend / POSE_BACKEND; replays reuse cached landmarks
+pose_backend  = selected_backend('pose')
+pose_settings = dict(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+cache = open_landmark_cache(camera, pose_backend, pose_settings, roi=True)
+with create_backend(pose_backend, **pose_settings) as pose:
+    while camera.isOpened():
+        frame = camera.next_frame()
+        nmes.poll()  # intensity / channel acks that came in meanwhile
+        if frame is None: continue
+        now = frame.timestamp  # capture time (recording time on replays)
+        frame_id, frame = frame.frame_id, frame.image
+        frame_count += 1
+        latency.begin(frame_id, now)
+
+        # Full inference every Nth frame, or every frame while the arm is lost
+        if frame_count % inference_stride == 0 or not arm.tracking:
+            cached = cache.get(frame_id) if cache is not None else None
+            if cached is not None:
+                points = cached
+            else:
+                points = pose.process(roi.crop(frame))
+                # landmarks back to full-frame coords; draw on the original frame
+                roi.map_points(points, min_confidence=0.5)
+                latency.mark('inference')
+                if cache is not None: cache.put(frame_id, points)
+            if len(points):
+                angle = arm_angles.compute(points)[0, RIGHT_ELBOW]
+                arm.update(np.interp(angle, (40, 90), (100, 0)), now)
+            else:
+                arm.reset()
+        img = frame
 
         try:
-            lm = res.pose_landmarks.landmark
-            s = [lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x, lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y]
-            e = [lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x, lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y]
-            w = [lm[mp_pose.PoseLandmark.RIGHT_WRIST.value].x, lm[mp_pose.PoseLandmark.RIGHT_WRIST.value].y]
-            angle = calc_angle(s, e, w)
-            pct = np.interp(angle, (40, 90), (100, 0))
-            pct = np.clip(pct, 0, 100)
+            # Stall/drop detection runs on the per-frame (predicted) percent
+            if not arm.tracking:
+                raise ValueError('no pose detected')
+            pct = np.clip(arm.predict(now), 0, 100)
 
             if last_angle is not None:
                 delta = pct - last_angle
@@ -142,8 +124,8 @@ with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as
                         increase_intensity()
                     if abs(delta) < small_thresh:
                         if hold_start is None:
-                            hold_start = time.time()
-                        elif time.time() - hold_start > hold_time:
+                            hold_start = now
+                        elif now - hold_start > hold_time:
                             print('>>> Stuck hold')
                             increase_intensity()
                             hold_start = None
@@ -151,8 +133,8 @@ with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as
                         hold_start = None
                     if pct >= full_min:
                         if full_hold_start is None:
-                            full_hold_start = time.time()
-                        elif time.time() - full_hold_start > hold_time:
+                            full_hold_start = now
+                        elif now - full_hold_start > hold_time:
                             print('>>> Full reached')
                             reset_intensity()
                             expecting_up = False
@@ -167,16 +149,21 @@ with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as
             col = (0,255,0) if expecting_up else (0,0,255)
             cv2.putText(img, phase, (50,50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, col, 3)
             cv2.putText(img, f'{int(pct)}%', (50,100), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255,255,255), 2)
-            cv2.putText(img, f'I:{int((current_intensity/max_intensity)*100)}%', (50,150), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0,255,255), 2)
+            cv2.putText(img, f'I:{nmes.percent}%', (50,150), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0,255,255), 2)
 
         except Exception as e:
             print('Error:', e)
 
-        mp_drawing.draw_landmarks(img, res.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+        if headless: continue
+        draw_landmarks(img, points, POSE_CONNECTIONS)
+        if latency_args.latency_hud:
+            latency.draw_hud(img, (10, 200))
         cv2.imshow('Trainer', img)
         if cv2.waitKey(10) & 0xFF == 27:
             break
 
-cap.release()
-ser.close()
+camera.release()
+if cache is not None: cache.save()
+if latency_args.latency_log: latency.dump(latency_args.latency_log)
+nmes.close()
 cv2.destroyAllWindows()
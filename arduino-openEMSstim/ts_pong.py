@@ -1,93 +1,61 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import pygame
 import random
-import serial
 import time
-
-# ─── SERIAL SETUP ─────────────────────────────────────────────────────────
-arduino_port = 'COM12'
-baud_rate    = 19200
-try:
-    ser = serial.Serial(arduino_port, baudrate=baud_rate, timeout=1)
-    time.sleep(2)
-    ser.reset_input_buffer()
-    print("Connected to NMES device.")
-except Exception as e:
-    ser = None
-    print(f"Serial connection failed: {e}")
-
-# ─── NMES STATE MACHINE ─────────────────────────────────────────────────
-current_intensity = 0
-max_intensity     = 255
-intensity_step    = max_intensity // 10  # 10% steps
-
-last_pct          = None
-expecting_up      = True
-hold_start        = None
-full_hold_start   = None
-
+import os
+import sys
+from functools import partial
+
+# shared camera/tracking helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from replay_source import frame_rate, open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+from inference_worker import InferenceWorker
+from motion_predictor import ConstantVelocityPredictor
+from kinematics import JointAngles, POSE_JOINTS
+from camera_surface import CameraSurface
+from latency_trace import LatencyTrace, latency_options
+from nmes_device import open_device
+from nmes_serial import PWM_REST
+
+# ─── NMES THRESHOLDS ────────────────────────────────────────────────────
 small_thresh = 1.5    # ° for “stuck” detection
 hold_time    = 3      # s to trigger bump when stuck/full
 drop_thresh  = 10     # % drop triggers early‐drop bump
 full_min     = 95     # % = full contraction
 rest_max     = 5      # % = rest position
 
-def send_cmd(cmd, timeout=1.0):
-    """Write cmd, wait for ack containing key substring."""
-    if not ser:
-        return None
-    ser.reset_input_buffer()
-    ser.write(f"{cmd}\r\n".encode())
-    ser.flush()
-    start = time.time()
-    expected = {'u': 'PWM Increased', 'j': 'PWM Decreased', '1': 'Channel 1'}.get(cmd)
-    while time.time() - start < timeout:
-        line = ser.readline().decode('utf-8', errors='ignore').strip()
-        if not line:
-            continue
-        print(f"<<< Arduino: {line}")
-        if expected and expected in line:
-            return line
-    print(f"!!! No ack for '{cmd}' within {timeout}s")
-    return None
-
-def activate_channel():
-    """Toggle channel on, expect 'active' in the Arduino reply."""
-    ack = send_cmd('1')
-    if ack and 'active' in ack.lower():
-        print("*** Channel ON")
-
-def deactivate_channel():
-    """Toggle channel off, expect 'inactive' in the Arduino reply."""
-    ack = send_cmd('1')
-    if ack and 'inactive' in ack.lower():
-        print("*** Channel OFF")
-
-def increase_intensity():
-    global current_intensity
-    if current_intensity < max_intensity:
-        if send_cmd('u'):
-            current_intensity = min(current_intensity + intensity_step, max_intensity)
-            print(f"*** Intensity: {int((current_intensity/max_intensity)*100)}%")
-
-def reset_intensity():
-    global current_intensity
-    while current_intensity > 0:
-        if send_cmd('j'):
-            current_intensity = max(current_intensity - intensity_step, 0)
-            print(f"*** Intensity: {int((current_intensity/max_intensity)*100)}%")
-        else:
-            break
-    deactivate_channel()
+inference_stride = 3  # pose inference on every Nth camera frame (~10 Hz at 30 fps)
+
+def report_intensity(nmes, reply):
+    """Print the level the firmware acknowledged (once per command sent)."""
+    if reply.line and not reply.superseded:
+        print(f"*** Intensity: {nmes.percent}%")
+
+# A decision only counts in the latency trace when it sent a command
+def increase_intensity(nmes, latency):
+    decided = time.monotonic()
+    if nmes:
+        sent = nmes.activate(1, latency.reply_callback())
+        # steps asked for while one is in flight add up to one net target
+        sent = nmes.step_up(latency.reply_callback(partial(report_intensity, nmes))) or sent
+        if sent:
+            latency.mark('decision', now=decided)
+
+def reset_intensity(nmes, latency):
+    # one absolute set back to the resting pulse width, not a 'j' per
+    # step; runs every frame of a catch, and sends nothing once done
+    decided = time.monotonic()
+    if nmes:
+        sent = nmes.set_pwm(PWM_REST, latency.reply_callback(partial(report_intensity, nmes)))
+        sent = nmes.deactivate(1, latency.reply_callback()) or sent
+        if sent:
+            latency.mark('decision', now=decided)
 
 # ─── HELPERS ─────────────────────────────────────────────────────────────
-def calc_angle(a, b, c):
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    cosv = np.dot(a-b, c-b)/(np.linalg.norm(a-b)*np.linalg.norm(c-b))
-    cosv = np.clip(cosv, -1.0, 1.0)
-    return np.degrees(np.arccos(cosv))
+arm_angles  = JointAngles(POSE_JOINTS, max_instances=1, dims=2)
+RIGHT_ELBOW = arm_angles.index['right_elbow']
 
 def predict_intersection(ball, target_x):
     """Simulate ball path until x crosses target_x, reflecting off walls."""
@@ -101,13 +69,9 @@ def predict_intersection(ball, target_x):
             dy *= -1
     return y
 
-# ─── PYGAME + MEDIAPIPE SETUP ────────────────────────────────────────────
-pygame.init()
+# ─── GAME OBJECTS ───────────────────────────────────────────────────────
 GAME_WIDTH, GAME_HEIGHT = 640, 480
 CAM_WIDTH,  CAM_HEIGHT  = 640, 480
-SCREEN = pygame.display.set_mode((GAME_WIDTH+CAM_WIDTH, GAME_HEIGHT))
-pygame.display.set_caption("Arm-Controlled Pong + NMES")
-clock = pygame.time.Clock()
 
 PADDLE_W, PADDLE_H = 15, 100
 BALL_SIZE = 15
@@ -116,15 +80,8 @@ BLACK = (0,0,0)
 RED   = (255,0,0)
 GREEN = (0,255,0)
 BLUE  = (0,0,255)
+YELLOW = (255,255,0)
 
-font       = pygame.font.SysFont('Arial', 24)
-large_font = pygame.font.SysFont('Arial', 48)
-
-mp_pose = mp.solutions.pose
-pose    = mp_pose.Pose(min_detection_confidence=0.5,
-                       min_tracking_confidence=0.5)
-
-# ─── GAME OBJECTS ───────────────────────────────────────────────────────
 class Paddle:
     def __init__(self, x, y, col):
         self.rect = pygame.Rect(x, y, PADDLE_W, PADDLE_H)
@@ -132,8 +89,8 @@ class Paddle:
     def set_pos(self, pct):
         y = GAME_HEIGHT - PADDLE_H - (pct/100)*(GAME_HEIGHT-PADDLE_H)
         self.rect.y = int(np.clip(y, 0, GAME_HEIGHT-PADDLE_H))
-    def draw(self):
-        pygame.draw.rect(SCREEN, self.col, self.rect)
+    def draw(self, screen):
+        pygame.draw.rect(screen, self.col, self.rect)
 
 class Ball:
     def __init__(self):
@@ -152,136 +109,199 @@ class Ball:
         self.rect.y += self.dy
         if self.rect.top <= 0 or self.rect.bottom >= GAME_HEIGHT:
             self.dy *= -1
-    def draw(self):
-        pygame.draw.rect(SCREEN, WHITE, self.rect)
-
-player = Paddle(GAME_WIDTH-50, GAME_HEIGHT//2, GREEN)
-ai     = Paddle(30, GAME_HEIGHT//2, RED)
-ball   = Ball()
-
-player_score = 0
-ai_score     = 0
-paused       = False
-running      = True
-last_pct     = None
-
-cap = cv2.VideoCapture(0)
-while running:
-    ret, frame = cap.read()
-    if not ret: break
-
-    # Pose → paddle mapping
-    img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    res = pose.process(img)
-    pct = None
-    if res.pose_landmarks:
-        lm = res.pose_landmarks.landmark
-        s = [lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x,
-             lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y]
-        e = [lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x,
-             lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y]
-        w = [lm[mp_pose.PoseLandmark.RIGHT_WRIST.value].x,
-             lm[mp_pose.PoseLandmark.RIGHT_WRIST.value].y]
-        angle = calc_angle(s, e, w)
-        pct   = np.interp(angle, [40,90], [100,0])
-        pct   = np.clip(pct, 0, 100)
-        player.set_pos(pct)
-
-        # NMES logic
-        if last_pct is not None:
-            delta = pct - last_pct
-            if expecting_up:
-                if delta < -drop_thresh:
-                    increase_intensity()
-                if abs(delta) < small_thresh:
-                    if hold_start is None:
-                        hold_start = time.time()
-                    elif time.time()-hold_start > hold_time:
-                        increase_intensity()
+    def draw(self, screen):
+        pygame.draw.rect(screen, WHITE, self.rect)
+
+def main():
+    # ─── SERIAL SETUP ─────────────────────────────────────────────────────────
+    # Commands go out from a background thread and acks are applied from
+    # nmes.poll() in the game loop, so the paddle keeps moving while the
+    # firmware answers (--nmes-binary: framed protocol)
+    nmes = open_device(max_level=10)  # None without the device; 10% steps
+
+    # ─── NMES STATE MACHINE ─────────────────────────────────────────────────
+    last_pct          = None
+    expecting_up      = True
+    hold_start        = None
+    full_hold_start   = None
+
+    latency      = LatencyTrace()      # capture → inference → decision → write → ack
+    latency_args = latency_options()   # --latency-hud, --latency-log PATH
+
+    # ─── PYGAME + MEDIAPIPE SETUP ────────────────────────────────────────────
+    setup_headless()  # dummy video driver with --headless
+    pygame.init()
+    SCREEN = pygame.display.set_mode((GAME_WIDTH+CAM_WIDTH, GAME_HEIGHT))
+    pygame.display.set_caption("Arm-Controlled Pong + NMES")
+    camera_view = CameraSurface((CAM_WIDTH, CAM_HEIGHT))
+    clock = pygame.time.Clock()
+
+    font       = pygame.font.SysFont('Arial', 24)
+    large_font = pygame.font.SysFont('Arial', 48)
+    hud_font   = pygame.font.SysFont('Courier', 16)
+
+    # pose inference runs in a worker process; the game loop never waits on it
+    pose    = InferenceWorker('pose', roi=True,
+                              min_detection_confidence=0.5,
+                              min_tracking_confidence=0.5)
+
+    player = Paddle(GAME_WIDTH-50, GAME_HEIGHT//2, GREEN)
+    ai     = Paddle(30, GAME_HEIGHT//2, RED)
+    ball   = Ball()
+
+    player_score = 0
+    ai_score     = 0
+    paused       = False
+    running      = True
+    last_pct     = None
+
+    camera         = open_camera(0)  # webcam, or --replay recording
+    pose.cache     = open_landmark_cache(camera, pose.backend, pose.model_kwargs, roi=True)
+    arm            = ConstantVelocityPredictor()  # arm % between inference frames
+    last_frame_id  = 0
+    last_result_id = 0
+    frame_count    = 0
+    while running:
+        if nmes: nmes.poll()  # acks that came in since the last frame
+        frame = camera.read()
+        if frame is None:
+            if not camera.isOpened(): break
+            clock.tick(frame_rate(60))
+            continue
+        ret       = True
+        new_frame = frame.frame_id != last_frame_id
+        if new_frame:
+            last_frame_id = frame.frame_id
+            frame_count  += 1
+            latency.begin(frame.frame_id, frame.timestamp)
+            # every Nth frame, or every frame while the arm is lost
+            if frame_count % inference_stride == 0 or not arm.tracking:
+                pose.submit(frame.frame_id, frame.image, frame.timestamp)
+        frame_time = frame.timestamp
+        frame      = frame.image
+
+        # Pose → arm % measurement (whenever the worker published a new result)
+        res = pose.latest()
+        if res is not None and res.frame_id != last_result_id:
+            last_result_id = res.frame_id
+            latency.mark('inference', res.frame_id)
+            if len(res.points):
+                angle = arm_angles.compute(res.points)[0, RIGHT_ELBOW]
+                arm.update(np.interp(angle, [40,90], [100,0]), res.frame_time)
+            else:
+                arm.reset()
+
+        # Paddle + NMES logic on every camera frame, using the predicted arm %
+        pct = None
+        if new_frame and arm.tracking:
+            pct   = np.clip(arm.predict(frame_time), 0, 100)
+            player.set_pos(pct)
+
+            # NMES logic
+            if last_pct is not None:
+                delta = pct - last_pct
+                if expecting_up:
+                    if delta < -drop_thresh:
+                        increase_intensity(nmes, latency)
+                    if abs(delta) < small_thresh:
+                        if hold_start is None:
+                            hold_start = frame_time
+                        elif frame_time-hold_start > hold_time:
+                            increase_intensity(nmes, latency)
+                            hold_start = None
+                    else:
                         hold_start = None
+                    if pct >= full_min:
+                        if full_hold_start is None:
+                            full_hold_start = frame_time
+                        elif frame_time-full_hold_start > hold_time:
+                            reset_intensity(nmes, latency)
+                            expecting_up    = False
+                            full_hold_start = None
                 else:
-                    hold_start = None
-                if pct >= full_min:
-                    if full_hold_start is None:
-                        full_hold_start = time.time()
-                    elif time.time()-full_hold_start > hold_time:
-                        reset_intensity()
-                        expecting_up    = False
-                        full_hold_start = None
-            else:
-                if pct <= rest_max:
-                    expecting_up = True
-        last_pct = pct
-
-    # Camera → Pygame surface
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    frame = np.rot90(frame)
-    surf  = pygame.surfarray.make_surface(frame)
-    surf  = pygame.transform.flip(surf, True, False)
-
-    for evt in pygame.event.get():
-        if evt.type == pygame.QUIT:
-            running = False
-        elif evt.type == pygame.KEYDOWN and evt.key == pygame.K_p:
-            paused = not paused
-
-    SCREEN.fill(BLACK)
-    if ret:
-        SCREEN.blit(surf, (GAME_WIDTH, 0))
-
-    # Game physics
-    if not paused:
-        # AI paddle
-        if abs(ai.rect.centery - ball.rect.centery) > 5:
-            ai.rect.centery += 5 * np.sign(ball.rect.centery - ai.rect.centery)
-        ball.move()
-
-        # Collisions & reset
-        if ball.rect.colliderect(player.rect):
-            ball.dx = -abs(ball.dx); player_score+=1
-        if ball.rect.colliderect(ai.rect):
-            ball.dx =  abs(ball.dx); ai_score    +=1
-        if ball.rect.left<=0 or ball.rect.right>=GAME_WIDTH:
-            ball.reset()
-
-        # Slowdown while intensity > 0
-        if current_intensity > 0:
-            ball.dx *= 0.9
-            ball.dy *= 0.9
-
-    # Shadow ball + catch detection
-    if ball.dx > 0:
-        target_x = player.rect.left
-        pred_y   = predict_intersection(ball, target_x)
-        pygame.draw.circle(SCREEN, BLUE, (target_x, int(pred_y)), BALL_SIZE//2)
-        if player.rect.collidepoint(target_x, int(pred_y)):
-            # restore speed & reset NMES for next cycle
-            ball.dx = np.sign(ball.dx)*ball.base_dx
-            ball.dy = np.sign(ball.dy)*ball.base_dy
-            reset_intensity()
-            expecting_up     = True
-            last_pct         = None
-            hold_start       = None
-            full_hold_start  = None
-
-    # Draw everything
-    player.draw()
-    ai.draw()
-    ball.draw()
-
-    SCREEN.blit(font.render(f"Player: {player_score}", True, GREEN),
-                (GAME_WIDTH-150, 20))
-    SCREEN.blit(font.render(f"AI:     {ai_score}",     True, RED),
-                (50, 20))
-
-    # ** Always show intensity % at bottom of game area **
-    SCREEN.blit(font.render(f"Intensity: {int((current_intensity/max_intensity)*100)}%", True, WHITE),
-                (GAME_WIDTH+10, GAME_HEIGHT-40))
-
-    pygame.display.flip()
-    clock.tick(60)
-
-cap.release()
-if ser: ser.close()
-cv2.destroyAllWindows()
-pygame.quit()
+                    if pct <= rest_max:
+                        expecting_up = True
+            last_pct = pct
+
+        # Camera → persistent Pygame surface (only when the frame changed)
+        surf = camera_view.update(frame) if new_frame else camera_view.surface
+
+        for evt in pygame.event.get():
+            if evt.type == pygame.QUIT:
+                running = False
+            elif evt.type == pygame.KEYDOWN and evt.key == pygame.K_p:
+                paused = not paused
+
+        SCREEN.fill(BLACK)
+        if ret:
+            SCREEN.blit(surf, (GAME_WIDTH, 0))
+
+        # Game physics
+        if not paused:
+            # AI paddle
+            if abs(ai.rect.centery - ball.rect.centery) > 5:
+                ai.rect.centery += 5 * np.sign(ball.rect.centery - ai.rect.centery)
+            ball.move()
+
+            # Collisions & reset
+            if ball.rect.colliderect(player.rect):
+                ball.dx = -abs(ball.dx); player_score+=1
+            if ball.rect.colliderect(ai.rect):
+                ball.dx =  abs(ball.dx); ai_score    +=1
+            if ball.rect.left<=0 or ball.rect.right>=GAME_WIDTH:
+                ball.reset()
+
+            # Slowdown while intensity > 0
+            if nmes and nmes.level > 0:
+                ball.dx *= 0.9
+                ball.dy *= 0.9
+
+        # Shadow ball + catch detection
+        if ball.dx > 0:
+            target_x = player.rect.left
+            pred_y   = predict_intersection(ball, target_x)
+            pygame.draw.circle(SCREEN, BLUE, (target_x, int(pred_y)), BALL_SIZE//2)
+            if player.rect.collidepoint(target_x, int(pred_y)):
+                # restore speed & reset NMES for next cycle
+                ball.dx = np.sign(ball.dx)*ball.base_dx
+                ball.dy = np.sign(ball.dy)*ball.base_dy
+                reset_intensity(nmes, latency)
+                expecting_up     = True
+                last_pct         = None
+                hold_start       = None
+                full_hold_start  = None
+
+        # Draw everything
+        player.draw(SCREEN)
+        ai.draw(SCREEN)
+        ball.draw(SCREEN)
+
+        SCREEN.blit(font.render(f"Player: {player_score}", True, GREEN),
+                    (GAME_WIDTH-150, 20))
+        SCREEN.blit(font.render(f"AI:     {ai_score}",     True, RED),
+                    (50, 20))
+
+        # ** Always show intensity % at bottom of game area **
+        SCREEN.blit(font.render(f"Intensity: {nmes.percent if nmes else 0}%", True, WHITE),
+                    (GAME_WIDTH+10, GAME_HEIGHT-40))
+
+        if latency_args.latency_hud:
+            for i, line in enumerate(latency.hud_lines()):
+                SCREEN.blit(hud_font.render(line, True, YELLOW), (GAME_WIDTH+10, 10+18*i))
+
+        pygame.display.flip()
+        clock.tick(frame_rate(60))
+
+    camera.release()
+    pose.close()
+    if latency_args.latency_log:
+        latency.dump(latency_args.latency_log)
+    if nmes: nmes.close()
+    cv2.destroyAllWindows()
+    pygame.quit()
+
+
+# The pose worker is a spawned process, which imports this script before it
+# starts: everything that opens a window, camera or device happens in main()
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,38 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import pygame
 import random
-import serial
-import time
-
-# Serial setup for NMES device
-try:
-    stim_serial = serial.Serial('COM12', 19200, timeout=1)
-    time.sleep(2)
-    print("Connected to NMES device.")
-except serial.SerialException as e:
-    stim_serial = None
-    print(f"Serial connection failed: {e}")
-
-# stimulation state & PWM intensity variables
-stimulating = False
-current_pwm = 128
-pwm_step = 10
+import os
+import sys
+
+# shared camera/tracking helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from kinematics import JointAngles, POSE_JOINTS
+from camera_surface import CameraSurface
+from tracking_backends import create_backend, selected_backend
+from replay_source import frame_rate, open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+from nmes_device import open_device
+
+# NMES device (None without the hardware); channel state and PWM come
+# from the firmware's acks (--nmes-binary: framed protocol)
+nmes = open_device()  # finds the board's port
+
+# PWM intensity range
 min_pwm = 0
 max_pwm = 255
 
 def start_stimulation():
-    global stimulating
-    if stim_serial and not stimulating:
-        stim_serial.write(b'1')    # toggle channel on
-        stimulating = True
+    if nmes and nmes.activate(1):    # switch channel on
         print("Stimulation STARTED")
 
 def stop_stimulation():
-    global stimulating, current_pwm
-    if stim_serial and stimulating:
-        stim_serial.write(b'1')    # toggle channel off
-        stimulating = False
+    # back to the resting pulse width and channel off
+    if nmes and nmes.reset(1):
         print("Stimulation STOPPED")
-        # reset our Python-side intensity
-        current_pwm = 128
 
-# Pygame setup
+# Pygame setup (dummy video driver with --headless)
+setup_headless()
 pygame.init()
 GAME_WIDTH, GAME_HEIGHT = 640, 480
 CAM_WIDTH, CAM_HEIGHT = 640, 480
@@ -46,6 +40,7 @@ SCREEN_WIDTH = GAME_WIDTH + CAM_WIDTH
 SCREEN_HEIGHT = max(GAME_HEIGHT, CAM_HEIGHT)
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Arm-Controlled Pong with NMES")
+camera_view = CameraSurface((CAM_WIDTH, CAM_HEIGHT))
 clock = pygame.time.Clock()
 
 # Game elements
@@ -98,22 +93,17 @@ ai_score     = 0
 font     = pygame.font.SysFont('Arial', 30)
 large_font = pygame.font.SysFont('Arial', 50)
 
-# MediaPipe Pose
-mp_pose    = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose       = mp_pose.Pose(min_detection_confidence=0.5,
-                         min_tracking_confidence=0.5)
+# Pose backend chosen with --pose-backend / POSE_BACKEND
+pose_backend  = selected_backend('pose')
+pose_settings = dict(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+pose          = create_backend(pose_backend, **pose_settings)
 
-def calculate_angle(a, b, c):
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    radians = np.arccos(np.clip(
-        np.dot(a-b, c-b)/(
-            np.linalg.norm(a-b)*np.linalg.norm(c-b)
-        ), -1, 1
-    ))
-    return np.degrees(radians)
+# right-arm elbow angle via the shared kinematics table (x, y only)
+arm_angles  = JointAngles(POSE_JOINTS, max_instances=1, dims=2)
+RIGHT_ELBOW = arm_angles.index['right_elbow']
 
-cap = cv2.VideoCapture(0)
+camera = open_camera(0)  # webcam, or --replay recording
+cache  = open_landmark_cache(camera, pose_backend, pose_settings)  # replays only
 
 def draw_button(text, x, y, w, h, inactive, active):
     mx, my = pygame.mouse.get_pos()
@@ -131,22 +121,21 @@ def draw_button(text, x, y, w, h, inactive, active):
 
 running = True
 while running:
-    ret, frame = cap.read()
+    if nmes: nmes.poll()   # apply the stimulator's acks
+    frame = camera.next_frame()
+    ret   = frame is not None
+    if not ret and not camera.isOpened():
+        break
     if ret:
-        image  = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(image)
+        frame_id, frame = frame.frame_id, frame.image
+        points = cache.get(frame_id) if cache is not None else None
+        if points is None:
+            points = pose.process(frame)
+            if cache is not None: cache.put(frame_id, points)
 
-        if results.pose_landmarks and not paused and game_active:
-            lm = results.pose_landmarks.landmark
+        if len(points) and not paused and game_active:
             try:
-                shoulder = [lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x,
-                            lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y]
-                elbow    = [lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x,
-                            lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y]
-                wrist    = [lm[mp_pose.PoseLandmark.RIGHT_WRIST.value].x,
-                            lm[mp_pose.PoseLandmark.RIGHT_WRIST.value].y]
-
-                angle = calculate_angle(shoulder, elbow, wrist)
+                angle  = arm_angles.compute(points)[0, RIGHT_ELBOW]
                 percent_complete = np.interp(angle, [40, 90], [100, 0])
                 percent_complete = np.clip(percent_complete, 0, 100)
                 player_paddle.set_position(percent_complete)
@@ -159,11 +148,8 @@ while running:
             except Exception:
                 pass
 
-        # prepare camera frame for pygame
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = np.rot90(frame)
-        frame = pygame.surfarray.make_surface(frame)
-        frame = pygame.transform.flip(frame, True, False)
+        # copy camera frame into the persistent pygame surface
+        frame = camera_view.update(frame)
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
@@ -202,14 +188,9 @@ while running:
             desired_pwm = int(np.interp(error_abs,
                                         [0, GAME_HEIGHT],
                                         [min_pwm, max_pwm]))
-            if current_pwm < desired_pwm:
-                stim_serial.write(b'u')
-                current_pwm = min(current_pwm + pwm_step, max_pwm)
-                print(f"PWM Increased → {current_pwm}")
-            elif current_pwm > desired_pwm:
-                stim_serial.write(b'j')
-                current_pwm = max(current_pwm - pwm_step, min_pwm)
-                print(f"PWM Decreased → {current_pwm}")
+            # one absolute set, only the newest while one is in flight
+            if nmes:
+                nmes.set_pwm(desired_pwm)
 
             # slow ball so user has time
             ball.dx *= 0.9
@@ -249,8 +230,11 @@ while running:
         ))
 
     pygame.display.flip()
-    clock.tick(60)
+    clock.tick(frame_rate(60))
 
-cap.release()
+camera.release()
+pose.close()
+if nmes: nmes.close()
+if cache is not None: cache.save()
 cv2.destroyAllWindows()
 pygame.quit()
@@ -1,18 +1,17 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import pygame
 import random
+from replay_source import frame_rate, open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+from inference_worker import InferenceWorker
+from kinematics import JointAngles, POSE_JOINTS
+from camera_surface import CameraSurface
 
-# Initialize pygame
-pygame.init()
 GAME_WIDTH, GAME_HEIGHT = 640, 480
 CAM_WIDTH, CAM_HEIGHT = 640, 480
 SCREEN_WIDTH = GAME_WIDTH + CAM_WIDTH
 SCREEN_HEIGHT = max(GAME_HEIGHT, CAM_HEIGHT)
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Arm-Controlled Pong")
-clock = pygame.time.Clock()
 
 # Game elements
 PADDLE_WIDTH, PADDLE_HEIGHT = 15, 100
@@ -33,7 +32,7 @@ class Paddle:
         y_pos = GAME_HEIGHT - PADDLE_HEIGHT - (percent/100 * (GAME_HEIGHT - PADDLE_HEIGHT))
         self.rect.y = max(0, min(GAME_HEIGHT - PADDLE_HEIGHT, y_pos))
     
-    def draw(self):
+    def draw(self, screen):
         pygame.draw.rect(screen, self.color, self.rect)
 
 class Ball:
@@ -53,35 +52,10 @@ class Ball:
         if self.rect.top <= 0 or self.rect.bottom >= GAME_HEIGHT:
             self.dy *= -1
     
-    def draw(self):
+    def draw(self, screen):
         pygame.draw.rect(screen, WHITE, self.rect)
 
-# Initialize game objects
-player_paddle = Paddle(GAME_WIDTH - 50, GAME_HEIGHT//2, GREEN)
-ai_paddle = Paddle(30, GAME_HEIGHT//2, RED)
-ball = Ball()
-
-# Game state
-game_active = True
-paused = False
-player_score = 0
-ai_score = 0
-font = pygame.font.SysFont('Arial', 30)
-large_font = pygame.font.SysFont('Arial', 50)
-
-# MediaPipe setup
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-
-def calculate_angle(a, b, c):
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    radians = np.arccos(np.clip(np.dot(a-b, c-b)/(np.linalg.norm(a-b)*np.linalg.norm(c-b)), -1, 1))
-    return np.degrees(radians)
-
-cap = cv2.VideoCapture(0)
-
-def draw_button(text, x, y, width, height, inactive_color, active_color):
+def draw_button(screen, font, text, x, y, width, height, inactive_color, active_color):
     mouse = pygame.mouse.get_pos()
     click = pygame.mouse.get_pressed()
     
@@ -97,120 +71,167 @@ def draw_button(text, x, y, width, height, inactive_color, active_color):
     screen.blit(text_surf, text_rect)
     return False
 
-running = True
-while running:
-    # Process webcam frame
-    ret, frame = cap.read()
-    if ret:
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(image)
-        
-        if results.pose_landmarks and not paused and game_active:
-            landmarks = results.pose_landmarks.landmark
-            try:
-                # Get right arm landmarks
-                shoulder = [landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x, 
-                           landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y]
-                elbow = [landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x,
-                         landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y]
-                wrist = [landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].x,
-                         landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].y]
-                
-                angle = calculate_angle(shoulder, elbow, wrist)
-                percent_complete = np.interp(angle, [40, 90], [100, 0])
-                percent_complete = max(0, min(100, percent_complete))
-                player_paddle.set_position(percent_complete)
-                
+def main():
+    # Initialize pygame (dummy video driver with --headless)
+    setup_headless()
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Arm-Controlled Pong")
+    camera_view = CameraSurface((CAM_WIDTH, CAM_HEIGHT))
+    clock = pygame.time.Clock()
+
+    # Initialize game objects
+    player_paddle = Paddle(GAME_WIDTH - 50, GAME_HEIGHT//2, GREEN)
+    ai_paddle = Paddle(30, GAME_HEIGHT//2, RED)
+    ball = Ball()
+
+    # Game state
+    game_active = True
+    paused = False
+    player_score = 0
+    ai_score = 0
+    font = pygame.font.SysFont('Arial', 30)
+    large_font = pygame.font.SysFont('Arial', 50)
+
+    # Pose tracking (inference runs in a worker process so it never stalls the game loop)
+    pose = InferenceWorker('pose', roi=True, min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+    # Arm joint angles in the image plane (x, y), as the game always used
+    arm_angles = JointAngles(POSE_JOINTS, max_instances=1, dims=2)
+    RIGHT_ELBOW = arm_angles.index['right_elbow']
+
+    camera = open_camera(0)  # webcam, or the --replay recording
+    pose.cache = open_landmark_cache(camera, pose.backend, pose.model_kwargs, roi=True)
+    last_frame_id = 0
+    last_result_id = 0
+    angle = None
+    percent_complete = None
+
+    running = True
+    while running:
+        # Hand the newest webcam frame to the pose worker
+        frame = camera.read()
+        ret = frame is not None
+        if not ret and not camera.isOpened():
+            break
+        if ret:
+            new_frame = frame.frame_id != last_frame_id
+            if new_frame:
+                last_frame_id = frame.frame_id
+                pose.submit(frame.frame_id, frame.image, frame.timestamp)
+            
+            # Pick up landmarks whenever the worker has published new ones
+            results = pose.latest()
+            new_result = results is not None and results.frame_id != last_result_id
+            if new_result:
+                last_result_id = results.frame_id
+                angle = None
+                if len(results.points) and not paused and game_active:
+                    try:
+                        # Right elbow angle (shoulder, elbow, wrist)
+                        angle = arm_angles.compute(results.points)[0, RIGHT_ELBOW]
+                        percent_complete = np.interp(angle, [40, 90], [100, 0])
+                        percent_complete = max(0, min(100, percent_complete))
+                        player_paddle.set_position(percent_complete)
+                        
+                    except Exception as e:
+                        angle = None
+            
+            # Copy the camera frame into the persistent pygame surface, only
+            # when the frame (or the angle drawn on it) changed
+            if new_frame or new_result:
+                camera_view.update(frame.image)
+            
                 # Display angle info on camera feed
-                cv2.putText(frame, f"Angle: {int(angle)}°", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                cv2.putText(frame, f"Completion: {int(percent_complete)}%", (10, 70), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                
-            except Exception as e:
-                pass
+                if angle is not None:
+                    cv2.putText(camera_view.pixels, f"Angle: {int(angle)}°", (10, 30), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                    cv2.putText(camera_view.pixels, f"Completion: {int(percent_complete)}%", (10, 70), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            frame = camera_view.surface
         
-        # Convert camera frame to pygame surface
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = np.rot90(frame)
-        frame = pygame.surfarray.make_surface(frame)
-        frame = pygame.transform.flip(frame, True, False)
-    
-    # Handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-    
-    # Clear screen
-    screen.fill(BLACK)
-    
-    # Draw camera feed on the right side
-    if ret:
-        screen.blit(frame, (GAME_WIDTH, 0))
-    
-    # Draw game elements on the left side
-    if game_active and not paused:
-        # AI paddle movement
-        target_y = ball.rect.centery - PADDLE_HEIGHT//2
-        ai_speed = 5
-        if abs(ai_paddle.rect.centery - ball.rect.centery) > ai_speed:
-            if ai_paddle.rect.centery < ball.rect.centery:
-                ai_paddle.rect.y += ai_speed
-            else:
-                ai_paddle.rect.y -= ai_speed
+        # Handle events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
         
-        # Ball movement
-        ball.move()
+        # Clear screen
+        screen.fill(BLACK)
         
-        # Paddle collisions
-        if ball.rect.colliderect(player_paddle.rect):
-            ball.dx = -abs(ball.dx)
-            player_score += 1
+        # Draw camera feed on the right side
+        if ret:
+            screen.blit(frame, (GAME_WIDTH, 0))
         
-        if ball.rect.colliderect(ai_paddle.rect):
-            ball.dx = abs(ball.dx)
-            ai_score += 1
+        # Draw game elements on the left side
+        if game_active and not paused:
+            # AI paddle movement
+            target_y = ball.rect.centery - PADDLE_HEIGHT//2
+            ai_speed = 5
+            if abs(ai_paddle.rect.centery - ball.rect.centery) > ai_speed:
+                if ai_paddle.rect.centery < ball.rect.centery:
+                    ai_paddle.rect.y += ai_speed
+                else:
+                    ai_paddle.rect.y -= ai_speed
+            
+            # Ball movement
+            ball.move()
+            
+            # Paddle collisions
+            if ball.rect.colliderect(player_paddle.rect):
+                ball.dx = -abs(ball.dx)
+                player_score += 1
+            
+            if ball.rect.colliderect(ai_paddle.rect):
+                ball.dx = abs(ball.dx)
+                ai_score += 1
+            
+            # Scoring
+            if ball.rect.left <= 0:
+                ball.reset()
+            elif ball.rect.right >= GAME_WIDTH:
+                ball.reset()
         
-        # Scoring
-        if ball.rect.left <= 0:
-            ball.reset()
-        elif ball.rect.right >= GAME_WIDTH:
+        # Draw game elements
+        player_paddle.draw(screen)
+        ai_paddle.draw(screen)
+        ball.draw(screen)
+        
+        # Draw scores
+        player_text = font.render(f"Player: {player_score}", True, GREEN)
+        ai_text = font.render(f"AI: {ai_score}", True, RED)
+        screen.blit(player_text, (GAME_WIDTH - 150, 20))
+        screen.blit(ai_text, (50, 20))
+        
+        # Draw buttons
+        if draw_button(screen, font, "Pause" if not paused else "Resume", 20, GAME_HEIGHT - 50, 100, 40, WHITE, (200, 200, 200)):
+            paused = not paused
+        
+        if draw_button(screen, font, "Restart", 140, GAME_HEIGHT - 50, 100, 40, WHITE, (200, 200, 200)):
+            player_score = 0
+            ai_score = 0
             ball.reset()
-    
-    # Draw game elements
-    player_paddle.draw()
-    ai_paddle.draw()
-    ball.draw()
-    
-    # Draw scores
-    player_text = font.render(f"Player: {player_score}", True, GREEN)
-    ai_text = font.render(f"AI: {ai_score}", True, RED)
-    screen.blit(player_text, (GAME_WIDTH - 150, 20))
-    screen.blit(ai_text, (50, 20))
-    
-    # Draw buttons
-    if draw_button("Pause" if not paused else "Resume", 20, GAME_HEIGHT - 50, 100, 40, WHITE, (200, 200, 200)):
-        paused = not paused
-    
-    if draw_button("Restart", 140, GAME_HEIGHT - 50, 100, 40, WHITE, (200, 200, 200)):
-        player_score = 0
-        ai_score = 0
-        ball.reset()
-        paused = False
-        game_active = True
-    
-    if draw_button("Quit", 260, GAME_HEIGHT - 50, 100, 40, WHITE, (200, 200, 200)):
-        running = False
-    
-    # Draw pause message
-    if paused:
-        pause_text = large_font.render("PAUSED", True, WHITE)
-        screen.blit(pause_text, (GAME_WIDTH//2 - pause_text.get_width()//2, 
-                               GAME_HEIGHT//2 - pause_text.get_height()//2))
-    
-    pygame.display.flip()
-    clock.tick(60)
+            paused = False
+            game_active = True
+        
+        if draw_button(screen, font, "Quit", 260, GAME_HEIGHT - 50, 100, 40, WHITE, (200, 200, 200)):
+            running = False
+        
+        # Draw pause message
+        if paused:
+            pause_text = large_font.render("PAUSED", True, WHITE)
+            screen.blit(pause_text, (GAME_WIDTH//2 - pause_text.get_width()//2, 
+                                   GAME_HEIGHT//2 - pause_text.get_height()//2))
+        
+        pygame.display.flip()
+        clock.tick(frame_rate(60))
+
+    camera.release()
+    pose.close()
+    cv2.destroyAllWindows()
+    pygame.quit()
+
 
-cap.release()
-cv2.destroyAllWindows()
-pygame.quit()
\ No newline at end of file
+# The pose worker is a spawned process, which imports this script before it
+# starts: everything that opens a window, camera or device happens in main()
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,45 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-
-# Initialize MediaPipe pose
-mp_drawing = mp.solutions.drawing_utils
-mp_pose = mp.solutions.pose
-
-def calculate_angle(a, b, c):
-    """Calculate angle between three points: elbow (b), shoulder (a), wrist (c)"""
-    a = np.array(a)  # Shoulder
-    b = np.array(b)  # Elbow
-    c = np.array(c)  # Wrist
-
-    radians = np.arccos(
-        np.clip(np.dot((a - b), (c - b)) / 
-                (np.linalg.norm(a - b) * np.linalg.norm(c - b)), -1.0, 1.0)
-    )
-    angle = np.degrees(radians)
-    return angle
-
-cap = cv2.VideoCapture(0)
-
-with mp_pose.Pose(min_detection_confidence=0.5,
-                  min_tracking_confidence=0.5) as pose:
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Recolor the frame
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image.flags.writeable = False
-
-        # Make detection
-        results = pose.process(image)
-
-        # Recolor back to BGR
-        image.flags.writeable = True
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+from landmark_roi import LandmarkROI
+from kinematics import JointAngles, POSE_JOINTS
+from tracking_backends import POSE_CONNECTIONS, create_backend, draw_landmarks, selected_backend
+from replay_source import open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+
+# Arm joint angles (shoulder-elbow-wrist etc.) in the image plane
+arm_angles = JointAngles(POSE_JOINTS, max_instances=1, dims=2)
+RIGHT_ELBOW = arm_angles.index['right_elbow']
+
+headless = setup_headless()
+camera = open_camera(0)  # webcam, or the --replay recording
+roi = LandmarkROI()  # crop inference to the area around the last detected pose
+
+# Pose backend chosen with --pose-backend / POSE_BACKEND; replays reuse cached landmarks
+pose_backend = selected_backend('pose')
+pose_settings = dict(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+cache = open_landmark_cache(camera, pose_backend, pose_settings, roi=True)
+
+with create_backend(pose_backend, **pose_settings) as pose:
+    while camera.isOpened():
+        frame = camera.next_frame()
+        if frame is None:
+            continue
+        frame_id, frame = frame.frame_id, frame.image
+
+        points = cache.get(frame_id) if cache is not None else None
+        if points is None:
+            # Detect in the region around the last pose (full frame when lost)
+            points = pose.process(roi.crop(frame))
+
+            # Map landmarks back to the full frame and draw on the original frame
+            roi.map_points(points, min_confidence=0.5)
+            if cache is not None:
+                cache.put(frame_id, points)
+        image = frame
 
         try:
-            landmarks = results.pose_landmarks.landmark
-
-            # Get coordinates for right arm
-            shoulder = [landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x,
-                        landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y]
-            elbow = [landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x,
-                     landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y]
-            wrist = [landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].x,
-                     landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].y]
-
-            angle = calculate_angle(shoulder, elbow, wrist)
+            # Right elbow angle (shoulder, elbow, wrist)
+            angle = arm_angles.compute(points)[0, RIGHT_ELBOW]
 
             # Convert angle to "completion" scale (180 = arm down, 40 = arm up)
             percent_complete = np.interp(angle,  (40, 90), (100, 0))
@@ -70,14 +59,18 @@ with mp_pose.Pose(min_detection_confidence=0.5,
         except:
             pass
 
-        # Draw pose landmarks
-        mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+        if headless:
+            continue
 
+        # Draw pose landmarks
+        draw_landmarks(image, points, POSE_CONNECTIONS)
         cv2.imshow('Bicep Curl Tracker', image)
 
         if cv2.waitKey(10) & 0xFF == 27:  # Press ESC to exit
             break
 
-cap.release()
+camera.release()
+if cache is not None:
+    cache.save()
 cv2.destroyAllWindows()
 
@@ -0,0 +1,258 @@
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# One captured camera frame. frame_id increases by one for every frame the
+# capture thread grabs, timestamp is time.monotonic() at arrival.
+Frame = namedtuple('Frame', ['frame_id', 'timestamp', 'image'])
+
+# Capture settings the games ask for: 640x480 is what they display, MJPG
+# keeps 30 fps possible over USB 2 and a one-frame driver queue stops
+# cap.read() handing out frames that waited behind older ones
+CAPTURE_DEFAULTS = dict(width=640, height=480, fps=30, fourcc='MJPG', buffersize=1)
+
+
+def configure_capture(cap, width=None, height=None, fps=None, fourcc=None, buffersize=None):
+    """
+    Request capture settings and read back what the driver actually chose.
+
+    Settings left as None are not touched. The pixel format goes first
+    because drivers pick the available sizes and rates per format.
+
+    Parameters:
+        cap: Opened cv2.VideoCapture
+        width, height: Frame size in pixels
+        fps: Frame rate
+        fourcc: Pixel format, e.g. 'MJPG' or 'YUYV'
+        buffersize: Frames the driver may queue (1 = always the newest)
+    Returns:
+        Dict of the negotiated width, height, fps, fourcc and buffersize
+    """
+    if fourcc is not None:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if width is not None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    if height is not None:
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps is not None:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    if buffersize is not None:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffersize)
+
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return {
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'fourcc': ''.join(chr((code >> 8 * i) & 0xFF) for i in range(4)) if code else '?',
+        'buffersize': int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+
+def capture_options():
+    """
+    Capture settings from the command line (other arguments are ignored),
+    on top of CAPTURE_DEFAULTS:
+        --camera-size WxH     e.g. 1280x720
+        --camera-fps N
+        --camera-format F     MJPG or YUYV
+        --camera-buffer N     driver queue length
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--camera-size')
+    parser.add_argument('--camera-fps', type=float)
+    parser.add_argument('--camera-format')
+    parser.add_argument('--camera-buffer', type=int)
+    args, _ = parser.parse_known_args()
+
+    settings = dict(CAPTURE_DEFAULTS)
+    if args.camera_size:
+        width, height = args.camera_size.lower().split('x')
+        settings.update(width=int(width), height=int(height))
+    if args.camera_fps:
+        settings['fps'] = args.camera_fps
+    if args.camera_format:
+        settings['fourcc'] = args.camera_format.upper()
+    if args.camera_buffer:
+        settings['buffersize'] = args.camera_buffer
+    return settings
+
+
+def probe_latency(cap, frames=300):
+    """
+    Measure the real frame interval and how stale frames are on arrival.
+
+    Reads straight from the capture (no thread) and compares each frame's
+    driver timestamp (CAP_PROP_POS_MSEC) with the time cap.read() returned
+    it. With V4L2 the driver stamps frames on the monotonic clock, so the
+    staleness is absolute; other backends use their own clock, in which
+    case it is reported relative to the freshest frame seen.
+
+    Parameters:
+        cap: Opened (and configured) cv2.VideoCapture
+        frames: Frames to measure
+    Returns:
+        Dict of interval and staleness statistics in milliseconds
+    """
+    arrivals, stamps = [], []
+    while len(arrivals) < frames:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        arrivals.append(time.monotonic() * 1000)
+        stamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+    if len(arrivals) < 3:
+        raise RuntimeError("Not enough frames to probe")
+
+    arrivals = np.array(arrivals[1:])   # the first read includes stream start-up
+    stamps = np.array(stamps[1:])
+    have_stamps = np.all(np.diff(stamps) > 0)
+    intervals = np.diff(stamps if have_stamps else arrivals)
+    report = {
+        'frames': len(arrivals),
+        'interval_mean': float(np.mean(intervals)),
+        'interval_p95': float(np.percentile(intervals, 95)),
+        'arrival_jitter': float(np.std(np.diff(arrivals))),
+        'timestamps': 'driver' if have_stamps else 'arrival only',
+    }
+    if have_stamps:
+        staleness = arrivals - stamps
+        # Driver clock not comparable to ours: report the delay above the best case
+        absolute = bool(np.all((staleness >= 0) & (staleness < 10000)))
+        if not absolute:
+            staleness = staleness - staleness.min()
+        report.update(staleness_mean=float(np.mean(staleness)),
+                      staleness_p95=float(np.percentile(staleness, 95)),
+                      staleness_max=float(np.max(staleness)),
+                      staleness_clock='absolute' if absolute else 'relative to best')
+    return report
+
+
+class CameraStream:
+    def __init__(self, src=0, **settings):
+        """
+        Grab camera frames on a background thread, keeping only the newest.
+
+        Parameters:
+            src: Camera index or video path passed to cv2.VideoCapture
+            settings: Capture settings for configure_capture (width, height,
+                      fps, fourcc, buffersize); cameras default to
+                      CAPTURE_DEFAULTS, video files are left as they are
+        """
+        self.cap = cv2.VideoCapture(src)
+        if isinstance(src, int):
+            settings = dict(CAPTURE_DEFAULTS, **settings)
+        self.settings = configure_capture(self.cap, **settings) if self.cap.isOpened() else {}
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._latest = None
+        self._frame_id = 0
+        self._last_read_id = 0
+        self._running = False
+        self._thread = None
+        self.dropped = 0
+
+    def start(self):
+        """Start the capture thread. Returns self so calls can be chained."""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        self._thread.start()
+        return self
+
+    def _reader(self):
+        while self._running and self.cap.isOpened():
+            ret, image = self.cap.read()
+            if not ret:
+                time.sleep(0.005)
+                continue
+            arrived = time.monotonic()
+            with self._lock:
+                # Nobody picked up the previous frame: it is stale, drop it
+                if self._latest is not None and self._latest.frame_id > self._last_read_id:
+                    self.dropped += 1
+                self._frame_id += 1
+                self._latest = Frame(self._frame_id, arrived, image)
+                self._new_frame.notify_all()
+
+    def read(self):
+        """
+        Get the newest captured frame without blocking.
+
+        Returns:
+            The latest Frame, or None if nothing has been captured yet
+        """
+        with self._lock:
+            frame = self._latest
+            if frame is not None:
+                self._last_read_id = frame.frame_id
+        return frame
+
+    def next_frame(self, timeout=1.0):
+        """
+        Wait for a frame newer than the last one read.
+
+        Parameters:
+            timeout: Longest wait in seconds
+        Returns:
+            The new Frame, or None on timeout
+        """
+        with self._new_frame:
+            if not self._new_frame.wait_for(
+                    lambda: self._latest is not None and self._latest.frame_id > self._last_read_id,
+                    timeout):
+                return None
+            self._last_read_id = self._latest.frame_id
+            return self._latest
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        """Stop the capture thread and release the camera."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.cap.release()
+
+
+# Example usage (--probe measures capture latency instead of showing frames)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or probe the camera")
+    parser.add_argument('src', nargs='?', type=int, default=0)
+    parser.add_argument('--probe', action='store_true')
+    parser.add_argument('--frames', type=int, default=300)
+    args, _ = parser.parse_known_args()
+
+    if args.probe:
+        cap = cv2.VideoCapture(args.src)
+        print("Negotiated:", configure_capture(cap, **capture_options()))
+        for key, value in probe_latency(cap, args.frames).items():
+            print(f"  {key:16s} {value:.2f}" if isinstance(value, float) else f"  {key:16s} {value}")
+        cap.release()
+        raise SystemExit
+
+    stream = CameraStream(args.src, **capture_options()).start()
+    print("Negotiated:", stream.settings)
+    last_id = 0
+
+    while stream.isOpened():
+        frame = stream.read()
+        if frame is not None and frame.frame_id != last_id:
+            last_id = frame.frame_id
+            age_ms = (time.monotonic() - frame.timestamp) * 1000
+            cv2.putText(frame.image, f"#{frame.frame_id}  age {age_ms:.1f} ms  dropped {stream.dropped}",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.imshow('Camera Stream', frame.image)
+
+        if cv2.waitKey(1) & 0xFF == 27:  # ESC key
+            break
+
+    stream.release()
+    cv2.destroyAllWindows()
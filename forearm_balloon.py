@@ -1,21 +1,33 @@
 import pygame
 import cv2
-import mediapipe as mp
 import math
 import random
 import time
 import os
+from replay_source import frame_rate, open_camera, setup_headless
+from landmark_cache import open_landmark_cache
+from inference_worker import InferenceWorker
+from kinematics import grip_closure
+from camera_surface import CameraSurface
 
 class ForearmBalloonGame:
     def __init__(self):
+        setup_headless()
         pygame.init()
         self.setup_game()
-        self.hands = mp.solutions.hands.Hands(
+        # Hand tracking runs in a worker process so it never stalls rendering
+        self.hands = InferenceWorker(
+            'hands', roi=True,
             max_num_hands=1,
             min_detection_confidence=0.7,
             min_tracking_confidence=0.7
         )
-        self.cap = cv2.VideoCapture(0)
+        self.camera = open_camera(0)  # webcam, or the --replay recording
+        self.hands.cache = open_landmark_cache(self.camera, self.hands.backend, self.hands.model_kwargs,
+                                               roi=True)
+        self.last_frame_id = 0
+        self.last_result_id = 0
+        self.grip = 0.0  # 0 (open) - 100 (fist), tightest detected hand
         self.load_best_score()
         
     def setup_game(self):
@@ -27,6 +39,8 @@ class ForearmBalloonGame:
         
         self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
         pygame.display.set_caption("Forearm Balloon Game")
+        # Mirrored webcam feed, refreshed once per new camera frame
+        self.camera_view = CameraSurface((self.cam_width, self.cam_height), mirror=True)
         
         # Colors
         self.WHITE = (255, 255, 255)
@@ -74,17 +88,6 @@ class ForearmBalloonGame:
         with open('balloon_best_score.txt', 'w') as f:
             f.write(str(self.best_score))
     
-    def is_hand_closed(self, landmarks):
-        """Check if hand is closed based on finger tip positions"""
-        tip_ids = [8, 12, 16, 20]  # Finger tip landmarks (index to pinky)
-        folded_fingers = 0
-        
-        for tip in tip_ids:
-            if landmarks[tip].y > landmarks[tip - 2].y:  # Tip below PIP joint
-                folded_fingers += 1
-                
-        return folded_fingers >= 3  # At least 3 fingers folded
-    
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -99,31 +102,29 @@ class ForearmBalloonGame:
         return True
     
     def update(self):
-        if self.paused or not self.game_active or self.burst_animation:
+        # Grab the newest webcam frame once per tick; draw() shows this same frame
+        frame = self.camera.read()
+        if frame is None or frame.frame_id == self.last_frame_id:
             return
-            
-        # Process webcam frame
-        ret, frame = self.cap.read()
-        if not ret:
+        self.last_frame_id = frame.frame_id
+        # Grip closure doesn't care about mirroring, so only the display is flipped
+        self.camera_view.update(frame.image)
+        self.hands.submit(frame.frame_id, frame.image, frame.timestamp)
+
+        if self.paused or not self.game_active or self.burst_animation:
             return
             
-        frame = cv2.flip(frame, 1)
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(image)
-        
-        hand_closed = False
+        # Use the newest hand state the worker has published
+        results = self.hands.latest()
+        if results is not None and results.frame_id != self.last_result_id:
+            self.last_result_id = results.frame_id
+            height, width = frame.image.shape[:2]
+            grips = grip_closure(results.points, aspect=width / height)
+            self.grip = float(grips.max()) if len(grips) else 0.0
+        closed = self.grip / 100
         
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                if self.is_hand_closed(hand_landmarks.landmark):
-                    hand_closed = True
-                    break
-        
-        # Update balloon size based on hand state
-        if hand_closed:
-            self.balloon_radius += self.inflation_rate
-        else:
-            self.balloon_radius -= self.deflation_rate
+        # Inflate in proportion to the grip, deflate by what is left open
+        self.balloon_radius += self.inflation_rate * closed - self.deflation_rate * (1 - closed)
             
         # Keep balloon within bounds
         self.balloon_radius = max(self.min_radius, min(self.max_radius, self.balloon_radius))
@@ -141,14 +142,8 @@ class ForearmBalloonGame:
         self.screen.fill(self.BLACK)
         
         # Draw webcam feed
-        if self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                frame = cv2.flip(frame, 1)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frame = cv2.resize(frame, (self.cam_width, self.cam_height))
-                frame = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
-                self.screen.blit(frame, (self.game_width, 0))
+        if self.last_frame_id:
+            self.screen.blit(self.camera_view.surface, (self.game_width, 0))
         
         # Draw game area border
         pygame.draw.rect(self.screen, self.WHITE, (0, 0, self.game_width, self.game_height), 2)
@@ -173,6 +168,8 @@ class ForearmBalloonGame:
         best_text = self.font.render(f"Best: {self.best_score}", True, self.WHITE)
         self.screen.blit(score_text, (20, 20))
         self.screen.blit(best_text, (20, 50))
+        grip_text = self.font.render(f"Grip: {self.grip:.0f}%", True, self.WHITE)
+        self.screen.blit(grip_text, (20, 80))
         
         # Draw instructions
         instructions = self.font.render("Close hand to inflate, open to deflate", True, self.WHITE)
@@ -244,7 +241,8 @@ class ForearmBalloonGame:
         self.game_active = True
     
     def cleanup(self):
-        self.cap.release()
+        self.camera.release()
+        self.hands.close()
         pygame.quit()
         cv2.destroyAllWindows()
     
@@ -252,11 +250,11 @@ class ForearmBalloonGame:
         clock = pygame.time.Clock()
         running = True
         
-        while running:
+        while running and self.camera.isOpened():
             running = self.handle_events()
             self.update()
             self.draw()
-            clock.tick(60)
+            clock.tick(frame_rate(60))
         
         self.cleanup()
 
@@ -1,18 +1,18 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import pandas as pd
 import os
+from tracking_backends import HAND_CONNECTIONS, create_backend, draw_landmarks, selected_backend
 
 class ForearmTrainer:
     def __init__(self):
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
+        # Hand backend chosen with --hands-backend / HANDS_BACKEND
+        self.hands = create_backend(
+            selected_backend('hands'),
             max_num_hands=1,
             min_detection_confidence=0.7,
             min_tracking_confidence=0.7
         )
-        self.mp_drawing = mp.solutions.drawing_utils
         self.data = []
         self.labels = []
         self.label_names = {
@@ -26,11 +26,8 @@ class ForearmTrainer:
         self.cap = cv2.VideoCapture(0)
         
     def extract_features(self, landmarks):
-        """Convert hand landmarks to feature vector"""
-        features = []
-        for landmark in landmarks.landmark:
-            features.extend([landmark.x, landmark.y, landmark.z])
-        return np.array(features)
+        """Convert one hand's landmark array (21 x [x, y, z, conf]) to a feature vector"""
+        return landmarks[:, :3].reshape(-1)
     
     def collect_data(self, samples_per_label=20):
         print("\nForearm Trainer - Data Collection Mode")
@@ -49,15 +46,9 @@ class ForearmTrainer:
             if not ret:
                 continue
                 
-            frame = cv2.flip(frame, 1)
-            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.hands.process(image)
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            
-            if results.multi_hand_landmarks:
-                for hand_landmarks in results.multi_hand_landmarks:
-                    self.mp_drawing.draw_landmarks(
-                        image, hand_landmarks, self.mp_hands.HAND_CONNECTIONS)
+            image = cv2.flip(frame, 1)
+            hands = self.hands.process(image)
+            draw_landmarks(image, hands, HAND_CONNECTIONS)
             
             # Display instructions and status
             cv2.putText(image, f"Current label: {self.current_label}", (20, 40),
@@ -85,9 +76,8 @@ class ForearmTrainer:
                 label = (key - ord('0')) * 25
                 self.current_label = self.label_names[label]
                 
-                if results.multi_hand_landmarks:
-                    landmarks = results.multi_hand_landmarks[0]
-                    features = self.extract_features(landmarks)
+                if len(hands):
+                    features = self.extract_features(hands[0])
                     self.data.append(features)
                     self.labels.append(label)
                     print(f"Collected sample for {self.current_label}")
@@ -123,6 +113,7 @@ class ForearmTrainer:
         print("Starting Forearm Trainer...")
         self.collect_data()
         self.cap.release()
+        self.hands.close()
 
 if __name__ == "__main__":
     trainer = ForearmTrainer()
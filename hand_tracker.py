@@ -1,28 +1,42 @@
 import cv2
-import mediapipe as mp
 import numpy as np
+from landmark_roi import LandmarkROI
+import kinematics
+import tracking_backends
 
 class HandTracker:
     def __init__(self, static_image_mode=False, max_num_hands=2, 
-                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 use_roi=False, roi_margin=0.25, backend=None):
         """
-        Initialize the hand tracker with MediaPipe Hands.
+        Initialize the hand tracker with a hand tracking backend (MediaPipe
+        Hands unless --hands-backend / HANDS_BACKEND picks another).
         
         Parameters:
             static_image_mode: Whether to treat images as static or video frames
             max_num_hands: Maximum number of hands to detect
             min_detection_confidence: Minimum confidence for hand detection
             min_tracking_confidence: Minimum confidence for hand tracking
+            use_roi: Run inference on a crop around the previous frame's hands
+                     (full frame while no hand is tracked)
+            roi_margin: Border around the hand box in ROI mode, as a fraction
+                        of the box size
+            backend: Tracking backend name (see tracking_backends.BACKENDS;
+                     default: selected_backend('hands'))
         """
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
+        self.hands = tracking_backends.create_backend(
+            backend or tracking_backends.selected_backend('hands'),
             static_image_mode=static_image_mode,
             max_num_hands=max_num_hands,
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence
         )
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_drawing_styles = mp.solutions.drawing_styles
+        self.roi = LandmarkROI(margin=roi_margin) if use_roi else None
+
+        # Reusable buffers: landmarks of every hand, and their joint angles
+        self.landmarks = np.zeros((max_num_hands, 21, 3), np.float32)
+        self.joint_angles = kinematics.JointAngles(kinematics.HAND_JOINTS,
+                                                   max_instances=max_num_hands)
 
     @staticmethod
     def calculate_angle(a, b, c):
@@ -34,15 +48,7 @@ class HandTracker:
         Returns:
             Angle in degrees between vectors ba and bc
         """
-        a = np.array(a)
-        b = np.array(b)
-        c = np.array(c)
-        
-        radians = np.arccos(np.clip(
-            np.dot(a-b, c-b) / (np.linalg.norm(a-b) * np.linalg.norm(c-b)), 
-            -1.0, 1.0
-        ))
-        return np.degrees(radians)
+        return kinematics.calculate_angle(a, b, c)
 
     @staticmethod
     def calculate_distance(a, b):
@@ -56,102 +62,135 @@ class HandTracker:
         """
         return np.linalg.norm(np.array(a) - np.array(b))
 
-    def process_frame(self, frame, draw_landmarks=True):
+    def detect(self, frame):
+        """
+        Detect hand landmarks without producing an output image.
+        
+        Parameters:
+            frame: Input BGR image frame
+        Returns:
+            Array of shape (num_hands, 21, 4) holding normalized x, y, z and
+            a confidence, in full-frame coordinates; a view of the backend's
+            buffer, overwritten by the next call
+        """
+        # Run the backend on the BGR image (or the ROI around the last hands)
+        region = self.roi.crop(frame) if self.roi else frame
+        hands = self.hands.process(region)
+        
+        if self.roi:
+            # Landmarks back to full-frame coordinates; the crop isn't the whole frame
+            self.roi.map_points(hands)
+        return hands
+
+    def process_frame(self, frame, draw_landmarks=True, in_place=False):
         """
         Process a frame to detect hand landmarks.
         
         Parameters:
             frame: Input BGR image frame
             draw_landmarks: Whether to draw landmarks on output frame
+            in_place: Draw on frame itself instead of a copy
         Returns:
-            results: MediaPipe hands results
+            hands: Landmarks of every detected hand (see detect)
             output_frame: Frame with landmarks drawn (if requested)
         """
-        # Convert the BGR image to RGB
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image.flags.writeable = False
+        hands = self.detect(frame)
+        output_frame = frame if in_place else frame.copy()
         
-        # Process the image
-        results = self.hands.process(image)
+        # Draw hand landmarks if requested
+        if draw_landmarks and len(hands):
+            tracking_backends.draw_landmarks(output_frame, hands, tracking_backends.HAND_CONNECTIONS)
         
-        # Convert back to BGR for drawing
-        image.flags.writeable = True
-        output_frame = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        return hands, output_frame
+
+    def get_landmark_array(self, hands, frame_width=None, frame_height=None):
+        """
+        Get the landmarks of every detected hand as one array.
         
-        # Draw hand landmarks if requested
-        if draw_landmarks and results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                self.mp_drawing.draw_landmarks(
-                    output_frame,
-                    hand_landmarks,
-                    self.mp_hands.HAND_CONNECTIONS,
-                    self.mp_drawing_styles.get_default_hand_landmarks_style(),
-                    self.mp_drawing_styles.get_default_hand_connections_style()
-                )
+        The result is a view of a buffer owned by the tracker, filled in
+        place and overwritten by the next call; copy it to keep it.
         
-        return results, output_frame
+        Parameters:
+            hands: Landmarks from detect() or process_frame()
+            frame_width: Width of the frame (omit for normalized coordinates)
+            frame_height: Height of the frame (omit for normalized coordinates)
+        Returns:
+            float32 array of shape (num_hands, 21, 3) holding x, y, z, with
+            x and y in whole pixels clamped to the frame when a frame size
+            is given; num_hands is 0 if no hands were detected
+        """
+        count = min(len(hands), len(self.landmarks))
+        landmarks = self.landmarks[:count]
+        np.copyto(landmarks, hands[:count, :, :3])
+        if frame_width is not None:
+            xy = landmarks[..., :2]
+            np.multiply(xy, (frame_width, frame_height), out=xy)
+            np.trunc(xy, out=xy)
+            np.clip(xy, 0, (frame_width - 1, frame_height - 1), out=xy)
+        return landmarks
 
-    def get_landmark_positions(self, results, frame_width, frame_height):
+    def get_landmark_positions(self, hands, frame_width, frame_height):
         """
-        Get normalized landmark positions converted to pixel coordinates.
+        Get landmark positions in pixel coordinates as nested lists.
         
         Parameters:
-            results: MediaPipe hands results
+            hands: Landmarks from detect() or process_frame()
             frame_width: Width of the frame
             frame_height: Height of the frame
         Returns:
             List of lists containing landmark positions in pixel coordinates,
-            or None if no hands detected
+            or None if no hands detected (see get_landmark_array for the
+            allocation-free version)
         """
-        if not results.multi_hand_landmarks:
+        hands = self.get_landmark_array(hands, frame_width, frame_height)
+        if not len(hands):
             return None
-            
-        landmarks = []
-        for hand_landmarks in results.multi_hand_landmarks:
-            hand = []
-            for landmark in hand_landmarks.landmark:
-                x = min(int(landmark.x * frame_width), frame_width - 1)
-                y = min(int(landmark.y * frame_height), frame_height - 1)
-                z = landmark.z
-                hand.append([x, y, z])
-            landmarks.append(hand)
-            
-        return landmarks
+        return [[[int(x), int(y), float(z)] for x, y, z in hand] for hand in hands]
+
+    def get_joint_angles(self, hands):
+        """
+        Get the wrist, thumb and finger PIP/DIP angles of every hand.
+        
+        Parameters:
+            hands: Array of shape (num_hands, 21, 3), e.g. from get_landmark_array
+        Returns:
+            Array of shape (num_hands, joints) in degrees; columns are named
+            by self.joint_angles.index (e.g. 'index_pip')
+        """
+        return self.joint_angles.compute(hands)
+
+    def get_grip_closure(self, hands, aspect=1.0):
+        """
+        Get how far every hand is closed (see kinematics.grip_closure).
+        
+        Parameters:
+            hands: Array of shape (num_hands, 21, 3), e.g. from get_landmark_array
+            aspect: Frame width / height when hands are normalized (1 for pixels)
+        Returns:
+            Array of shape (num_hands,) from 0 (open) to 100 (fist)
+        """
+        return kinematics.grip_closure(hands, aspect=aspect)
 
     def is_hand_closed(self, landmarks, threshold=0.8):
         """
         Detect if hand is closed based on finger tip distances to palm.
         
         Parameters:
-            landmarks: List of landmark positions
+            landmarks: Landmarks of one hand, (21, 3) array or list
             threshold: Ratio of fingers that need to be closed (0-1)
         Returns:
             True if hand is considered closed, False otherwise
         """
-        if not landmarks or len(landmarks) < 21:
+        if landmarks is None or len(landmarks) < 21:
             return False
-            
-        # Palm base (wrist)
-        palm_base = landmarks[0]
-        
-        # Finger tips (index, middle, ring, pinky)
-        tips = [landmarks[i] for i in [8, 12, 16, 20]]
-        
-        # Calculate distances from tips to palm base
-        distances = [self.calculate_distance(tip, palm_base) for tip in tips]
-        
-        # Reference distance (length from wrist to middle finger base)
-        ref_distance = self.calculate_distance(
-            landmarks[0], landmarks[9]  # Wrist to middle finger MCP
-        )
-        
-        # Normalize distances
-        normalized = [d / ref_distance for d in distances]
+        landmarks = np.asarray(landmarks)
         
-        # Count how many fingers are closed (normalized distance < 1.0)
-        closed_fingers = sum(1 for d in normalized if d < 1.0)
+        # A finger is closed when its tip is nearer the wrist than the
+        # middle finger MCP is (every coordinate given, as always)
+        ratios = kinematics.grip_ratios(landmarks[None], dims=landmarks.shape[-1])[0]
+        closed_fingers = np.count_nonzero(ratios < kinematics.GRIP_CLOSED_RATIO)
         
-        return closed_fingers >= threshold * len(tips)
+        return closed_fingers >= threshold * len(kinematics.GRIP_TIPS)
 
     def release(self):
         """Release resources."""
@@ -159,7 +198,7 @@ class HandTracker:
 
 # Example usage
 if __name__ == "__main__":
-    tracker = HandTracker()
+    tracker = HandTracker(use_roi=True)
     cap = cv2.VideoCapture(0)
     
     while cap.isOpened():
@@ -168,12 +207,12 @@ if __name__ == "__main__":
             break
             
         frame = cv2.flip(frame, 1)
-        results, output_frame = tracker.process_frame(frame)
+        hands, output_frame = tracker.process_frame(frame, in_place=True)
         
-        if results.multi_hand_landmarks:
-            landmarks = tracker.get_landmark_positions(results, frame.shape[1], frame.shape[0])
+        if len(hands):
+            landmarks = tracker.get_landmark_array(hands, frame.shape[1], frame.shape[0])
             
-            if landmarks:
+            if len(landmarks):
                 # Example: Calculate angle between index, wrist, and pinky
                 angle = tracker.calculate_angle(
                     landmarks[0][8],  # Index tip
@@ -184,7 +223,10 @@ if __name__ == "__main__":
                 cv2.putText(output_frame, f"Angle: {angle:.1f}°", (10, 30),
                             cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 
-                # Check if hand is closed
+                # Grip closure of every hand, and whether the first is closed
+                grip = tracker.get_grip_closure(landmarks)
+                cv2.putText(output_frame, f"Grip: {grip[0]:.0f}%", (10, 110),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
                 if tracker.is_hand_closed(landmarks[0]):
                     cv2.putText(output_frame, "HAND CLOSED", (10, 70),
                                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
@@ -0,0 +1,270 @@
+import multiprocessing as mp
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from landmark_roi import LandmarkROI
+from replay_source import replay_options
+from tracking_backends import backend_kind, create_backend, selected_backend
+
+# Landmarks published by the worker. points has shape (count, K, 4) holding
+# normalized x, y, z and a per-landmark confidence; timestamp is
+# time.monotonic() when inference finished and frame_time the capture time
+# passed to submit().
+Landmarks = namedtuple('Landmarks', ['frame_id', 'timestamp', 'points', 'frame_time'])
+
+# Slots in the shared control array
+_LATEST_SEQ = 0     # frame id of the newest submitted frame
+_LATEST_SLOT = 1    # ring slot holding that frame
+_READING_SLOT = 2   # ring slot the worker is copying out of (-1 = none)
+_RESULT_SEQ = 3     # frame id the published landmarks came from
+_RESULT_COUNT = 4   # number of detected poses / hands
+_RESULT_TIME = 5    # monotonic time the landmarks were published
+_LATEST_TIME = 6    # capture time of the newest submitted frame
+_RESULT_FRAME_TIME = 7  # capture time of the frame the landmarks came from
+_CTRL_SIZE = 8
+
+_LANDMARK_COUNT = {'pose': 33, 'hands': 21}
+
+
+def _worker_main(kind, backend_name, model_kwargs, use_roi, frame_shape, slots, max_instances,
+                 frames_name, results_name, ctrl, lock, new_frame, published, stop):
+    frames_shm = shared_memory.SharedMemory(name=frames_name)
+    results_shm = shared_memory.SharedMemory(name=results_name)
+    frames = np.ndarray((slots,) + frame_shape, np.uint8, buffer=frames_shm.buf)
+    results = np.ndarray((max_instances, _LANDMARK_COUNT[kind], 4), np.float32,
+                         buffer=results_shm.buf)
+    backend = create_backend(backend_name, **model_kwargs)
+    roi = LandmarkROI() if use_roi else None
+    # Pose landmarks carry a visibility; off-screen guesses shouldn't steer the crop
+    roi_confidence = 0.5 if kind == 'pose' else None
+    image = np.empty(frame_shape, np.uint8)
+    last_seq = 0
+
+    try:
+        while not stop.is_set():
+            if not new_frame.wait(0.1):
+                continue
+            with lock:
+                new_frame.clear()
+                seq = int(ctrl[_LATEST_SEQ])
+                slot = int(ctrl[_LATEST_SLOT])
+                frame_time = ctrl[_LATEST_TIME]
+                if seq == last_seq:
+                    continue
+                ctrl[_READING_SLOT] = slot
+
+            # Copy out (the crop, with ROI) and free the slot right away
+            if roi is None:
+                np.copyto(image, frames[slot])
+                region = image
+            else:
+                crop = roi.crop(frames[slot])
+                region = image[:crop.shape[0], :crop.shape[1]]
+                np.copyto(region, crop)
+            with lock:
+                ctrl[_READING_SLOT] = -1
+            last_seq = seq
+
+            points = backend.process(region)[:max_instances]
+            if roi is not None:
+                roi.map_points(points, roi_confidence)
+            with lock:
+                results[:len(points)] = points
+                ctrl[_RESULT_SEQ] = seq
+                ctrl[_RESULT_COUNT] = len(points)
+                ctrl[_RESULT_TIME] = time.monotonic()
+                ctrl[_RESULT_FRAME_TIME] = frame_time
+            published.set()
+    finally:
+        backend.close()
+        del frames, results
+        frames_shm.close()
+        results_shm.close()
+
+
+class InferenceWorker:
+    def __init__(self, kind='pose', slots=3, roi=False, backend=None, cache=None, wait=None,
+                 **model_kwargs):
+        """
+        Run a pose or hand tracking backend in a separate process.
+
+        Frames go to the worker through a shared-memory ring and landmarks
+        come back through a second shared block. Neither submit() nor
+        latest() waits for inference: a frame submitted while the worker is
+        busy replaces the previous pending one, so the worker always picks
+        up the newest frame. Replays instead wait in submit() for each
+        frame's landmarks: otherwise a fast replay outruns the worker and
+        which frames get tracked depends on timing.
+
+        The worker is spawned, and a spawned process imports the main
+        script before it starts: scripts that use a worker keep their
+        window, camera and device setup under `if __name__ == "__main__":`.
+
+        Parameters:
+            kind: 'pose' or 'hands'
+            slots: Frames in the ring (at least 3: one being read, one
+                   pending, one being written)
+            roi: Crop each frame around the previous landmarks before
+                 inference (see LandmarkROI)
+            backend: Tracking backend name (see tracking_backends.BACKENDS);
+                     defaults to the one selected by flag / environment
+            cache: LandmarkCache of a replayed recording: cached frames are
+                   answered without inference, new results are recorded
+                   (frame ids must be the recording's)
+            wait: Make submit() return only once the frame's landmarks are
+                  published (and recorded in the cache), so every submitted
+                  frame is tracked; default: during a --replay
+            model_kwargs: Passed to the backend (e.g. min_detection_confidence)
+        """
+        if kind not in _LANDMARK_COUNT:
+            raise ValueError(f"Unknown model kind: {kind}")
+        if backend is None:
+            backend = selected_backend(kind)
+        if backend_kind(backend) != kind:
+            raise ValueError(f"Tracking backend {backend} doesn't track {kind}")
+        self.kind = kind
+        self.backend = backend
+        self.cache = cache
+        self.wait = bool(replay_options().replay) if wait is None else wait
+        self._cached = None         # Landmarks answered from the cache
+        self._recorded_seq = 0      # last result put into the cache
+        self.slots = max(3, slots)
+        self.roi = roi
+        self.model_kwargs = model_kwargs
+        self.max_instances = model_kwargs.get('max_num_hands', 2) if kind == 'hands' else 1
+
+        self._ctx = mp.get_context('spawn')
+        self._process = None
+        self._frames_shm = None
+        self._results_shm = None
+        self._frames = None
+        self._results = None
+        self.frame_shape = None
+
+    def _start(self, frame_shape):
+        self.frame_shape = frame_shape
+        frame_bytes = int(np.prod(frame_shape))
+        result_shape = (self.max_instances, _LANDMARK_COUNT[self.kind], 4)
+
+        self._frames_shm = shared_memory.SharedMemory(create=True, size=self.slots * frame_bytes)
+        self._results_shm = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(result_shape)) * 4)
+        self._frames = np.ndarray((self.slots,) + frame_shape, np.uint8,
+                                  buffer=self._frames_shm.buf)
+        self._results = np.ndarray(result_shape, np.float32, buffer=self._results_shm.buf)
+
+        self._ctrl = self._ctx.Array('d', _CTRL_SIZE, lock=False)
+        self._ctrl[_LATEST_SLOT] = -1
+        self._ctrl[_READING_SLOT] = -1
+        self._lock = self._ctx.Lock()
+        self._new_frame = self._ctx.Event()
+        self._published = self._ctx.Event()
+        self._stop = self._ctx.Event()
+
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.kind, self.backend, self.model_kwargs, self.roi, frame_shape, self.slots, self.max_instances,
+                  self._frames_shm.name, self._results_shm.name, self._ctrl,
+                  self._lock, self._new_frame, self._published, self._stop),
+            daemon=True
+        )
+        self._process.start()
+
+    def submit(self, frame_id, frame, frame_time=None):
+        """
+        Hand a BGR frame to the worker without waiting for inference
+        (unless wait is set: then return once its landmarks are published).
+
+        Parameters:
+            frame_id: Increasing id of the frame (e.g. Frame.frame_id)
+            frame: BGR image; every frame must have the same shape
+            frame_time: Capture time (e.g. Frame.timestamp), returned with
+                        the landmarks; defaults to now
+        """
+        if frame_time is None:
+            frame_time = time.monotonic()
+        if self.cache is not None:
+            points = self.cache.get(frame_id)
+            if points is not None:
+                self._cached = Landmarks(frame_id, time.monotonic(), points.copy(), frame_time)
+                return
+        if self._process is None:
+            self._start(frame.shape)
+
+        # Write into a slot the worker is neither reading nor about to read
+        with self._lock:
+            busy = (int(self._ctrl[_READING_SLOT]), int(self._ctrl[_LATEST_SLOT]))
+        slot = next(i for i in range(self.slots) if i not in busy)
+        self._frames[slot] = frame
+
+        with self._lock:
+            self._ctrl[_LATEST_SLOT] = slot
+            self._ctrl[_LATEST_SEQ] = frame_id
+            self._ctrl[_LATEST_TIME] = frame_time
+        self._published.clear()
+        self._new_frame.set()
+        if self.wait:
+            self._wait_published(frame_id)
+
+    def _wait_published(self, frame_id):
+        # Hold the caller until the worker has answered this frame, then
+        # record it, so no frame's landmarks are skipped
+        while self._process.is_alive():
+            if self._published.wait(0.1):
+                self._published.clear()
+            with self._lock:
+                if int(self._ctrl[_RESULT_SEQ]) == frame_id:
+                    break
+        self._read_result()
+
+    def _read_result(self):
+        # Published landmarks (None before the first), put into the cache
+        # the first time they are seen
+        with self._lock:
+            seq = int(self._ctrl[_RESULT_SEQ])
+            if seq == 0:
+                return None
+            count = int(self._ctrl[_RESULT_COUNT])
+            points = self._results[:count].copy()
+            stamp = self._ctrl[_RESULT_TIME]
+            frame_time = self._ctrl[_RESULT_FRAME_TIME]
+        if self.cache is not None and seq != self._recorded_seq:
+            self._recorded_seq = seq
+            self.cache.put(seq, points)
+        return Landmarks(seq, stamp, points, frame_time)
+
+    def latest(self):
+        """
+        Get the most recently published landmarks.
+
+        Returns:
+            Landmarks, or None before the first inference finished
+        """
+        cached = self._cached
+        if self._process is None:
+            return cached
+        result = self._read_result()
+        if result is None or (cached is not None and cached.frame_id > result.frame_id):
+            return cached
+        return result
+
+    def close(self):
+        """Stop the worker process, free the shared memory and save the cache."""
+        if self.cache is not None:
+            self.cache.save()
+        if self._process is None:
+            return
+        self._stop.set()
+        self._process.join(timeout=2.0)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+        self._frames = None
+        self._results = None
+        for shm in (self._frames_shm, self._results_shm):
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,235 @@
+import math
+
+import numpy as np
+
+# Joint triplets (a, vertex, c): the angle is measured at the vertex between
+# the vectors vertex->a and vertex->c. Indices are MediaPipe landmark ids.
+POSE_JOINTS = {
+    'left_elbow':  (11, 13, 15),   # shoulder, elbow, wrist
+    'right_elbow': (12, 14, 16),
+    'left_wrist':  (13, 15, 19),   # elbow, wrist, index knuckle
+    'right_wrist': (14, 16, 20),
+}
+
+HAND_JOINTS = {
+    'wrist':      (5, 0, 17),      # index MCP, wrist, pinky MCP
+    'thumb_mcp':  (1, 2, 3),
+    'thumb_ip':   (2, 3, 4),
+    'index_pip':  (5, 6, 7),
+    'index_dip':  (6, 7, 8),
+    'middle_pip': (9, 10, 11),
+    'middle_dip': (10, 11, 12),
+    'ring_pip':   (13, 14, 15),
+    'ring_dip':   (14, 15, 16),
+    'pinky_pip':  (17, 18, 19),
+    'pinky_dip':  (18, 19, 20),
+}
+
+# Grip closure: finger tips (index, middle, ring, pinky) and their distance to
+# the wrist in units of the wrist -> middle MCP length. An open, spread hand
+# sits near GRIP_OPEN_RATIO; a fist brings every tip back within one palm
+# length (GRIP_CLOSED_RATIO).
+GRIP_TIPS = np.array([8, 12, 16, 20], dtype=np.intp)
+GRIP_OPEN_RATIO = np.array([1.9, 2.0, 1.85, 1.6], dtype=np.float32)
+GRIP_CLOSED_RATIO = 1.0
+
+
+class JointAngles:
+    def __init__(self, joints, max_instances=2, dims=3, dtype=np.float32):
+        """
+        Compute every joint angle of a landmark array in one vectorized call.
+
+        All scratch arrays are allocated here, so compute() does not allocate
+        per call (unless more instances than max_instances show up, in which
+        case the buffers grow once).
+
+        Parameters:
+            joints: Dict of name -> (a, vertex, c) landmark indices,
+                    e.g. POSE_JOINTS or HAND_JOINTS
+            max_instances: Poses / hands expected per frame
+            dims: Coordinates to use (2 for image-plane x, y; 3 adds z)
+            dtype: Landmark dtype; other dtypes are converted on each call
+        """
+        self.names = list(joints)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        triplets = np.array([joints[name] for name in self.names], dtype=np.intp)
+        self._a, self._b, self._c = (np.ascontiguousarray(col) for col in triplets.T)
+        self.dims = dims
+        self.dtype = np.dtype(dtype)
+        self._allocate(max_instances)
+
+    def _allocate(self, instances):
+        joints = len(self.names)
+        self._pa = np.empty((instances, joints, self.dims), self.dtype)
+        self._pb = np.empty_like(self._pa)
+        self._pc = np.empty_like(self._pa)
+        self._dot = np.empty((instances, joints), self.dtype)
+        self._norm = np.empty_like(self._dot)
+        self._tmp = np.empty_like(self._dot)
+        self.angles = np.empty_like(self._dot)
+
+    def compute(self, landmarks):
+        """
+        Get all joint angles in degrees.
+
+        Parameters:
+            landmarks: Array of shape (N, K, C) with C >= dims, x/y/(z) first
+        Returns:
+            (N, joints) view of an internal buffer, overwritten by the next
+            call; column order follows self.names / self.index
+        """
+        n = len(landmarks)
+        if n > len(self.angles):
+            self._allocate(n)
+        points = np.asarray(landmarks, self.dtype)[..., :self.dims]
+        pa, pb, pc = self._pa[:n], self._pb[:n], self._pc[:n]
+        dot, norm, tmp, angles = self._dot[:n], self._norm[:n], self._tmp[:n], self.angles[:n]
+
+        np.take(points, self._a, axis=1, out=pa, mode='clip')
+        np.take(points, self._b, axis=1, out=pb, mode='clip')
+        np.take(points, self._c, axis=1, out=pc, mode='clip')
+        np.subtract(pa, pb, out=pa)   # vertex -> a
+        np.subtract(pc, pb, out=pc)   # vertex -> c
+
+        np.einsum('njd,njd->nj', pa, pc, out=dot)
+        np.einsum('njd,njd->nj', pa, pa, out=norm)
+        np.einsum('njd,njd->nj', pc, pc, out=tmp)
+        np.multiply(norm, tmp, out=norm)
+        np.sqrt(norm, out=norm)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            np.divide(dot, norm, out=angles)
+        np.clip(angles, -1.0, 1.0, out=angles)
+        np.arccos(angles, out=angles)
+        np.degrees(angles, out=angles)
+        return angles
+
+
+def grip_ratios(hands, dims=2, aspect=1.0):
+    """
+    Get every finger tip's distance to the wrist in units of the hand's
+    wrist-to-middle-MCP length (GRIP_TIPS order), which doesn't depend on
+    how far the hand is from the camera.
+
+    Normalized landmarks measure x in frame widths and y in frame heights,
+    so x is scaled by aspect to put both in frame heights; z is on yet
+    another scale, which is why dims defaults to 2.
+
+    Parameters:
+        hands: Array of shape (N, 21, C) with C >= dims, x/y/(z) first
+        dims: Coordinates to use (2 for image-plane x, y; 3 adds z)
+        aspect: Frame width / height for normalized landmarks (1 for pixels)
+    Returns:
+        float32 array of shape (N, 4)
+    """
+    hands = np.asarray(hands, np.float32)[..., :dims]
+    wrist = hands[:, 0]
+    tips = hands[:, GRIP_TIPS] - wrist[:, None]
+    palm = hands[:, 9] - wrist
+    if aspect != 1.0:
+        tips[..., 0] *= aspect
+        palm[:, 0] *= aspect
+
+    ratio = np.einsum('nfd,nfd->nf', tips, tips)
+    palm_sq = np.einsum('nd,nd->n', palm, palm)
+    np.maximum(palm_sq, 1e-12, out=palm_sq)   # no division by zero
+    np.divide(ratio, palm_sq[:, None], out=ratio)
+    return np.sqrt(ratio, out=ratio)
+
+
+def grip_closure(hands, dims=2, aspect=1.0):
+    """
+    Get how far every hand is closed, from 0 (open) to 100 (fist): each
+    finger's grip_ratios() value is placed between GRIP_OPEN_RATIO and
+    GRIP_CLOSED_RATIO and the four finger scores are averaged.
+
+    Parameters:
+        hands: Array of shape (N, 21, C) with C >= dims, x/y/(z) first
+        dims: Coordinates to use (2 for image-plane x, y; 3 adds z)
+        aspect: Frame width / height for normalized landmarks (1 for pixels)
+    Returns:
+        float32 array of shape (N,) with the closure percentage per hand
+    """
+    closure = GRIP_OPEN_RATIO - grip_ratios(hands, dims, aspect)
+    closure /= GRIP_OPEN_RATIO - GRIP_CLOSED_RATIO
+    np.clip(closure, 0.0, 1.0, out=closure)
+    return closure.mean(axis=1) * 100
+
+
+def landmarks_to_array(landmark_lists, out):
+    """
+    Copy MediaPipe landmark lists into a preallocated array.
+
+    Parameters:
+        landmark_lists: Sequence of NormalizedLandmarkList (None entries skipped)
+        out: Array of shape (max_instances, K, 3 or 4) receiving x, y, z
+             (and visibility when there is a fourth column)
+    Returns:
+        View out[:n] holding the n copied lists
+    """
+    n = 0
+    with_visibility = out.shape[-1] > 3
+    for landmark_list in landmark_lists or ():
+        if landmark_list is None or n >= len(out):
+            continue
+        row = out[n]
+        for i, lm in enumerate(landmark_list.landmark):
+            row[i, 0] = lm.x
+            row[i, 1] = lm.y
+            row[i, 2] = lm.z
+            if with_visibility:
+                row[i, 3] = lm.visibility
+        n += 1
+    return out[:n]
+
+
+def calculate_angle(a, b, c):
+    """
+    Angle at b (in degrees) between vectors b->a and b->c for a single joint.
+
+    Parameters:
+        a, b, c: Points as [x,y] or [x,y,z] coordinates
+    Returns:
+        Angle in degrees
+    """
+    ba = [p - q for p, q in zip(a, b)]
+    bc = [p - q for p, q in zip(c, b)]
+    norm = math.hypot(*ba) * math.hypot(*bc)
+    if norm == 0:
+        return float('nan')
+    cos = sum(p * q for p, q in zip(ba, bc)) / norm
+    return math.degrees(math.acos(max(-1.0, min(1.0, cos))))
+
+
+# Micro-benchmark against the per-joint function the scripts used to copy
+if __name__ == "__main__":
+    import timeit
+
+    def legacy_calculate_angle(a, b, c):
+        a, b, c = np.array(a), np.array(b), np.array(c)
+        radians = np.arccos(np.clip(np.dot(a-b, c-b)/(np.linalg.norm(a-b)*np.linalg.norm(c-b)), -1, 1))
+        return np.degrees(radians)
+
+    rng = np.random.default_rng(0)
+    for title, joints, count, instances in (('Pose', POSE_JOINTS, 33, 1),
+                                            ('Hands', HAND_JOINTS, 21, 2)):
+        landmarks = rng.random((instances, count, 3), np.float32)
+        lists = landmarks.tolist()
+        triplets = list(joints.values())
+        angles = JointAngles(joints, max_instances=instances)
+
+        expected = [[legacy_calculate_angle(hand[a], hand[b], hand[c]) for a, b, c in triplets]
+                    for hand in lists]
+        assert np.allclose(angles.compute(landmarks), expected, atol=1e-3)
+
+        def legacy():
+            for hand in lists:
+                for a, b, c in triplets:
+                    legacy_calculate_angle(hand[a], hand[b], hand[c])
+
+        runs = 2000
+        legacy_us = timeit.timeit(legacy, number=runs) / runs * 1e6
+        vector_us = timeit.timeit(lambda: angles.compute(landmarks), number=runs) / runs * 1e6
+        print(f"{title}: {instances} x {len(triplets)} joints  "
+              f"legacy {legacy_us:8.1f} us  vectorized {vector_us:6.1f} us  "
+              f"({legacy_us / vector_us:.1f}x)")
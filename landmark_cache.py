@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from replay_source import ReplaySource, replay_options
+
+CACHE_VERSION = 1
+
+
+def content_hash(path):
+    """
+    SHA-256 of a video file, or of every image (name and content) in an
+    image-sequence directory.
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name)))
+    else:
+        files = [None]
+    for name in files:
+        if name is not None:
+            digest.update(name.encode())
+        with open(path if name is None else os.path.join(path, name), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LandmarkCache:
+    def __init__(self, source_path, backend, settings=None, roi=False, mirrored=False,
+                 cache_dir=None):
+        """
+        Per-frame landmark arrays of one recording, stored in a compressed
+        .npz next to it and reused by later replays instead of inference.
+
+        The file name is derived from the recording's content hash, the
+        backend name, its settings and how frames were fed to it, so
+        changing any of them starts a separate cache.
+
+        Parameters:
+            source_path: Video file or image directory being replayed
+            backend: Tracking backend name (see tracking_backends.BACKENDS)
+            settings: Backend settings (e.g. min_detection_confidence)
+            roi: Whether inference ran on ROI crops
+            mirrored: Whether frames were flipped horizontally first
+            cache_dir: Where to keep the file (default: .landmark_cache
+                       beside the recording)
+        """
+        key = json.dumps({'version': CACHE_VERSION, 'source': content_hash(source_path),
+                          'backend': backend, 'settings': settings or {},
+                          'roi': bool(roi), 'mirrored': bool(mirrored)},
+                         sort_keys=True, default=str)
+        self.key = hashlib.sha256(key.encode()).hexdigest()[:32]
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(source_path)), '.landmark_cache')
+        self.path = os.path.join(cache_dir, f'{self.key}.npz')
+
+        self._points = None      # (frames, instances, K, 4) loaded from disk
+        self._counts = None      # (frames,) instances per frame, -1 = not cached
+        self._new = {}           # frame_id -> points recorded this run
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self._points = data['points']
+                self._counts = data['counts']
+
+    def __len__(self):
+        stored = 0 if self._counts is None else int(np.count_nonzero(self._counts >= 0))
+        return stored + len(self._new)
+
+    def get(self, frame_id):
+        """
+        Get the cached landmarks of a frame.
+
+        Parameters:
+            frame_id: Frame number in the recording (Frame.frame_id, from 1)
+        Returns:
+            (N, K, 4) array (a view into the cache; copy before modifying),
+            or None if the frame isn't cached
+        """
+        points = self._new.get(frame_id)
+        if points is None and self._counts is not None and 0 < frame_id <= len(self._counts):
+            count = self._counts[frame_id - 1]
+            if count >= 0:
+                points = self._points[frame_id - 1, :count]
+        if points is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return points
+
+    def put(self, frame_id, points):
+        """Record the landmarks inference produced for a frame (copied)."""
+        self._new[frame_id] = np.array(points, np.float32)
+
+    def save(self):
+        """Merge this run's landmarks into the cache file (no-op if nothing is new)."""
+        if not self._new:
+            return
+        shapes = [p.shape for p in self._new.values()]
+        if self._points is not None:
+            shapes.append(self._points.shape[1:])
+        frames = max(max(self._new), 0 if self._counts is None else len(self._counts))
+        instances = max(shape[0] for shape in shapes)
+        landmarks = max(shape[1] for shape in shapes)
+
+        points = np.zeros((frames, instances, landmarks, 4), np.float32)
+        counts = np.full(frames, -1, np.int16)
+        if self._counts is not None:
+            stored = self._points.shape
+            points[:len(self._counts), :stored[1], :stored[2]] = self._points
+            counts[:len(self._counts)] = self._counts
+        for frame_id, frame_points in self._new.items():
+            points[frame_id - 1, :len(frame_points)] = frame_points
+            counts[frame_id - 1] = len(frame_points)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path[:-len('.npz')] + '.tmp.npz'
+        np.savez_compressed(temp_path, points=points, counts=counts)
+        os.replace(temp_path, self.path)
+        self._points, self._counts, self._new = points, counts, {}
+
+
+def open_landmark_cache(source, backend, settings=None, roi=False, mirrored=False):
+    """
+    Get the landmark cache for a replay.
+
+    Parameters:
+        source: Frame source from replay_source.open_camera()
+        backend, settings, roi, mirrored: As for LandmarkCache
+    Returns:
+        LandmarkCache, or None for a live camera or with --no-landmark-cache
+    """
+    if not isinstance(source, ReplaySource) or replay_options().no_landmark_cache:
+        return None
+    cache = LandmarkCache(source.path, backend, settings, roi, mirrored)
+    print(f"[Cache] {len(cache)} frames of landmarks in {cache.path}")
+    return cache
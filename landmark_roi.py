@@ -0,0 +1,126 @@
+import numpy as np
+
+
+class LandmarkROI:
+    def __init__(self, margin=0.25, min_size=0.2):
+        """
+        Crop frames around the previous frame's landmarks before inference.
+
+        Typical use per frame:
+            crop = roi.crop(frame)
+            ... run the model on crop ...
+            roi.map_points(points)   # or roi.map_landmarks(...)
+
+        The mapping step converts crop-normalized landmarks back to
+        full-frame normalized coordinates and moves the crop window for the
+        next frame. When nothing is tracked the next crop is the full frame.
+
+        Parameters:
+            margin: Border added around the landmark box, as a fraction of
+                    its larger side
+            min_size: Smallest crop side as a fraction of the shorter frame side
+        """
+        self.margin = margin
+        self.min_size = min_size
+        self.box = None          # (x0, y0, x1, y1) in pixels for the next crop
+        self._window = None      # (x0, y0, w, h) of the last crop
+        self._shape = None       # (height, width) of the last full frame
+
+    def reset(self):
+        """Drop the tracked box so the next crop is the full frame."""
+        self.box = None
+
+    def crop(self, frame):
+        """
+        Get the region to run inference on.
+
+        Parameters:
+            frame: Full image (H x W x C)
+        Returns:
+            A view into frame covering the tracked box, or frame itself
+            when nothing is being tracked
+        """
+        height, width = frame.shape[:2]
+        self._shape = (height, width)
+        if self.box is None:
+            self._window = (0, 0, width, height)
+            return frame
+        x0, y0, x1, y1 = self.box
+        self._window = (x0, y0, x1 - x0, y1 - y0)
+        return frame[y0:y1, x0:x1]
+
+    def map_points(self, points, min_confidence=None):
+        """
+        Map crop-normalized landmarks to full-frame coordinates, in place.
+
+        Parameters:
+            points: Array of shape (N, K, C), C >= 3 holding normalized
+                    x, y, z and optionally a confidence in column 3
+            min_confidence: Ignore landmarks below this confidence when
+                            placing the next crop (None uses all of them)
+        Returns:
+            points, now relative to the full frame
+        """
+        if len(points) == 0:
+            self.reset()
+            return points
+
+        x0, y0, w, h = self._window
+        height, width = self._shape
+        points[..., 0] = (points[..., 0] * w + x0) / width
+        points[..., 1] = (points[..., 1] * h + y0) / height
+        points[..., 2] *= w / width  # z shares the x scale
+
+        xy = points[..., :2].reshape(-1, 2)
+        if min_confidence is not None and points.shape[-1] > 3:
+            xy = xy[points[..., 3].reshape(-1) >= min_confidence]
+        self._track(xy)
+        return points
+
+    def map_landmarks(self, landmark_lists, min_confidence=None):
+        """
+        Same as map_points for MediaPipe NormalizedLandmarkList objects.
+
+        Parameters:
+            landmark_lists: Sequence of landmark lists (e.g.
+                            results.multi_hand_landmarks or
+                            [results.pose_landmarks]); updated in place
+            min_confidence: Minimum landmark visibility used for the next crop
+        """
+        landmark_lists = [l for l in (landmark_lists or []) if l is not None]
+        points = np.array([[[lm.x, lm.y, lm.z, lm.visibility] for lm in l.landmark]
+                           for l in landmark_lists], np.float32)
+        self.map_points(points, min_confidence)
+        for landmark_list, mapped in zip(landmark_lists, points):
+            for lm, (x, y, z, _) in zip(landmark_list.landmark, mapped):
+                lm.x, lm.y, lm.z = float(x), float(y), float(z)
+
+    def _track(self, xy):
+        if len(xy) == 0:
+            self.reset()
+            return
+
+        height, width = self._shape
+        lx0, ly0 = np.clip(xy.min(axis=0) * (width, height), 0, (width, height))
+        lx1, ly1 = np.clip(xy.max(axis=0) * (width, height), 0, (width, height))
+        side = max(lx1 - lx0, ly1 - ly0)
+        half = max(side / 2 + self.margin * side, self.min_size * min(width, height) / 2)
+
+        # Keep the current window while the landmarks stay well inside it and
+        # it isn't much too large, so the crop (and the model's own tracking)
+        # doesn't jitter every frame
+        if self.box is not None:
+            bx0, by0, bx1, by1 = self.box
+            inset = self.margin / 2 * side
+            if (bx0 + inset <= lx0 and lx1 <= bx1 - inset and
+                    by0 + inset <= ly0 and ly1 <= by1 - inset and
+                    max(bx1 - bx0, by1 - by0) <= 4 * half):
+                return
+
+        cx, cy = (lx0 + lx1) / 2, (ly0 + ly1) / 2
+        x0, x1 = int(max(0, cx - half)), int(min(width, cx + half))
+        y0, y1 = int(max(0, cy - half)), int(min(height, cy + half))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            self.reset()
+            return
+        self.box = (x0, y0, x1, y1)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import time
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+# Points in the assist loop a frame is timestamped at, in order
+STAGES = ('capture', 'inference', 'decision', 'serial_write', 'ack')
+
+
+class LatencyTrace:
+    def __init__(self, window=500, open_traces=16):
+        """
+        Per-stage latency of the capture -> inference -> decision ->
+        serial write -> firmware ack chain.
+
+        Every camera frame gets a trace started with begin() at its capture
+        time; the later stages are stamped with mark() as they happen. When
+        a trace is finished (pushed out by newer frames or by flush()), each
+        marked stage adds two samples: the time since the stage before it in
+        the chain ('decision' = inference -> decision), if that one was
+        marked too, and the time since capture ('capture->decision', the
+        glass-to-stage latency). A decision on a frame that had no inference
+        thus only counts towards 'capture->decision'. The newest `window`
+        samples of each are kept for the percentiles.
+
+        All times are time.monotonic(), like Frame.timestamp. A fast
+        (non --realtime) replay stamps frames with recording time, so its
+        capture-relative figures are meaningless.
+
+        Parameters:
+            window: Samples kept per measurement
+            open_traces: Frames whose stages can still be marked; older
+                         traces are finished
+        """
+        self.window = window
+        self.open_traces = open_traces
+        self._traces = OrderedDict()   # frame_id -> {stage: time}
+        self._samples = {}             # measurement name -> deque of seconds
+        self.current = None            # frame_id of the newest trace
+
+    def begin(self, frame_id, capture_time):
+        """
+        Start the trace of a new frame.
+
+        Parameters:
+            frame_id: Frame number (Frame.frame_id)
+            capture_time: Frame.timestamp
+        """
+        if frame_id in self._traces:
+            return
+        self._traces[frame_id] = {'capture': capture_time}
+        self.current = frame_id
+        while len(self._traces) > self.open_traces:
+            self._finish(self._traces.popitem(last=False)[1])
+
+    def mark(self, stage, frame_id=None, now=None):
+        """
+        Stamp a stage of a frame's trace; only the first stamp of each
+        stage counts (e.g. the first of several serial writes).
+
+        Parameters:
+            stage: One of STAGES after 'capture'
+            frame_id: Frame the stage belongs to (default: the newest)
+            now: Time of the event (default: time.monotonic())
+        """
+        trace = self._traces.get(self.current if frame_id is None else frame_id)
+        if trace is not None and stage not in trace:
+            trace[stage] = time.monotonic() if now is None else now
+
+    def reply_callback(self, callback=None):
+        """
+        Wrap the callback of a stimulator command so its serial write and
+        ack times (from the nmes_serial.Reply) are stamped on the trace of
+        the frame that is current now, i.e. the one whose decision sent it.
+        """
+        frame_id = self.current
+
+        def done(reply):
+            if reply.sent_at is not None:   # None: cancelled or failed unwritten
+                self.mark('serial_write', frame_id, reply.sent_at)
+            if reply.line is not None:
+                self.mark('ack', frame_id, reply.acked_at)
+            if callback is not None:
+                callback(reply)
+        return done
+
+    def _finish(self, trace):
+        for previous, stage in zip(STAGES, STAGES[1:]):
+            if stage not in trace:
+                continue
+            if previous in trace:
+                self._add(stage, trace[stage] - trace[previous])
+            if previous != 'capture':
+                self._add(f'capture->{stage}', trace[stage] - trace['capture'])
+
+    def _add(self, name, seconds):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def flush(self):
+        """Finish every open trace (call before the final report)."""
+        while self._traces:
+            self._finish(self._traces.popitem(last=False)[1])
+
+    def stats(self):
+        """
+        Get the rolling latency percentiles.
+
+        Returns:
+            Dict of measurement name -> dict of count, p50, p95, p99 and
+            max in milliseconds, in chain order
+        """
+        names = list(STAGES[1:]) + [f'capture->{stage}' for stage in STAGES[2:]]
+        report = {}
+        for name in names:
+            samples = self._samples.get(name)
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+            report[name] = {'count': len(ms), 'p50': round(float(p50), 2),
+                            'p95': round(float(p95), 2), 'p99': round(float(p99), 2),
+                            'max': round(float(ms.max()), 2)}
+        return report
+
+    def hud_lines(self):
+        """One text line per measurement, for an on-screen overlay."""
+        return [f"{name:21s} {s['p50']:6.1f} {s['p95']:6.1f} {s['p99']:6.1f} ms"
+                for name, s in self.stats().items()]
+
+    def draw_hud(self, image, origin=(10, 20)):
+        """
+        Draw the percentiles (p50 p95 p99) on a BGR image in place.
+
+        Parameters:
+            image: BGR image
+            origin: Position of the first line's baseline
+        """
+        x, y = origin
+        for i, line in enumerate(['latency               p50    p95    p99'] + self.hud_lines()):
+            cv2.putText(image, line, (x, y + 16 * i), cv2.FONT_HERSHEY_PLAIN, 1.0,
+                        (0, 255, 255), 1)
+
+    def dump(self, path):
+        """
+        Finish the open traces and write the percentiles and the raw
+        rolling samples (ms) to a JSON file.
+
+        Returns:
+            The stats written
+        """
+        self.flush()
+        report = self.stats()
+        with open(path, 'w') as f:
+            json.dump({'stats': report,
+                       'samples_ms': {name: [round(s * 1000, 3) for s in samples]
+                                      for name, samples in self._samples.items()}},
+                      f, indent=2)
+        print(f"[Latency] {len(report)} measurements written to {path}")
+        return report
+
+
+def latency_options():
+    """
+    Parse the latency flags (other arguments are ignored):
+        --latency-hud        show the percentiles over the camera view
+        --latency-log PATH   write the session report there (default: no report)
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--latency-hud', action='store_true')
+    parser.add_argument('--latency-log')
+    args, _ = parser.parse_known_args()
+    return args
+
+
+# Example usage: a simulated assist loop with made-up stage delays
+if __name__ == "__main__":
+    trace = LatencyTrace()
+    rng = np.random.default_rng(0)
+    for frame_id in range(1, 61):
+        trace.begin(frame_id, time.monotonic())
+        time.sleep(rng.uniform(0.020, 0.040))   # inference
+        trace.mark('inference')
+        trace.mark('decision')
+        if frame_id % 10 == 0:                  # stimulation step
+            trace.mark('serial_write')
+            time.sleep(rng.uniform(0.005, 0.015))
+            trace.mark('ack')
+    trace.flush()
+    print('\n'.join(trace.hud_lines()))
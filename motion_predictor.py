@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class ConstantVelocityPredictor:
+    def __init__(self, alpha=1.0, beta=0.5, max_horizon=0.25):
+        """
+        Alpha-beta (constant-velocity) estimator for values sampled by inference.
+
+        Feed it every inference result with update() and ask predict() for
+        the value at any frame time in between. Works on a scalar (e.g. arm
+        percent) or an array (e.g. a 21 x 3 landmark array).
+
+        Parameters:
+            alpha: How far the position snaps to each new measurement (0-1)
+            beta: How far the velocity follows each new measurement (0-1)
+            max_horizon: Longest extrapolation in seconds; past that the
+                         estimate is held instead of drifting away
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.max_horizon = max_horizon
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked value (e.g. when the landmarks are lost)."""
+        self.value = None
+        self.velocity = None
+        self.timestamp = None
+
+    @property
+    def tracking(self):
+        return self.value is not None
+
+    def update(self, measurement, timestamp):
+        """
+        Correct the estimate with a new measurement.
+
+        Parameters:
+            measurement: Measured value (scalar or array)
+            timestamp: Capture time of the frame it came from (seconds)
+        """
+        measurement = np.asarray(measurement, dtype=np.float64)
+        if self.value is None:
+            self.value = measurement.copy()
+            self.velocity = np.zeros_like(self.value)
+            self.timestamp = timestamp
+            return
+
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            self.value = measurement.copy()
+            return
+        predicted = self.value + self.velocity * min(dt, self.max_horizon)
+        residual = measurement - predicted
+        self.value = predicted + self.alpha * residual
+        self.velocity = self.velocity + self.beta * residual / dt
+        self.timestamp = timestamp
+
+    def predict(self, timestamp):
+        """
+        Estimate the value at a given time.
+
+        Parameters:
+            timestamp: Time to predict for (seconds, same clock as update())
+        Returns:
+            Predicted value, or None if nothing is being tracked
+        """
+        if self.value is None:
+            return None
+        dt = min(max(timestamp - self.timestamp, 0.0), self.max_horizon)
+        return self.value + self.velocity * dt
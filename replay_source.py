@@ -0,0 +1,187 @@
+import argparse
+import os
+import time
+
+import cv2
+
+from camera_stream import CameraStream, Frame, capture_options
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class ReplaySource:
+    def __init__(self, path, realtime=False, fps=None):
+        """
+        Play a recorded video file or image-sequence directory in place of
+        a CameraStream (same start / read / isOpened / release interface).
+
+        Frame timestamps follow the recording (frame index / fps from the
+        first read), so velocity estimates and timers see the recorded
+        motion even when the replay runs faster than real time.
+
+        Parameters:
+            path: Video file, or directory of images played in name order
+            realtime: Pace frames to the recording's frame rate, dropping
+                      the ones the caller is too slow for (like a camera);
+                      otherwise every read() returns the next frame at once
+            fps: Frame rate of an image directory, or to override the
+                 video's (default: the video's own, else 30)
+        """
+        self.path = path
+        self.realtime = realtime
+        if os.path.isdir(path):
+            self._files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.cap = None
+        else:
+            self._files = None
+            self.cap = cv2.VideoCapture(path)
+            fps = fps or self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps or 30.0
+
+        self._index = 0          # frames decoded so far
+        self._latest = None
+        self._start = None       # monotonic time of the first read
+        self._opened = self._files is not None or self.cap.isOpened()
+        self._reported = False
+        self.dropped = 0
+        self.delivered = 0
+
+    def start(self):
+        """Nothing runs in the background; returns self like CameraStream.start()."""
+        return self
+
+    def _decode(self):
+        if self._files is not None:
+            image = cv2.imread(self._files[self._index]) if self._index < len(self._files) else None
+        else:
+            ret, image = self.cap.read()
+            image = image if ret else None
+        if image is None:
+            self._opened = False
+            return None
+        self._index += 1
+        return Frame(self._index, self._start + (self._index - 1) / self.fps, image)
+
+    def read(self):
+        """
+        Get the next frame (fast replay) or the frame due now (realtime).
+
+        Returns:
+            Frame, or None once the recording has ended
+        """
+        if self._start is None:
+            self._start = time.monotonic()
+        if not self._opened:
+            return None
+
+        if not self.realtime:
+            frame = self._decode()
+        else:
+            # Decode up to the frame due at this moment; frames decoded but
+            # overtaken before anyone read them are dropped
+            due = int((time.monotonic() - self._start) * self.fps) + 1
+            frame = self._latest
+            while self._index < due:
+                decoded = self._decode()
+                if decoded is None:
+                    break
+                if frame is not self._latest:
+                    self.dropped += 1
+                frame = decoded
+            if frame is self._latest and not self._opened:
+                return None
+        if frame is not None and frame is not self._latest:
+            self.delivered += 1
+            self._latest = frame
+        return frame
+
+    def next_frame(self, timeout=1.0):
+        """
+        Get a frame newer than the last one returned, waiting for it in
+        realtime mode.
+
+        Returns:
+            Frame, or None once the recording has ended
+        """
+        if self.realtime and self._start is not None and self._opened:
+            wait = self._start + self._index / self.fps - time.monotonic()
+            if wait > 0:
+                time.sleep(min(wait, timeout))
+        return self.read()
+
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        """Close the recording and print the replay frame rate."""
+        self._opened = False
+        if self.cap is not None:
+            self.cap.release()
+        if self._start is not None and not self._reported:
+            self._reported = True
+            elapsed = time.monotonic() - self._start
+            print(f"[Replay] {self.delivered} frames in {elapsed:.2f} s "
+                  f"({self.delivered / max(elapsed, 1e-9):.1f} fps, {self.dropped} dropped) "
+                  f"from {self.path}")
+
+
+def replay_options():
+    """
+    Parse the replay flags shared by the games (other arguments are ignored):
+        --replay PATH   play a video file / image directory instead of the camera
+        --realtime      pace the replay to the recording's frame rate
+        --headless      no window: pygame's dummy video driver, no cv2.imshow
+        --no-landmark-cache  always run inference (see landmark_cache)
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--replay')
+    parser.add_argument('--realtime', action='store_true')
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--no-landmark-cache', action='store_true')
+    args, _ = parser.parse_known_args()
+    return args
+
+
+def setup_headless():
+    """
+    Switch pygame to its dummy video driver when --headless is given.
+    Call before pygame.init().
+
+    Returns:
+        True when running headless (skip cv2.imshow / waitKey)
+    """
+    if not replay_options().headless:
+        return False
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    return True
+
+
+def open_camera(src=0):
+    """
+    Get the started frame source: the --replay recording if given,
+    otherwise a CameraStream on src configured by the --camera-* flags.
+    """
+    args = replay_options()
+    if args.replay:
+        return ReplaySource(args.replay, realtime=args.realtime).start()
+    return CameraStream(src, **capture_options()).start()
+
+
+def frame_rate(default=60):
+    """Loop rate for pygame's clock.tick(): unlimited (0) during a fast replay."""
+    args = replay_options()
+    return 0 if args.replay and not args.realtime else default
+
+
+# Example usage: python replay_source.py session.mp4 [--realtime]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode a recording through ReplaySource")
+    parser.add_argument('path')
+    parser.add_argument('--realtime', action='store_true')
+    args = parser.parse_args()
+
+    source = ReplaySource(args.path, realtime=args.realtime).start()
+    while source.isOpened():
+        source.next_frame()
+    source.release()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from kinematics import grip_closure
+
+
+def baseline_is_hand_closed(landmarks, threshold=0.8):
+    # is_hand_closed() before grip_closure existed
+    tips = landmarks[[8, 12, 16, 20]] - landmarks[0]
+    distances = np.sqrt(np.einsum('ij,ij->i', tips, tips))
+    ref_distance = np.linalg.norm(landmarks[9] - landmarks[0])
+    closed_fingers = np.count_nonzero(distances < ref_distance)
+    return closed_fingers >= threshold * 4
+
+
+def random_hands(count, seed=0):
+    rng = np.random.default_rng(seed)
+    hands = rng.uniform(0.2, 0.8, (count, 21, 3)).astype(np.float32)
+    hands[..., 2] -= 0.5
+    return hands
+
+
+def test_is_hand_closed_matches_baseline():
+    from hand_tracker import HandTracker
+    tracker = HandTracker()
+    try:
+        hands = random_hands(500)
+        # pixel x, y with normalized z, as get_landmark_array(results, w, h) gives
+        hands[..., 0] *= 640
+        hands[..., 1] *= 480
+        for threshold in (0.8, 0.5):
+            got = [tracker.is_hand_closed(hand, threshold) for hand in hands]
+            want = [baseline_is_hand_closed(hand, threshold) for hand in hands]
+            assert got == want
+    finally:
+        tracker.release()
+
+
+def test_grip_closure_normalized_matches_pixels():
+    hands = random_hands(50, seed=1)
+    width, height = 640, 480
+    pixels = hands.copy()
+    pixels[..., 0] *= width
+    pixels[..., 1] *= height
+    np.testing.assert_allclose(grip_closure(hands, aspect=width / height),
+                               grip_closure(pixels), atol=1e-3)
+
+
+def test_grip_closure_ignores_z_by_default():
+    hands = random_hands(50, seed=2)
+    flat = hands.copy()
+    flat[..., 2] = 0
+    np.testing.assert_array_equal(grip_closure(hands), grip_closure(flat))
+    assert not np.allclose(grip_closure(hands, dims=3), grip_closure(flat, dims=3))
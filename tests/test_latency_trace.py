@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from latency_trace import LatencyTrace
+
+
+def test_decision_without_inference_only_counts_from_capture():
+    trace = LatencyTrace()
+    trace.begin(1, 0.0)
+    trace.mark('inference', now=0.030)
+    trace.mark('decision', now=0.032)
+    trace.begin(2, 0.033)               # strided: no inference on this frame
+    trace.mark('decision', now=0.040)
+    trace.flush()
+
+    stats = trace.stats()
+    assert stats['inference']['count'] == 1
+    assert stats['decision']['count'] == 1
+    assert stats['decision']['max'] == 2.0
+    assert stats['capture->decision']['count'] == 2
+    assert stats['capture->decision']['max'] == 32.0
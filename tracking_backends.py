@@ -0,0 +1,341 @@
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+from kinematics import landmarks_to_array
+
+POSE_CONNECTIONS = (
+    (0, 1), (0, 4), (1, 2), (2, 3), (3, 7), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (11, 23), (12, 14), (12, 24), (13, 15), (14, 16),
+    (15, 17), (15, 19), (15, 21), (16, 18), (16, 20), (16, 22), (17, 19),
+    (18, 20), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28), (27, 29),
+    (27, 31), (28, 30), (28, 32), (29, 31), (30, 32),
+)
+
+HAND_CONNECTIONS = (
+    (0, 1), (0, 5), (0, 17), (1, 2), (2, 3), (3, 4), (5, 6), (5, 9), (6, 7),
+    (7, 8), (9, 10), (9, 13), (10, 11), (11, 12), (13, 14), (13, 17),
+    (14, 15), (15, 16), (17, 18), (18, 19), (19, 20),
+)
+
+
+class RGBBuffer:
+    def __init__(self):
+        """
+        Reusable RGB copy of BGR frames for models that take RGB input.
+
+        The storage only grows, so ROI crops of changing size don't
+        allocate a new image every frame.
+        """
+        self._data = np.empty(0, np.uint8)
+
+    def convert(self, frame):
+        """
+        Convert a BGR frame (or crop) to RGB.
+
+        Parameters:
+            frame: BGR image
+        Returns:
+            Read-only contiguous RGB image backed by this buffer, overwritten
+            by the next call
+        """
+        if self._data.size < frame.size:
+            self._data = np.empty(frame.size, np.uint8)
+        rgb = self._data[:frame.size].reshape(frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        rgb.flags.writeable = False  # lets MediaPipe use it without copying
+        return rgb
+
+
+class TrackingBackend:
+    """
+    Landmark model behind a common interface.
+
+    process() takes a BGR frame and returns an array of shape (N, K, 4)
+    holding normalized x, y, z and a per-landmark confidence for each of
+    the N detected poses / hands. Pose backends always use the 33-landmark
+    MediaPipe Pose layout and hand backends the 21-landmark MediaPipe Hands
+    layout, so kinematics tables work with every backend.
+    """
+    kind = None
+    landmark_count = None
+
+    def process(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MediaPipePose(TrackingBackend):
+    kind = 'pose'
+    landmark_count = 33
+
+    def __init__(self, model_complexity=1, **kwargs):
+        """
+        MediaPipe Pose (one person).
+
+        Parameters:
+            model_complexity: 0 (lite), 1 (full) or 2 (heavy)
+            kwargs: Passed to mp.solutions.pose.Pose
+        """
+        import mediapipe as mp
+        self.pose = mp.solutions.pose.Pose(model_complexity=model_complexity, **kwargs)
+        self.max_instances = 1
+        self._points = np.zeros((1, self.landmark_count, 4), np.float32)
+        self._rgb = RGBBuffer()
+
+    def process(self, frame):
+        """
+        Detect the pose in a BGR frame.
+
+        Returns:
+            (0 or 1, 33, 4) view of an internal buffer, overwritten by the next call
+        """
+        results = self.pose.process(self._rgb.convert(frame))
+        return landmarks_to_array([results.pose_landmarks], self._points)
+
+    def close(self):
+        self.pose.close()
+
+
+class MediaPipeHands(TrackingBackend):
+    kind = 'hands'
+    landmark_count = 21
+
+    def __init__(self, max_num_hands=2, **kwargs):
+        """
+        MediaPipe Hands.
+
+        Parameters:
+            max_num_hands: Maximum number of hands to detect
+            kwargs: Passed to mp.solutions.hands.Hands
+        """
+        import mediapipe as mp
+        self.hands = mp.solutions.hands.Hands(max_num_hands=max_num_hands, **kwargs)
+        self.max_instances = max_num_hands
+        self._points = np.zeros((max_num_hands, self.landmark_count, 4), np.float32)
+        self._rgb = RGBBuffer()
+
+    def process(self, frame):
+        """
+        Detect hands in a BGR frame. The confidence column holds each hand's
+        handedness score.
+
+        Returns:
+            (N, 21, 4) view of an internal buffer, overwritten by the next call
+        """
+        results = self.hands.process(self._rgb.convert(frame))
+        points = landmarks_to_array(results.multi_hand_landmarks, self._points)
+        for hand, handedness in zip(points, results.multi_handedness or ()):
+            hand[:, 3] = handedness.classification[0].score
+        return points
+
+    def close(self):
+        self.hands.close()
+
+
+class YoloPose(TrackingBackend):
+    kind = 'pose'
+    landmark_count = 33
+
+    # MediaPipe Pose landmark id of each COCO keypoint YOLO predicts
+    COCO_TO_MEDIAPIPE = np.array([0, 2, 5, 7, 8, 11, 12, 13, 14, 15, 16,
+                                  23, 24, 25, 26, 27, 28], dtype=np.intp)
+
+    def __init__(self, model='yolov8n-pose.pt', max_instances=1, min_detection_confidence=0.5,
+                 min_tracking_confidence=None, imgsz=640, device='cpu'):
+        """
+        Ultralytics YOLOv8 pose, run on the CPU by default.
+
+        YOLO predicts the 17 COCO keypoints. They are written into the
+        MediaPipe Pose layout (shoulders, elbows, wrists, hips, knees,
+        ankles, nose, eyes, ears); the other landmarks, including the hand
+        knuckles, get confidence 0. Elbow angles work unchanged, wrist
+        angles don't.
+
+        Parameters:
+            model: YOLO pose weights (e.g. 'yolov8n-pose.pt', 'yolov8s-pose.pt')
+            max_instances: People to return, most confident first
+            min_detection_confidence: Minimum person box confidence
+            min_tracking_confidence: Unused (YOLO detects every frame)
+            imgsz: Inference size in pixels
+            device: Torch device
+        """
+        from ultralytics import YOLO
+        self.model = YOLO(model)
+        self.max_instances = max_instances
+        self.conf = min_detection_confidence
+        self.imgsz = imgsz
+        self.device = device
+        self._points = np.zeros((max_instances, self.landmark_count, 4), np.float32)
+
+    def process(self, frame):
+        """
+        Detect people in a BGR frame.
+
+        Returns:
+            (N, 33, 4) view of an internal buffer, overwritten by the next call
+        """
+        result = self.model.predict(frame, conf=self.conf, imgsz=self.imgsz,
+                                    device=self.device, verbose=False)[0]
+        keypoints = result.keypoints
+        if keypoints is None:
+            return self._points[:0]
+        # Keypoints object (x, y in pixels, conf); older releases used a bare tensor
+        data = getattr(keypoints, 'data', keypoints).cpu().numpy()
+        n = min(len(data), self.max_instances)
+        points = self._points[:n]
+        points.fill(0)
+        height, width = frame.shape[:2]
+        points[:, self.COCO_TO_MEDIAPIPE, 0] = data[:n, :, 0] / width
+        points[:, self.COCO_TO_MEDIAPIPE, 1] = data[:n, :, 1] / height
+        points[:, self.COCO_TO_MEDIAPIPE, 3] = data[:n, :, 2] if data.shape[-1] > 2 else 1.0
+        return points
+
+
+# Backend name -> (class, default arguments)
+BACKENDS = {
+    'mediapipe-pose-0': (MediaPipePose, {'model_complexity': 0}),
+    'mediapipe-pose-1': (MediaPipePose, {'model_complexity': 1}),
+    'mediapipe-pose-2': (MediaPipePose, {'model_complexity': 2}),
+    'mediapipe-hands': (MediaPipeHands, {}),
+    'yolo-pose': (YoloPose, {}),
+}
+DEFAULT_BACKENDS = {'pose': 'mediapipe-pose-1', 'hands': 'mediapipe-hands'}
+
+
+def backend_kind(name):
+    """Get 'pose' or 'hands' for a backend name (see create_backend)."""
+    base = name.partition(':')[0]
+    if base not in BACKENDS:
+        raise ValueError(f"Unknown tracking backend: {name} "
+                         f"(choose from {', '.join(BACKENDS)})")
+    return BACKENDS[base][0].kind
+
+
+def create_backend(name, **kwargs):
+    """
+    Build a tracking backend by name.
+
+    Parameters:
+        name: Key of BACKENDS; 'yolo-pose:<weights>' picks other YOLO weights
+        kwargs: Model settings overriding the backend defaults (e.g.
+                min_detection_confidence, max_num_hands)
+    Returns:
+        TrackingBackend
+    """
+    backend_kind(name)
+    base, _, weights = name.partition(':')
+    backend_class, defaults = BACKENDS[base]
+    settings = dict(defaults, **kwargs)
+    if weights:
+        settings['model'] = weights
+    if backend_class is not MediaPipeHands:
+        settings.pop('max_num_hands', None)
+    return backend_class(**settings)
+
+
+def selected_backend(kind):
+    """
+    Get the backend name chosen for 'pose' or 'hands'.
+
+    Looked up in order: command-line flag (--pose-backend / --hands-backend),
+    environment variable (POSE_BACKEND / HANDS_BACKEND), DEFAULT_BACKENDS.
+    Scripts launched from ui.py inherit the environment variables.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(f'--{kind}-backend')
+    args, _ = parser.parse_known_args()
+    name = (getattr(args, f'{kind}_backend') or
+            os.environ.get(f'{kind.upper()}_BACKEND') or
+            DEFAULT_BACKENDS[kind])
+    if backend_kind(name) != kind:
+        raise ValueError(f"Tracking backend {name} doesn't track {kind}")
+    return name
+
+
+def draw_landmarks(image, points, connections, min_confidence=0.5,
+                   line_color=(255, 255, 255), point_color=(0, 0, 255)):
+    """
+    Draw landmark arrays (as returned by process()) on a BGR image in place.
+
+    Parameters:
+        image: Image the landmarks are normalized to
+        points: Array of shape (N, K, 4)
+        connections: POSE_CONNECTIONS or HAND_CONNECTIONS
+        min_confidence: Skip landmarks below this confidence
+    """
+    height, width = image.shape[:2]
+    for instance in points:
+        xy = (instance[:, :2] * (width, height)).astype(np.int32)
+        visible = instance[:, 3] >= min_confidence
+        for a, b in connections:
+            if visible[a] and visible[b]:
+                cv2.line(image, tuple(map(int, xy[a])), tuple(map(int, xy[b])), line_color, 2)
+        for (x, y), shown in zip(xy, visible):
+            if shown:
+                cv2.circle(image, (int(x), int(y)), 4, point_color, -1)
+
+
+# Benchmark: latency and joint-angle stability of every installed pose backend
+# (or of the hand backends named with --backends: index finger PIP angle)
+if __name__ == "__main__":
+    import time
+    from kinematics import HAND_JOINTS, JointAngles, POSE_JOINTS
+
+    parser = argparse.ArgumentParser(description="Compare pose or hand tracking backends")
+    parser.add_argument('source', nargs='?', default='0',
+                        help="Camera index or video file (hold the arm or hand still for "
+                             "the jitter figure)")
+    parser.add_argument('--frames', type=int, default=150)
+    parser.add_argument('--backends', nargs='*',
+                        default=[name for name in BACKENDS if backend_kind(name) == 'pose'])
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    frames = []
+    while len(frames) < args.frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"No frames from {args.source}")
+
+    # Joint whose angle jitter is measured, per backend kind
+    joint_angles = {'pose': JointAngles(POSE_JOINTS, max_instances=1, dims=2),
+                    'hands': JointAngles(HAND_JOINTS, max_instances=1, dims=2)}
+    joint_names = {'pose': 'right_elbow', 'hands': 'index_pip'}
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    for name in args.backends:
+        try:
+            backend = create_backend(name)
+        except ImportError as e:
+            print(f"{name:18s} not available ({e})")
+            continue
+        kind = backend_kind(name)
+        angles_of = joint_angles[kind]
+        joint = angles_of.index[joint_names[kind]]
+        with backend:
+            backend.process(frames[0])  # warm-up
+            times, angles = [], []
+            for frame in frames:
+                start = time.perf_counter()
+                points = backend.process(frame)
+                times.append(time.perf_counter() - start)
+                if len(points):
+                    angles.append(angles_of.compute(points[:1])[0, joint])
+        times = np.array(times) * 1000
+        jitter = np.std(np.diff(angles)) if len(angles) > 2 else float('nan')
+        print(f"{name:18s} {np.mean(times):6.1f} ms/frame (p95 {np.percentile(times, 95):6.1f})  "
+              f"detected {len(angles)}/{len(frames)}  {joint_names[kind]} jitter {jitter:5.2f} deg")